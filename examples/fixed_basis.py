@@ -11,7 +11,7 @@ from torch.autograd import Variable
 
 from vmc.data import FixedTOMO
 from vmc.ham import J1J2
-from vmc.utils import ground, bin
+from vmc.utils import ground, bin, default_cache, CACHE_ROOT
 from vmc.basis import MBOp, sigmaz
 
 # for 4 sites
@@ -31,7 +31,7 @@ thin = 1
 
 h = J1J2(length=nparticles, pbc=False, J=(1.0, 0.5))
 print('generating exact ground state')
-_, exact_state = ground(h)
+_, exact_state = ground(h, cache=default_cache(CACHE_ROOT, matrices=False))
 
 
 def to_var(x):
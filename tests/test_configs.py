@@ -1,7 +1,9 @@
 import unittest
 import torch
+import numpy as np
 from vmc.configs import *
 from vmc import utils
+from vmc.lattice import Chain, Square
 
 
 class TestRandSelect(unittest.TestCase):
@@ -15,6 +17,14 @@ class TestRandSelect(unittest.TestCase):
 
 
 class TestIterateAll(unittest.TestCase):
+    def test_lattice_size(self):
+        lattice = Square(2, 3)
+        blocks = list(IterateAll(size=lattice, chunk=16))
+        self.assertEqual([tuple(each.shape) for each in blocks],
+                         [(16, 6)] * 4)
+        self.assertTrue(torch.equal(lattice.unflatten(blocks[0])[3],
+                                    IterateAll(size=(2, 3)).block(3, 4)[0]))
+
     def test_propose(self):
         config = torch.zeros(5, 5, out=torch.LongTensor())
         config = config - 1
@@ -28,6 +38,139 @@ class TestIterateAll(unittest.TestCase):
         for i, cfg in enumerate(gen):
             self.assertEqual(i, utils.bin(cfg))
 
+    def test_chunk(self):
+        gen = IterateAll(size=(2, 3), chunk=5, start=3, stop=40)
+        blocks = list(gen)
+        self.assertEqual([len(each) for each in blocks], [5] * 7 + [2])
+        configs = torch.cat(blocks)
+        self.assertEqual(configs.shape, (37, 2, 3))
+        for i, cfg in enumerate(configs):
+            self.assertEqual(i + 3, utils.bin(cfg))
+        self.assertEqual([utils.bin(cfg) for cfg in
+                          IterateAll(size=(2, 3), start=60)], [60, 61, 62, 63])
+        parts = gen.split(4)
+        self.assertEqual([(each.start, each.stop) for each in parts],
+                         [(3, 12), (12, 21), (21, 30), (30, 40)])
+
+
+class TestGrayCode(unittest.TestCase):
+    def test_iteration(self):
+        codes, last = [], None
+        for config, site in GrayCode(size=(2, 3)):
+            if last is not None:
+                flipped = torch.nonzero(config.view(-1) != last).view(-1)
+                self.assertEqual(flipped.tolist(), [site])
+            last = config.clone().view(-1)
+            codes.append(utils.bin(config))
+        self.assertEqual(sorted(codes), list(range(2 ** 6)))
+        self.assertEqual(codes, gray_code(np.arange(2 ** 6)).tolist())
+        self.assertEqual(utils.bin(GrayCode().propose(last)), codes[0])
+
+        blocks = list(GrayCode(size=(2, 3), chunk=10, start=5))
+        configs = torch.cat([configs for configs, _ in blocks])
+        sites = np.concatenate([sites for _, sites in blocks])
+        self.assertEqual([utils.bin(each) for each in configs], codes[5:])
+        self.assertTrue(np.all(sites == gray_sites(5, 2 ** 6)))
+
+
+class TestSpinConserve(unittest.TestCase):
+    @staticmethod
+    def _anti(config, bonds):
+        """number of antiparallel bonds of each configuration"""
+        spins = config.contiguous().view(-1, config.size(-1))
+        return (spins[:, bonds[:, 0]] != spins[:, bonds[:, 1]]).sum(1)
+
+    def test_propose(self):
+        lattice = Chain(8, pbc=True)
+        bonds = set(map(tuple, lattice.bonds(1).tolist()))
+        for gen in [SpinConserve(), SpinConserve(lattice=lattice)]:
+            config = torch.Tensor([1, 1, 1, 1, 1, 1, 1, -1])
+            for i in range(200):
+                cand = gen.propose(config)
+                self.assertEqual(int(cand.sum()), 6)
+                flipped = torch.nonzero(cand != config).view(-1).tolist()
+                self.assertEqual(len(flipped), 2)
+                if gen.lattice is not None:
+                    self.assertTrue(tuple(flipped) in bonds or
+                                    (flipped[1], flipped[0]) in bonds)
+                    self.assertEqual(gen.factor, 1.0)
+                if i % 3:
+                    config = cand
+                if i % 5 == 0:
+                    gen.accept(config is cand)
+                if i % 7 == 0:
+                    config *= -1
+                    config[torch.nonzero(config < 0).view(-1)[:6]] = 1
+                    gen.reset()
+        full = torch.ones(8)
+        self.assertTrue(torch.equal(SpinConserve().propose(full), full))
+
+    def test_bond_factor(self):
+        lattice = Square(3, 4, pbc=True)
+        bonds = lattice.bond_index(1)
+        gen = SpinConserve(lattice=lattice)
+        config = torch.Tensor([1] * 6 + [-1] * 6)[torch.randperm(12)]
+        factors = set()
+        for _ in range(200):
+            cand = gen.propose(config)
+            before = int(self._anti(config, bonds))
+            after = int(self._anti(cand, bonds))
+            self.assertAlmostEqual(gen.factor, before / after)
+            factors.add(round(gen.factor, 8))
+            config = cand
+        self.assertGreater(len(factors), 1)
+
+        configs = torch.stack([torch.Tensor([1] * 6 + [-1] * 6)[
+            torch.randperm(12)] for _ in range(50)])
+        batch = gen.propose(ConfigBatch.pack(configs))
+        before = self._anti(configs, bonds).double()
+        after = self._anti(batch.unpack(), bonds).double()
+        self.assertTrue(np.allclose(gen.factor, (before / after).numpy()))
+
+
+class TestSectorIterate(unittest.TestCase):
+    def test_iteration(self):
+        gen = Generator('sector iterate', size=(2, 3), sz=1)
+        codes = [utils.bin(cfg) for cfg in gen]
+        self.assertEqual(len(gen), 15)
+        self.assertEqual(codes, [code for code in range(2 ** 6)
+                                 if bin(code).count('1') == 4])
+        blocks = list(SectorIterate(size=(2, 3), nup=4, chunk=4, start=2))
+        self.assertEqual([len(each) for each in blocks], [4, 4, 4, 1])
+        self.assertEqual([utils.bin(each) for each in torch.cat(blocks)],
+                         codes[2:])
+        config = gen.propose(gen.block(14, 15)[0])
+        self.assertEqual(utils.bin(config), codes[0])
+        self.assertTrue(torch.all(gen.random(10).sum((1, 2)) == 2))
+
+
+class TestConfigBatch(unittest.TestCase):
+    def test_pack(self):
+        for size in [(3, 4), (100, )]:
+            configs = torch.stack([utils.randspin(size) for _ in range(6)])
+            batch = ConfigBatch.pack(configs)
+            self.assertEqual(batch.words.shape,
+                             (6, nwords(configs[0].numel())))
+            self.assertTrue(torch.equal(batch.unpack(), configs))
+            for each, config in zip(batch, configs):
+                self.assertEqual(utils.bin(each), utils.bin(config))
+                self.assertEqual(each, ConfigBatch.pack(config, size=size))
+                if len(size) == 1:
+                    self.assertEqual(each, ConfigBatch.pack(config))
+            self.assertEqual(ConfigBatch.from_codes(batch.index(), size),
+                             batch)
+            self.assertEqual(len(set(batch) | set(batch)), len(set(
+                utils.bin(each) for each in configs)))
+
+    def test_generators(self):
+        batch = ConfigBatch.from_codes(np.arange(2 ** 6), (2, 3))
+        self.assertTrue(np.all(IterateAll().propose(batch).index() ==
+                               (np.arange(2 ** 6) + 1) % 2 ** 6))
+        cand = RandomSelect().propose(batch, nflips=2)
+        self.assertTrue(np.all((cand.up() != batch.up()).sum(1) == 2))
+        cand = SpinConserve().propose(batch)
+        self.assertTrue(np.all(cand.up().sum(1) == batch.up().sum(1)))
+
 
 if __name__ == '__main__':
     unittest.main()
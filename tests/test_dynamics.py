@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+import scipy.linalg as la
+from vmc.ham import TFI, XXZ, PauliSum
+from vmc.lattice import Chain
+from vmc.dynamics import expmv, AQC, GapFinder
+
+
+class TestExpmv(unittest.TestCase):
+
+    def test_expmv(self):
+        h = TFI(mag=0.7, lattice=Chain(8, pbc=True))
+        matrix = h.mat().tocsr()
+        v = np.random.rand(256) + 1.j * np.random.rand(256)
+        for t in [0.01, 2.0, -0.3j, -5j]:
+            exact = la.expm(t * matrix.toarray()).dot(v)
+            for op in [matrix, h.as_linear_operator(), matrix.toarray()]:
+                error = np.abs(expmv(op, v, t) - exact).max()
+                self.assertLess(error, 1e-10 * np.abs(exact).max())
+
+        # non-normal matrices use norms of powers
+        A = np.random.randn(40, 40) * 3
+        v = np.random.randn(40)
+        exact = la.expm(A).dot(v)
+        self.assertLess(np.abs(expmv(A, v) - exact).max(),
+                        1e-10 * np.abs(exact).max())
+
+
+class TestAQC(unittest.TestCase):
+
+    def test_evolve(self):
+        lattice = Chain(6, pbc=True)
+        H0 = PauliSum(' + '.join('-X%d' % k for k in range(6)),
+                      lattice=lattice)
+        H1 = XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice)
+        aqc = AQC(H0, H1, T=2.0, steps=50)
+        state = aqc.initial_state()
+
+        exact = state.astype(np.complex128)
+        a, b = H0.mat().toarray(), H1.mat().toarray()
+        for k in range(50):
+            s = (k + 0.5) / 50
+            exact = la.expm(-1j * aqc.dt * ((1 - s) * a + s * b)).dot(exact)
+        self.assertLess(np.abs(aqc.run(state) - exact).max(), 1e-10)
+
+        aqc = AQC(H0, H1, T=2.0, steps=50, matrix_free=True)
+        records = list(aqc.evolve(state, checkpoints=5,
+                                  observables={'H1': H1,
+                                               'norm': np.linalg.norm}))
+        self.assertTrue(np.allclose([t for t, _, _, _ in records],
+                                    [0.4, 0.8, 1.2, 1.6, 2.0]))
+        self.assertLess(np.abs(records[-1][2] - exact).max(), 1e-10)
+        for _, _, _, values in records:
+            self.assertAlmostEqual(values['norm'], 1.0)
+        self.assertAlmostEqual(records[-1][3]['H1'],
+                               np.vdot(exact, b.dot(exact)).real)
+
+
+class TestGapFinder(unittest.TestCase):
+
+    def test_scan(self):
+        lattice = Chain(6, pbc=True)
+        H0 = PauliSum(' + '.join('-X%d' % k for k in range(6)),
+                      lattice=lattice)
+        H1 = PauliSum(''.join(' - Z%d Z%d' % (k, (k + 1) % 6)
+                              for k in range(6)) + ' + 0.3 Z0 - 0.2 Z3',
+                      lattice=lattice)
+        finder = GapFinder(H0, H1)
+        profile = finder.scan(points=11, xtol=1e-5)
+        s, gap, s_error, gap_error = profile.minimum()
+
+        grid = np.linspace(s - 0.01, s + 0.01, 201)
+        gaps = [np.diff(np.linalg.eigvalsh(finder.matrix(each).toarray())[:2])
+                for each in grid]
+        self.assertLess(abs(grid[np.argmin(gaps)] - s), 2e-4)
+        self.assertLessEqual(gap, np.min(gaps) + 1e-8)
+        self.assertLess(s_error, 1e-4)
+        self.assertLess(gap - np.min(gaps), gap_error + 1e-8)
+        self.assertLess(profile.evaluations, 40)
+        self.assertTrue(np.all(np.diff(profile.s) > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,9 +7,16 @@ TODO:
 """
 
 
+import os
+import tempfile
+import threading
 import unittest
+import torch
+import numpy as np
 from vmc.ham import *
-from vmc.lattice import Chain, Square
+from vmc.ham import sparse
+from vmc.ham.sector import MomentumSector
+from vmc.lattice import Chain, Square, GraphLattice, Kagome
 from vmc import utils
 from vmc.sampler import STMetropolis
 import testutils
@@ -62,6 +69,282 @@ class TestHam(unittest.TestCase):
             exact = testutils.TFI(lattice, mag=1.0)
             testutils.assertEqualSparse(self, test_h.mat(), exact)
 
+    def _test_nnz_batch(self, h):
+        configs = torch.stack([utils.randspin(h.size) for i in range(10)])
+        RHS, vals, segment = h.nnz_batch(configs)
+        exact = HamiltonianBase.nnz_batch(h, configs)
+        for k in range(len(configs)):
+            test_elems, exact_elems = {}, {}
+            for elems, (rhs, val, seg) in [(test_elems, (RHS, vals, segment)),
+                                           (exact_elems, exact)]:
+                for config, each in zip(rhs[seg == k], val[seg == k]):
+                    key = utils.bin(config)
+                    elems[key] = elems.get(key, 0) + float(each)
+            for key in set(test_elems) | set(exact_elems):
+                self.assertAlmostEqual(test_elems.get(key, 0),
+                                       exact_elems.get(key, 0), places=4)
+
+    def test_nnz_batch(self):
+        for lattice in [Chain(6, pbc=True), Chain(5, pbc=False),
+                        Square(3, 3, pbc=True), Square(2, 3, pbc=False)]:
+            self._test_nnz_batch(TFI(mag=0.7, lattice=lattice))
+            self._test_nnz_batch(J1J2(J=(1.0, 0.4), lattice=lattice))
+            self._test_nnz_batch(XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice))
+
+    def test_nnz_flips(self):
+        lattice = Square(2, 3, pbc=True)
+        large = Square(8, 8, pbc=True)
+        for h in [TFI(mag=0.7, lattice=lattice),
+                  J1J2(J=(1.0, 0.4), lattice=lattice),
+                  XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice),
+                  PauliSum('X0 Y3 - 0.5 Z1 Z2', lattice=lattice),
+                  one.SigmaX(lattice=lattice), one.SigmaY(lattice=lattice),
+                  one.SigmaZ(lattice=lattice), two.SigmaX(lattice=lattice),
+                  two.SigmaY(lattice=lattice), two.SigmaZ(lattice=lattice),
+                  TFI(mag=0.7, lattice=large),
+                  J1J2(J=(1.0, 0.4), lattice=Square(10, 10, pbc=True)),
+                  XXZ(J=(1.0, 0.4), nbr=1, lattice=large)]:
+            config = utils.randspin(h.size)
+            flips, vals = h.nnz_flips(config)
+            RHS = utils.apply_flips(config, flips)
+            self.assertTrue(torch.equal(utils.flip_sites(config, RHS),
+                                        flips))
+            test_elems, exact_elems = {}, {}
+            for elems, (rhs, val) in [
+                    (test_elems, (RHS, vals)),
+                    (exact_elems, h.nnz_batch(config.view(1, -1))[:2])]:
+                for each, elem in zip(rhs, val):
+                    key = utils.bin(each)
+                    elems[key] = elems.get(key, 0) + complex(elem)
+            self.assertEqual(set(test_elems), set(exact_elems))
+            for key in test_elems:
+                self.assertAlmostEqual(test_elems[key], exact_elems[key],
+                                       places=5)
+
+    def test_bits_limit(self):
+        for h in [TFI(mag=0.7, lattice=Chain(62, pbc=True)),
+                  XXZ(J=(1.0, 0.4), nbr=1, lattice=Chain(62, pbc=True))]:
+            src, rhs, vals = h.nnz_bits(np.array([0, 2 ** 61]))
+            self.assertEqual(h.diagonal(np.array([2 ** 61]))[0],
+                             vals[src == 1][-1])
+        for h in [TFI(mag=0.7, lattice=Square(8, 8, pbc=True)),
+                  XXZ(J=(1.0, 0.4), nbr=1, lattice=Chain(64, pbc=True)),
+                  J1J2(J=(1.0, 0.4), lattice=Square(10, 10, pbc=True))]:
+            config = utils.randspin(h.size)
+            for func in [h.nnz_bits, h.nnz_masks, h.diag_bits]:
+                self.assertRaises(ValueError, func, np.zeros(1))
+            self.assertRaises(ValueError, utils.encode, config.view(1, -1))
+            self.assertRaises(ValueError, utils.decode, [0], 64)
+
+    def test_mat(self):
+        class Generic(object):
+            def __init__(self, h):
+                self.lattice = h.lattice
+                self.h = h
+
+            def nnz_bits(self, codes):
+                return HamiltonianBase.nnz_bits(self.h, codes)
+
+        for lattice in [Chain(6, pbc=True), Square(2, 3, pbc=False)]:
+            for h in [TFI(mag=0.7, lattice=lattice),
+                      J1J2(J=(1.0, 0.4), lattice=lattice),
+                      XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice)]:
+                exact = sparse.assemble(Generic(h), chunk=7)
+                self.assertLess(abs(h.mat() - exact).max(), 1e-5)
+                self.assertLess(abs(h.mat(chunk=7, workers=2) - exact).max(),
+                                1e-5)
+
+    def test_linear_operator(self):
+        for h in [TFI(mag=0.7, lattice=Chain(8, pbc=True)),
+                  J1J2(J=(1.0, 0.4), lattice=Square(3, 3, pbc=True))]:
+            op = h.as_linear_operator(chunk=37, workers=2)
+            x = np.random.rand(op.shape[0]) + 1.j * np.random.rand(op.shape[0])
+            self.assertLess(abs(op.matvec(x) - h.mat().dot(x)).max(), 1e-10)
+            h = PauliSum('Y0 Z3 X5 - 0.5 Y2 Y7 + Z1 Z4 Z6 - 0.3 X3',
+                         lattice=h.lattice) + h
+            x = x.real
+            for chunk in [2 ** 5, 2 ** 16]:
+                op = h.as_linear_operator(chunk=chunk, workers=2)
+                self.assertLess(abs(op.matvec(x) - h.mat().dot(x)).max(),
+                                1e-10)
+            threads = threading.active_count()
+            self.assertAlmostEqual(utils.ground(h)[0],
+                                   utils.ground(h, method='matrix_free')[0])
+            self.assertEqual(threading.active_count(), threads)
+            self.assertAlmostEqual(utils.ground(h)[0], utils.ground(
+                h, cache=False, chunk=7, workers=2)[0])
+            with self.assertRaises(TypeError):
+                utils.ground(h, cache=False, chunks=7)
+
+    def test_sz_sector(self):
+        for h in [XXZ(J=(1.0, 0.5), nbr=1, lattice=Chain(10, pbc=True)),
+                  J1J2(J=(1.0, 0.4), lattice=Square(3, 4, pbc=True))]:
+            exact, _ = utils.ground(h)
+            energy, state = utils.ground(h, sz=0, embed=True)
+            self.assertAlmostEqual(exact, energy)
+            residual = h.mat().dot(state) - energy * state
+            self.assertLess(np.linalg.norm(residual), 1e-8)
+
+        with self.assertRaises(ValueError):
+            utils.ground(TFI(mag=1.0, lattice=Chain(6)), sz=0)
+
+        # the fully polarized sector has a single state
+        h = XXZ(J=(1.0, 0.5), nbr=1, lattice=Chain(10, pbc=True))
+        up = h.mat()[2 ** 10 - 1, 2 ** 10 - 1]
+        for method in ['sparse', 'matrix_free']:
+            energy, state = utils.ground(h, method=method, sz=5,
+                                         cache=False)
+            self.assertAlmostEqual(energy, up)
+            self.assertEqual(len(state), 1)
+
+    def test_momentum_sector(self):
+        h = XXZ(J=(1.0, 0.5), nbr=1, lattice=Chain(8, pbc=True))
+        exact = np.linalg.eigvalsh(h.mat().toarray())
+        spectrum = []
+        for k in range(8):
+            sector = MomentumSector(h.lattice, k)
+            spectrum.extend(np.linalg.eigvalsh(h.mat(sector=sector).toarray()))
+        self.assertTrue(np.allclose(np.sort(spectrum), exact))
+
+        h = TFI(mag=0.7, lattice=Square(3, 3, pbc=True))
+        exact, _ = utils.ground(h)
+        energy, state = utils.ground(h, momentum=(0, 0), reflection=1,
+                                     embed=True)
+        self.assertAlmostEqual(exact, energy)
+        residual = h.mat().dot(state) - energy * state
+        self.assertLess(np.linalg.norm(residual), 1e-8)
+
+    def test_pauli_sum(self):
+        lattice = Chain(6, pbc=True)
+        tfi = TFI(mag=0.7, lattice=lattice)
+        xxz = XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice)
+        for h in [tfi, xxz, J1J2(J=(1.0, 0.4), lattice=lattice)]:
+            self.assertLess(abs(h.pauli().mat() - h.mat()).max(), 1e-5)
+
+        expr = ' - '.join(['Z%d Z%d' % (k, (k + 1) % 6) for k in range(6)])
+        expr += ''.join([' - 0.7 * X%d' % k for k in range(6)])
+        h = PauliSum('-' + expr, lattice=lattice)
+        self.assertLess(abs(h.mat() - tfi.mat()).max(), 1e-10)
+        self.assertEqual(len(h), 12)
+
+        h = tfi + 0.3 * xxz
+        self.assertLess(abs(h.mat() - tfi.mat() - 0.3 * xxz.mat()).max(),
+                        1e-5)
+        self.assertEqual(len(h - h), 0)
+        self.assertTrue(h - h)
+        for other in [SigmaX(), 'X0']:
+            for op in [lambda a, b: a + b, lambda a, b: b - a,
+                       lambda a, b: a * b, lambda a, b: b * a]:
+                with self.assertRaises(TypeError):
+                    op(h, other)
+        with self.assertRaises(TypeError):
+            - SigmaX()
+
+        a = PauliSum('0.3 X0 Y1 - 2 Z2 + (1+2j) * Y3 Z0 X4 + 1.5',
+                     lattice=lattice)
+        b = PauliSum('Y0 Y1 - 0.5j Z0 X5 + X2 * Y2', lattice=lattice)
+        self.assertLess(abs((a * b).mat() - a.mat().dot(b.mat())).max(),
+                        1e-10)
+        matrix = a.mat().toarray()
+        for x, y in np.random.randint(0, 64, size=(20, 2)):
+            self.assertAlmostEqual(a[x, y], matrix[x, y])
+        config = utils.randspin(tfi.size)
+        self.assertAlmostEqual(h[config, config],
+                               h.mat()[utils.bin(config), utils.bin(config)])
+
+        with self.assertRaises(ValueError):
+            PauliSum('X0 +', lattice=lattice)
+        with self.assertRaises(ValueError):
+            PauliSum('X6', lattice=lattice)
+
+        lattice = Square(8, 8, pbc=True)
+        tfi = TFI(mag=1.0, lattice=lattice)
+        xxz = XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice)
+        h = tfi + 0.3 * xxz
+        config = utils.randspin(tfi.size)
+        exact = {}
+        for each, scale in [(tfi, 1.0), (xxz, 0.3)]:
+            for rhs, val in each.nnz(config):
+                key = tuple(rhs.view(-1).tolist())
+                exact[key] = exact.get(key, 0) + scale * float(val)
+        elems = {tuple(rhs.view(-1).tolist()): float(val)
+                 for rhs, val in h.nnz(config)}
+        self.assertEqual(set(elems),
+                         set(key for key in exact if abs(exact[key]) > 1e-10))
+        for key, val in elems.items():
+            self.assertAlmostEqual(val, exact[key], places=5)
+            rhs = torch.Tensor(key).view_as(config)
+            self.assertAlmostEqual(h[config, rhs], val)
+
+        h = PauliSum('X70 Y3 - 0.5 Z65 Z3', lattice=Chain(80))
+        self.assertEqual(h.expr(), '-0.5 Z3 Z65 + 1 Y3 X70')
+        self.assertEqual((h * h).expr(), '1.25')
+        self.assertAlmostEqual(h[2 ** 65, 2 ** 65 + 2 ** 70 + 8], -1j)
+
+    def test_cache_diagonal(self):
+        lattice = Square(3, 3, pbc=True)
+        for h in [TFI(mag=0.7, lattice=lattice),
+                  J1J2(J=(1.0, 0.4), lattice=lattice),
+                  PauliSum('Z0 Z1 - 0.5 X3 + 2 Z5', lattice=lattice)]:
+            exact = h.mat()
+            config = utils.randspin(h.size)
+            elems = [(utils.bin(rhs), float(val))
+                     for rhs, val in h.nnz(config)]
+            table = h.cache_diagonal(chunk=100)
+            self.assertTrue(np.allclose(table, exact.diagonal()))
+            self.assertLess(abs(h.mat() - exact).max(), 1e-10)
+            for (x, a), (y, b) in zip(elems, h.nnz(config)):
+                self.assertEqual(x, utils.bin(y))
+                self.assertAlmostEqual(a, float(b), places=5)
+
+    def test_cache_diagonal_params(self):
+        lattice = Square(2, 3, pbc=True)
+        for h, key, value in [(J1J2(J=(1.0, 0.4), lattice=lattice),
+                               'J', (0.5, 1.0)),
+                              (XXZ(J=(1.0, 2.0), nbr=1, lattice=lattice),
+                               'J', (1.0, 0.5)),
+                              (TFI(mag=0.7, lattice=lattice), 'mag', 0.2)]:
+            h.cache_diagonal()
+            setattr(h, key, value)
+            exact = h.pauli().mat()
+            self.assertLess(abs(h.mat() - exact).max(), 1e-10)
+            self.assertTrue(np.allclose(h.diagonal(np.arange(64)),
+                                        exact.diagonal()))
+            config = utils.randspin(h.size)
+            column = np.zeros(64)
+            for rhs, val in h.nnz(config):
+                column[utils.bin(rhs)] += float(val)
+            self.assertTrue(np.allclose(
+                column, exact[:, utils.bin(config)].toarray().ravel()))
+
+            with tempfile.TemporaryDirectory() as path:
+                path = os.path.join(path, 'diagonal')
+                table = h.cache_diagonal(path=path)
+                self.assertIsInstance(table, np.memmap)
+                self.assertLess(abs(h.mat() - exact).max(), 1e-10)
+                h.clear_diagonal()
+
+    def test_graph_lattice(self):
+        ring = GraphLattice([(k, (k + 1) % 6) for k in range(6)])
+        chain = Chain(6, pbc=True)
+        for name, params in [('TFI', {'mag': 0.7}),
+                             ('J1J2', {'J': (1.0, 0.4)}),
+                             ('XXZ', {'J': (1.0, 0.4), 'nbr': 1})]:
+            self.assertLess(abs(Ham(name, lattice=ring, **params).mat() -
+                                Ham(name, lattice=chain, **params).mat())
+                            .max(), 1e-10)
+
+        h = J1J2(J=(1.0, 0.4), lattice=Kagome(2, 2, pbc=True))
+        matrix = h.mat()
+        self.assertLess(abs(h.pauli().mat() - matrix).max(), 1e-10)
+        config = utils.randspin(h.size)
+        elems = {}
+        for rhs, val in h.nnz(config):
+            elems[utils.bin(rhs)] = elems.get(utils.bin(rhs), 0) + float(val)
+        for key, val in elems.items():
+            self.assertAlmostEqual(val, matrix[key, utils.bin(config)],
+                                   places=5)
+
     def test_general_constructor(self):
         lattice = Chain(3, pbc=True)
         for name in __traits__.keys():
@@ -1,4 +1,7 @@
 import unittest
+import torch
+import numpy as np
+from vmc import utils
 from vmc.lattice import *
 
 
@@ -24,6 +27,94 @@ class TestLattice(unittest.TestCase):
         with self.assertRaises(TypeError):
             LatticeBase(name, shape=shape, pbc=1)
 
+    def test_translation(self):
+        lattice = Square(2, 3, pbc=True)
+        self.assertEqual(list(lattice.translation((0, 1))), [1, 2, 0, 4, 5, 3])
+        self.assertEqual(list(lattice.reflection(1)), [0, 2, 1, 3, 5, 4])
+        with self.assertRaises(ValueError):
+            Chain(4).translation(1)
+
+    def test_bonds(self):
+        for lattice in [Chain(6, pbc=True), Chain(5), Square(2, 2, pbc=True),
+                        Square(3, 4, pbc=True), Square(3, 4)]:
+            for nbr in [1, 2]:
+                exact = []
+                for i, j in lattice.grid(nbr=nbr):
+                    if isinstance(i, tuple):
+                        i, j = [int(np.ravel_multi_index(each, lattice.shape))
+                                for each in (i, j)]
+                    exact.append(tuple(sorted((i, j))))
+                bonds = lattice.bonds(nbr)
+                self.assertEqual(bonds.shape, (len(exact), 2))
+                self.assertEqual(sorted(map(tuple, np.sort(bonds, 1))),
+                                 sorted(exact))
+                self.assertIs(lattice.bonds(nbr), bonds)
+
+        lattice = Square(4, 4, pbc=True)
+        self.assertTrue(np.allclose(lattice.shells()[:3], [1, np.sqrt(2), 2]))
+        self.assertEqual(len(lattice.bonds(3)), 2 * 16)
+        table = lattice.shell_table()
+        for k in [1, 2, 3]:
+            for i, j in lattice.bonds(k):
+                self.assertEqual(table[i, j], k)
+        self.assertEqual(list(lattice.coordinates()[5]), [1, 1])
+        self.assertIs(lattice.adjacency(1), lattice.adjacency(1))
+        for site in [0, 5]:
+            self.assertEqual(sorted(lattice.neighbour_table(2)[site]),
+                             sorted(lattice.neighbours(site, 2)))
+        self.assertEqual(Chain(3).neighbour_table(1).tolist(),
+                         [[1, 0], [0, 2], [1, 2]])
+        self.assertIs(lattice.bond_index(1), lattice.bond_index(1))
+        with self.assertRaises(ValueError):
+            lattice.adjacency(1).indices[0] = 0
+
+    def test_graph(self):
+        ring = GraphLattice([(k, (k + 1) % 6) for k in range(6)])
+        self.assertEqual(ring.numel(), 6)
+        self.assertEqual(sorted(map(tuple, np.sort(ring.bonds(2), 1))),
+                         sorted(map(tuple, np.sort(
+                             Chain(6, pbc=True).bonds(2), 1))))
+        self.assertEqual(list(ring.grid(1)), [(k, (k + 1) % 6)
+                                              for k in range(6)])
+        self.assertEqual(list(ring.neighbours(0)), [1, 5])
+
+        lattice = GraphLattice({'nn': [(0, 1), (1, 2)], 'nnn': [(0, 2)]})
+        self.assertEqual(lattice.bonds(2).tolist(), [[0, 2]])
+        self.assertEqual(lattice.shell_table()[0].tolist(), [0, 1, 2])
+
+        for lattice, n, z in [(Triangular(3, 3, pbc=True), 9, 6),
+                              (Honeycomb(2, 3, pbc=True), 12, 3),
+                              (Kagome(2, 2, pbc=True), 12, 4)]:
+            self.assertEqual(lattice.numel(), n)
+            degree = np.asarray(lattice.adjacency(1).sum(1)).ravel()
+            self.assertTrue(np.all(degree == z))
+            self.assertEqual(len(lattice.bonds('nn')), n * z // 2)
+            self.assertAlmostEqual(lattice.shells()[0], 1.0)
+            self.assertAlmostEqual(lattice.shells()[1], np.sqrt(3))
+        self.assertIsInstance(Lattice('kagome', shape=(2, 2)), Kagome)
+
+        with self.assertRaises(ValueError):
+            Triangular(3, 3, pbc=True).translation((1, 0))
+
+    def test_flat_index(self):
+        lattice = Square(3, 4, pbc=True)
+        for i, j in [(0, 0), (1, 2), (2, 3)]:
+            self.assertEqual(lattice.index((i, j)), 4 * i + j)
+            self.assertEqual(utils.hash_grid((i, j), (3, 4)), 4 * i + j)
+        coords = lattice.coordinates()
+        self.assertEqual(list(lattice.index(coords)), list(lattice.sites()))
+
+        configs = torch.stack([utils.randspin((3, 4)) for _ in range(5)])
+        flat = lattice.flatten(configs)
+        self.assertEqual(tuple(flat.shape), (5, 12))
+        self.assertEqual(flat[2, lattice.index((1, 2))], configs[2, 1, 2])
+        self.assertTrue(torch.equal(lattice.unflatten(flat), configs))
+        self.assertEqual(tuple(lattice.flatten(configs[0]).shape), (12, ))
+
+        index = lattice.bond_index(1)
+        self.assertIs(lattice.bond_index(1), index)
+        self.assertEqual(index.tolist(), lattice.bonds(1).tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
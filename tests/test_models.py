@@ -0,0 +1,101 @@
+import unittest
+import torch
+import numpy as np
+from vmc import utils
+from vmc.ham import TFI, XXZ
+from vmc.lattice import Chain, Square
+from vmc.models import RBM
+from vmc.sampler import STMetropolis
+from vmc.collector import STCollector
+
+
+class TestRBM(unittest.TestCase):
+
+    def test_log_psi_ratio(self):
+        model = RBM(8, hidden=16, scale=0.3)
+        x = utils.randspin((8, ))
+        configs = torch.stack([utils.randspin((8, )) for _ in range(5)])
+        ratio = model.log_psi_ratio(x, utils.flip_sites(x, configs))
+        exact = model.log_psi(configs) - model.log_psi(x)
+        self.assertLess(float(torch.max(torch.abs(ratio - exact))), 1e-10)
+
+        flips = torch.LongTensor([1, 4])
+        y = x.clone()
+        y[flips] *= -1
+        model.update(x, flips)
+        self.assertAlmostEqual(float(model.log_psi_ratio(y, [])), 0)
+        self.assertAlmostEqual(float(model.log_psi_ratio(y, flips)),
+                               float(model.log_psi(x) - model.log_psi(y)))
+
+    def test_eloc(self):
+        for lattice in [Chain(6, pbc=True), Square(10, 10, pbc=True)]:
+            model = RBM(lattice.numel(), scale=1.0 / lattice.numel())
+            x = utils.randspin(lattice.size())
+            for h in [TFI(mag=0.7, lattice=lattice),
+                      XXZ(J=(1.0, 0.4), nbr=1, lattice=lattice)]:
+                exact = sum(float(val) * torch.exp(
+                    model.log_psi(rhs) - model.log_psi(x))
+                    for rhs, val in h.nnz(x.clone()))
+                self.assertAlmostEqual(float(utils.eloc(x, model, h)),
+                                       float(exact),
+                                       delta=1e-6 * abs(float(exact)))
+
+    def test_sampler(self):
+        model = RBM(4, scale=0.8)
+        collector = STCollector(merge=False)
+        sampler = STMetropolis(model, size=(4, ), collector=collector,
+                               bar=False)
+        sampler.sample(itr=20000, burn=500, thin=1)
+        sample_p = np.zeros(2 ** 4)
+        for config in collector:
+            sample_p[utils.bin(config)] += 1
+        configs = torch.from_numpy(utils.decode(np.arange(2 ** 4), 4))
+        exact_p = model(configs).detach().numpy() ** 2
+        self.assertLess(np.abs(sample_p / sample_p.sum() -
+                               exact_p / exact_p.sum()).max(), 0.03)
+        # accept weights are probabilities |psi|^2
+        prob = float(model(collector['sample'][-1].view(1, -1))) ** 2
+        self.assertAlmostEqual(collector['accept'][-1], prob,
+                               delta=1e-8 * prob)
+
+    def test_sampler_inverse(self):
+        model = RBM(4, scale=0.8)
+        model.a.data += 0.5
+        collector = STCollector(merge=False)
+        sampler = STMetropolis(model, size=(4, ), collector=collector,
+                               bar=False)
+        sampler.inverse = 0.5
+        sampler.sample(itr=200, burn=10, thin=1)
+        for config, weight in zip(collector['sample'],
+                                  collector['accept']):
+            prob = float(model(config.view(1, -1))) ** 2
+            self.assertAlmostEqual(weight, prob, delta=1e-8 * prob)
+
+    def test_sampler_large_amplitudes(self):
+        # log|psi|^2 is far beyond the range of floats
+        model = RBM(64, hidden=64, scale=2.0)
+        sampler = STMetropolis(model, size=(64, ), bar=False)
+        self.assertGreater(sampler.state['logprob'], 710)
+        sampler.sample(itr=200, burn=10)
+        logprob = 2 * float(model.log_psi(sampler.state['last']))
+        self.assertAlmostEqual(sampler.state['logprob'], logprob,
+                               delta=1e-8 * abs(logprob))
+
+    def test_sampler_flat(self):
+        lattice = Square(3, 3, pbc=True)
+        model = RBM(9, scale=0.3)
+        collector = STCollector(merge=False)
+        sampler = STMetropolis(model, size=lattice, collector=collector,
+                               bar=False)
+        sampler.sample(itr=50, burn=5, thin=1)
+        self.assertEqual(tuple(sampler.state['last'].shape), (9, ))
+        for config in collector:
+            self.assertEqual(tuple(config.shape), (9, ))
+        h = TFI(mag=0.7, lattice=lattice)
+        config = sampler.state['last']
+        self.assertAlmostEqual(float(utils.eloc(config, model, h)), float(
+            utils.eloc(lattice.unflatten(config), model, h)))
+
+
+if __name__ == '__main__':
+    unittest.main()
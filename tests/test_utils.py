@@ -1,5 +1,22 @@
+import os
+import json
 import unittest
+import tempfile
+import torch
+from types import SimpleNamespace
+import numpy as np
+from vmc import utils
+from vmc.ham import TFI, XXZ, J1J2
+from vmc.ham.sector import SzSector, MomentumSector
+from vmc.lattice import Chain, Square
+from vmc.models import RBM
 from vmc.utils.decorators import typecheck
+from vmc.utils.bits import *
+from vmc.configs import gray_code
+from vmc.utils.cache import ElocCache
+from vmc.utils.files import DiskCache, signature, default_cache, _sector
+from vmc.utils.files import CACHE_BUDGET
+from vmc.utils.exact import ExactEnergy
 
 
 class TestDecorators(unittest.TestCase):
@@ -40,5 +57,214 @@ class TestDecorators(unittest.TestCase):
         foo(1, 111, name="Peter", sex=2)
 
 
+class TestBits(unittest.TestCase):
+
+    def test_encode(self):
+        codes = np.arange(2 ** 6)
+        self.assertTrue(np.array_equal(encode(decode(codes, 6)), codes))
+        self.assertTrue(np.array_equal(popcount(codes),
+                                       np.sum(decode(codes, 6) > 0, 1)))
+
+    def test_comb_rank(self):
+        n = 8
+        for k in range(n + 1):
+            codes = np.array([x for x in range(2 ** n)
+                              if format(x, 'b').count('1') == k])
+            ranks = np.arange(len(codes))
+            self.assertTrue(np.array_equal(comb_rank(codes, n), ranks))
+            self.assertTrue(np.array_equal(comb_unrank(ranks, n, k), codes))
+
+
+class TestElocCache(unittest.TestCase):
+
+    def test_eloc(self):
+        h = TFI(mag=0.7, lattice=Chain(4, pbc=True))
+        model = torch.nn.Linear(4, 1).double()
+        cache = ElocCache(h, lambda x: model(x.double()).sum(), maxsize=8,
+                          params=model.parameters())
+        configs = list(torch.from_numpy(decode(np.arange(12), 4)).float())
+
+        def eloc(config):
+            return utils.eloc(config, lambda x: model(x.double()).sum(), h)
+
+        for config in configs + configs[-4:]:
+            self.assertAlmostEqual(cache.eloc(config).item(),
+                                   eloc(config).item())
+        self.assertEqual(cache.stats()['eloc'][:2], (4, 12))
+        self.assertEqual(len(cache.eloc_cache), 8)
+
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        model(configs[-1].double()).sum().backward()
+        optimizer.step()
+        self.assertAlmostEqual(cache.eloc(configs[-1]).item(),
+                               eloc(configs[-1]).item())
+        self.assertEqual(cache.stats()['eloc'][:2], (4, 13))
+        self.assertEqual(cache.stats()['connections'][:2], (1, 12))
+
+    def test_large_lattice(self):
+        h = TFI(mag=0.7, lattice=Square(10, 10, pbc=True))
+        model = RBM(100, scale=0.3)
+        cache = ElocCache(h, model)
+        down = -torch.ones(10, 10)
+        up = down.clone()
+        up.view(-1)[70] = 1
+        self.assertNotEqual(cache.key(down), cache.key(up))
+        for config in [down, up, down, up]:
+            self.assertAlmostEqual(cache.eloc(config).item(),
+                                   utils.eloc(config, model, h).item())
+        self.assertEqual(cache.stats()['eloc'][:2], (2, 2))
+
+
+class TestExactEnergy(unittest.TestCase):
+
+    def test_energy(self):
+        h = TFI(mag=0.7, lattice=Chain(8, pbc=True))
+        model = RBM(8, scale=0.3)
+        configs = torch.from_numpy(decode(np.arange(2 ** 8), 8))
+        psi = model(configs)
+        matrix = torch.from_numpy(h.mat().toarray()).to(psi.dtype)
+        exact = psi.dot(matrix.mv(psi)) / psi.dot(psi)
+        grads = torch.autograd.grad(exact, list(model.parameters()))
+
+        for method in ['sparse', 'matrix_free']:
+            energy = ExactEnergy(h, method=method, chunk=50)
+            loss = energy(model)
+            self.assertAlmostEqual(float(loss), float(exact))
+            for grad, each in zip(torch.autograd.grad(
+                    loss, list(model.parameters())), grads):
+                self.assertLess(float(torch.max(torch.abs(grad - each))),
+                                1e-10)
+
+        exact, _ = utils.ground(h, cache=False)
+        self.assertGreater(float(utils.exact_energy(model, h)), exact)
+
+    def test_gray_walk(self):
+        model = RBM(6, scale=0.3)
+        for h in [TFI(mag=0.5, lattice=Chain(6, pbc=True)),
+                  TFI(mag=0.5, lattice=Chain(6)),
+                  J1J2(J=(1, 0.4), lattice=Square(2, 3, pbc=True))]:
+            delta = h.pauli().diag_delta(np.arange(64), np.arange(64) % 6)
+            self.assertTrue(np.allclose(
+                h.diag_delta(np.arange(64), np.arange(64) % 6), delta))
+            walk = list(utils.gray_walk(h, model, chunk=20, start=3))
+            codes = np.concatenate([each[0] for each in walk])
+            self.assertEqual(sorted(codes.tolist()),
+                             sorted(gray_code(np.arange(3, 64)).tolist()))
+            for codes, sites, diag, mag, log_psi in walk:
+                configs = torch.from_numpy(decode(codes, 6))
+                self.assertTrue(np.allclose(diag, h.diag_bits(codes)))
+                self.assertTrue(np.all(mag == configs.sum(1).numpy()))
+                self.assertTrue(np.allclose(
+                    log_psi, model.log_psi(configs).detach().numpy()))
+            batched = utils.gray_walk(
+                h, SimpleNamespace(log_psi=model.log_psi), chunk=20, start=3)
+            for each, other in zip(walk, batched):
+                self.assertTrue(np.allclose(each[4], other[4]))
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_partition(self):
+        self.assertEqual(utils.shards(10, 3), [(0, 3), (3, 6), (6, 10)])
+        h = TFI(mag=0.5, lattice=Chain(10, pbc=True))
+        partition = utils.Partition(10, workers=3, chunk=100)
+        diag = h.diag_bits(np.arange(2 ** 10))
+        self.assertAlmostEqual(partition.sum(lambda codes: h.diag_bits(
+            codes) ** 2), np.sum(diag ** 2))
+        hist = partition.histogram(popcount, 11, weights=h.diag_bits)
+        self.assertTrue(np.allclose(hist, np.bincount(
+            popcount(np.arange(2 ** 10)), diag)))
+        self.assertEqual(sum(partition.map(len)), 2 ** 10)
+
+        sector = SzSector(10, sz=1)
+        partition = utils.Partition(10, sector=sector, workers=2)
+        codes = np.concatenate(partition.map(lambda codes: codes))
+        self.assertTrue(np.all(codes == sector.states()))
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_sweep(self):
+        lattice = Chain(12, pbc=True)
+        for h, param, values, sz in [
+                (TFI(mag=1.0, lattice=lattice), 'mag', [0.5, 0.8, 1.2], None),
+                (J1J2(J=(1.0, 0.0), lattice=lattice), 'J',
+                 [(1.0, 0.1), (1.0, 0.3), (0.8, 0.5)], 0)]:
+            sweep = utils.Sweep(h, param, sz=sz)
+            energies, gaps, states = sweep.run(values, k=2)
+            for value, energy, state in zip(values, energies, states):
+                h.params[param] = value
+                exact, _ = utils.ground(h, sz=sz, cache=False)
+                self.assertAlmostEqual(energy[0], exact, places=5)
+                matrix = h.mat(sector=sweep.sector)
+                self.assertLess(abs(sweep.matrix(value) - matrix).max(), 1e-5)
+            self.assertTrue(np.allclose(gaps, energies[:, 1] - energies[:, 0]))
+
+            parallel, _, _ = sweep.run(values, k=2, states=False, segments=2)
+            self.assertTrue(np.allclose(parallel, energies))
+            parallel, _, seeded = sweep.run(values, k=2, segments=3)
+            self.assertTrue(np.allclose(parallel, energies))
+            self.assertTrue(np.allclose(
+                np.abs(np.sum(seeded.conj() * states, 1)), 1))
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def test_ground(self):
+        h = XXZ(J=(1.0, 0.5), nbr=1, lattice=Chain(8, pbc=True))
+        self.assertEqual(signature(h), signature(
+            XXZ(J=(1.0, 0.5), nbr=1, lattice=Chain(8, pbc=True))))
+        self.assertNotEqual(signature(TFI(mag=1.0, lattice=Chain(4))),
+                            signature(TFI(mag=0.5, lattice=Chain(4))))
+        lattice = h.lattice
+        key = signature(h, MomentumSector(lattice, k=3, sz=0))
+        self.assertEqual(key, signature(h, MomentumSector(
+            lattice, k=np.array([3]), sz=0)))
+        self.assertIn('"k": [3]', json.dumps(_sector(
+            MomentumSector(lattice, k=3, sz=0))))
+        for other in [MomentumSector(lattice, k=2, sz=0),
+                      MomentumSector(lattice, k=0, reflection=1, sz=0),
+                      MomentumSector(lattice, k=0, reflection=-1, sz=0),
+                      SzSector(8, sz=0)]:
+            self.assertNotEqual(key, signature(h, other))
+
+        with tempfile.TemporaryDirectory() as root:
+            cache = DiskCache(root)
+            energy, state = utils.ground(h, sz=0, cache=cache)
+            self.assertEqual(len(cache.entries()), 2)
+            key = signature(h, SzSector(8, sz=0), kind='ground')
+            cached, cached_state = utils.ground(h, sz=0, cache=cache)
+            self.assertEqual(energy, cached)
+            self.assertTrue(np.array_equal(state, cached_state))
+            cached_state[0] = 0
+            self.assertEqual(cache.eigen(key)[1][0], state[0])
+            os.remove(os.path.join(cache.path(key), 'state.npy'))
+            self.assertIsNone(cache.eigen(key))
+            self.assertNotIn(key, cache)
+            self.assertEqual(utils.ground(h, sz=0, cache=cache)[0], energy)
+            self.assertIn(key, cache)
+            self.assertLess(abs(cache.matrix(h) - h.mat()).max(), 1e-10)
+            cache.matrix(h, dtype=np.float64)
+            self.assertEqual(len(cache.entries()), 3)
+
+            cache.evict(budget=cache.size() - 1)
+            self.assertEqual(len(cache.entries()), 2)
+            cache.clear()
+            self.assertEqual(cache.entries(), [])
+
+            if not os.environ.get('VMC_CACHE'):
+                self.assertIsNone(default_cache())
+                self.assertEqual(default_cache(root).root, cache.root)
+                if not os.environ.get('VMC_CACHE_BUDGET'):
+                    self.assertEqual(default_cache(root).budget,
+                                     CACHE_BUDGET)
+
+            cache = DiskCache(root, matrices=False)
+            utils.ground(h, sz=0, cache=cache)
+            self.assertEqual([name for _, _, key in cache.entries()
+                              for name in sorted(os.listdir(cache.path(key)))],
+                             ['energy.npy', 'state.npy'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -11,6 +11,7 @@ import vmc.lattice
 import vmc.ham
 import vmc.basis
 import vmc.models
+import vmc.dynamics
 
 Warning('module vmc.serialization need tests')
 import vmc.legacy.serialization
@@ -29,6 +30,7 @@ __all__ = [
     'lattice',
     'ham',
     'utils',
+    'dynamics',
     'save',
     'load',
 ]
@@ -1,6 +1,7 @@
 import torch
 from torch.autograd import Variable
 from numbers import Number
+from vmc.configs import ConfigBatch
 
 gradient = object()
 
@@ -158,15 +159,17 @@ class CollectorBase(object):
                 self.collect_sample(sample, accept=accept)
             else:
                 self.collect_sample(sample)
-        elif torch.is_tensor(args[0]) and isinstance(args[1], Number):
+        elif (torch.is_tensor(args[0]) or isinstance(args[0], ConfigBatch)) \
+                and isinstance(args[1], Number):
             self.collect_sample(args[0], accept=args[1])
         else:
             for each in args:
-                if torch.is_tensor(each) or isinstance(each, ndarray):
+                if torch.is_tensor(each) or isinstance(each, ndarray) or \
+                        isinstance(each, ConfigBatch):
                     self.collect_sample(each, accept=None)
                 elif not args:
-                    raise ValueError("collector only collects"
-                                     " torch.Tensor or numpy.ndarray")
+                    raise ValueError("collector only collects torch.Tensor,"
+                                     " numpy.ndarray or ConfigBatch")
         if kwargs:
             self.collect_(**kwargs)
 
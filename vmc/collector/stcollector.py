@@ -1,17 +1,20 @@
 from .base import CollectorBase
+from vmc.configs import ConfigBatch
 
 
 class STCollector(CollectorBase):
     """native single thread collector
 
     This is a simple implementation of collector, the single thread collector
-    collects samples to a python dict in the cpu memory on a single thread
+    collects samples to a python dict in the cpu memory on a single thread,
+    merged samples of `ConfigBatch` are looked up by hashing
     """
 
     def __init__(self, device='cpu', merge=False, accept=True, params=None):
         super(STCollector, self).__init__(device, merge, params=params)
         self.data = dict()
         self.data['sample'] = []
+        self.index = dict()
         self.state = dict()
         self.state['merge'] = merge
         self.state['accept'] = accept
@@ -36,6 +39,12 @@ class STCollector(CollectorBase):
         return tuple(ret)
 
     def merge_sample(self, sample):
+        if isinstance(sample, ConfigBatch):
+            if sample in self.index:
+                self.data['count'][self.index[sample]] += 1
+                return True
+            self.index[sample] = len(self.data['sample'])
+            return False
         for i, each in enumerate(self.data['sample']):
             if each.equal(sample):
                 self.data['count'][i] += 1
@@ -74,6 +83,13 @@ class STCollector(CollectorBase):
         else:
             return self.grad_groups
 
+    def batch(self):
+        """collected samples as a `ConfigBatch`, tensors are packed"""
+        return ConfigBatch.cat(
+            each if isinstance(each, ConfigBatch)
+            else ConfigBatch.pack(each, size=tuple(each.shape))
+            for each in self.data['sample'])
+
     def __merged_iter__(self):
         for i, sample in enumerate(self.data['sample']):
             for j in range(self.data['count'][i]):
@@ -81,6 +97,7 @@ class STCollector(CollectorBase):
 
     def clear(self, keys=None):
         if keys is None:
+            self.index.clear()
             self.data.clear()
             self.data['sample'] = []
             if self.state['merge']:
@@ -90,3 +107,5 @@ class STCollector(CollectorBase):
         else:
             for each in keys:
                 self.data[each].clear()
+                if each == 'sample':
+                    self.index.clear()
@@ -8,19 +8,29 @@ TODO:
 """
 
 from .base import GeneratorBase
+from .batch import ConfigBatch, nwords
 from .iterall import IterateAll
+from .gray import GrayCode, gray_code, gray_index, gray_sites
 from .randselect import RandomSelect
 from .spinconserve import SpinConserve
+from .sector import SectorIterate
 
 
 __all__ = [
     '__traits__',
     'GeneratorBase',
+    'ConfigBatch',
+    'nwords',
     'isgenerator',
     'Generator',
     'IterateAll',
+    'GrayCode',
+    'gray_code',
+    'gray_index',
+    'gray_sites',
     'RandomSelect',
     'SpinConserve',
+    'SectorIterate',
 ]
 
 # style guide
@@ -38,6 +48,10 @@ __traits__ = {
     'ia': IterateAll,
     'iterall': IterateAll,
     'iterate all': IterateAll,
+    'gc': GrayCode,
+    'gray code': GrayCode,
+    'si': SectorIterate,
+    'sector iterate': SectorIterate,
 }
 
 
@@ -1,18 +1,25 @@
+from vmc.lattice import config_size
+
+
 class GeneratorBase(object):
     """Base type for generators
 
     Generators offers methods to generate configurations, it should implement
-    at least a `propose` method to propose next generator state
+    at least a `propose` method to propose next generator state. `factor`
+    is the ratio of backward and forward proposal probabilities of the
+    last proposal, 1 for symmetric proposals. A lattice given as size
+    generates flat configurations of its sites.
     """
 
     def __init__(self, name, **params):
         super(GeneratorBase, self).__init__()
         self.name = name
         if 'size' in params:
-            self.size = params['size']
+            self.size = config_size(params['size'])
         else:
             self.size = None
         self.params = params
+        self.factor = 1.0
 
     def __str__(self):
         ret = '%s\n' % (self.name)
@@ -31,3 +38,15 @@ class GeneratorBase(object):
 
     def propose(self):
         pass
+
+    def accept(self, accepted):
+        """notification of the sampler, if the last proposal
+        is accepted
+        """
+        pass
+
+    def reset(self):
+        """notification of the sampler, the configuration is
+        changed in place, e.g. inverted
+        """
+        pass
@@ -0,0 +1,229 @@
+"""bit packed batches of configurations
+
+a configuration of N spins on {-1, 1} is stored as ceil(N / 64) words
+of numpy.uint64, bit k of word w is set when the (64 w + k)-th
+(flattened) spin is up, which is the bit convention of `vmc.utils.bin`
+and `vmc.utils.encode`. A batch costs 8 bytes per 64 spins, instead of
+4 (or 8) bytes per spin of float tensors.
+"""
+
+import torch
+import numpy as np
+
+__all__ = [
+    'ConfigBatch',
+    'nwords',
+]
+
+
+# little endian words, so bytes of packbits are words in order
+_WORD = np.dtype('<u8')
+
+
+def nwords(n):
+    """number of 64 bit words of n spins"""
+    return max((n + 63) // 64, 1)
+
+
+def _size(size):
+    if isinstance(size, int):
+        return (size, )
+    return tuple(int(each) for each in size)
+
+
+class ConfigBatch(object):
+    """a batch of bit packed configurations
+
+    Params:
+        words: numpy.uint64 words, shape (B, W), W = nwords(N)
+        size: size of a configuration, e.g. (4, 4)
+
+    a batch of one configuration is hashable, and is equal to another
+    one iff they have the same size and spins, so it can be used as a
+    key of dicts.
+
+    Example:
+        batch = ConfigBatch.pack(configs)  # shape (B, 4, 4)
+        index = batch.index()  # basis indices
+        configs = batch.unpack()
+    """
+
+    def __init__(self, words, size):
+        super(ConfigBatch, self).__init__()
+        self.size = _size(size)
+        self.n = int(np.prod(self.size))
+        words = np.ascontiguousarray(words, dtype=_WORD)
+        self.words = words.reshape(-1, nwords(self.n))
+
+    @classmethod
+    def pack(cls, configs, size=None):
+        """pack configurations on {-1, 1}
+
+        Params:
+            configs: a tensor or numpy.ndarray, shape (B, ) + size,
+                or a single configuration of shape size
+            size: size of a configuration, default: configs.shape[1:],
+                or configs.shape for a 1-D configuration
+
+        Returns:
+            a `ConfigBatch`
+        """
+        if isinstance(configs, cls):
+            return configs
+        if torch.is_tensor(configs):
+            configs = configs.detach().cpu().numpy()
+        configs = np.asarray(configs)
+        if size is None:
+            size = configs.shape if configs.ndim == 1 else configs.shape[1:]
+        size = _size(size)
+        n = int(np.prod(size))
+        bits = configs.reshape(-1, n) > 0
+        pad = nwords(n) * 64 - n
+        if pad:
+            bits = np.concatenate(
+                [bits, np.zeros((len(bits), pad), dtype=bool)], 1)
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        return cls(packed.view(_WORD), size)
+
+    @classmethod
+    def from_codes(cls, codes, size):
+        """configurations of basis indices (codes)
+
+        Params:
+            codes: integers, numpy.int64 or python ints for more than
+                63 spins
+            size: size of a configuration
+        """
+        size = _size(size)
+        n = int(np.prod(size))
+        width = nwords(n)
+        if n <= 63:
+            codes = np.asarray(codes).astype(np.int64).reshape(-1, 1)
+            return cls(codes.astype(_WORD), size)
+        mask = (1 << 64) - 1
+        words = [[(int(code) >> (64 * k)) & mask for k in range(width)]
+                 for code in np.asarray(codes, dtype=object).reshape(-1)]
+        return cls(np.array(words, dtype=_WORD).reshape(-1, width), size)
+
+    @classmethod
+    def cat(cls, batches):
+        """concatenate batches of the same size"""
+        batches = list(batches)
+        size = batches[0].size
+        for each in batches:
+            if each.size != size:
+                raise ValueError("sizes of configurations mismatch: %s, %s"
+                                 % (size, each.size))
+        return cls(np.concatenate([each.words for each in batches]), size)
+
+    def up(self):
+        """spins as booleans (True for up), shape (B, N)"""
+        bits = np.unpackbits(self.words.view(np.uint8), axis=1,
+                             bitorder='little')
+        return bits[:, :self.n].astype(bool)
+
+    def unpack(self, dtype=None):
+        """configurations on {-1, 1}
+
+        Params:
+            dtype: torch dtype, default: torch default dtype
+
+        Returns:
+            a tensor of shape (B, ) + size
+        """
+        dtype = dtype or torch.get_default_dtype()
+        spins = 2 * self.up().astype(np.int8) - 1
+        return torch.from_numpy(spins).to(dtype).view((-1, ) + self.size)
+
+    def index(self):
+        """basis indices (codes) of configurations
+
+        Returns:
+            a numpy.int64 array, or an object array of python ints
+            when there are more than 63 spins
+        """
+        if self.n <= 63:
+            return self.words[:, 0].astype(np.int64)
+        ret = np.zeros(len(self), dtype=object)
+        for k in range(self.words.shape[1]):
+            ret += np.array([int(each) << (64 * k)
+                             for each in self.words[:, k]], dtype=object)
+        return ret
+
+    def keys(self):
+        """hashable keys of configurations, ints (one word) or tuples"""
+        if self.words.shape[1] == 1:
+            return self.words[:, 0].tolist()
+        return [tuple(each) for each in self.words.tolist()]
+
+    def equal(self, other):
+        """elementwise equality of configurations, shape (B, )"""
+        other = ConfigBatch.pack(other, size=self.size)
+        return np.all(self.words == other.words, axis=1)
+
+    def flip(self, sites):
+        """configurations with flipped spins
+
+        Params:
+            sites: flattened sites, shape (B, ) or (B, K), sites of
+                -1 are ignored (padding, see `vmc.utils.mask_sites`)
+
+        Returns:
+            a new `ConfigBatch`
+        """
+        sites = np.asarray(sites, dtype=np.int64).reshape(len(self), -1)
+        rows = np.repeat(np.arange(len(self)), sites.shape[1])
+        sites = sites.reshape(-1)
+        keep = sites >= 0
+        rows, sites = rows[keep], sites[keep]
+        words = self.words.copy()
+        bits = np.left_shift(np.uint64(1), (sites % 64).astype(_WORD))
+        np.bitwise_xor.at(words, (rows, sites // 64), bits)
+        return ConfigBatch(words, self.size)
+
+    def shift(self):
+        """binary add one to configurations (see `vmc.utils.shift`),
+        the last configuration wraps to the first one
+        """
+        words = self.words.copy()
+        carry = np.ones(len(self), dtype=bool)
+        for k in range(words.shape[1]):
+            words[carry, k] += np.uint64(1)
+            carry &= words[:, k] == 0
+        rest = self.n % 64
+        if rest:
+            words[:, -1] &= np.uint64((1 << rest) - 1)
+        return ConfigBatch(words, self.size)
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, ind):
+        if isinstance(ind, (int, np.integer)):
+            ind = slice(ind, ind + 1 if ind != -1 else None)
+        return ConfigBatch(self.words[ind], self.size)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if not isinstance(other, ConfigBatch):
+            return NotImplemented
+        return self.size == other.size and \
+            np.array_equal(self.words, other.words)
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    def __hash__(self):
+        return hash((self.size, self.words.tobytes()))
+
+    def __repr__(self):
+        return 'ConfigBatch(%d configurations of size %s)' % (
+            len(self), self.size)
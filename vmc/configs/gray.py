@@ -0,0 +1,118 @@
+"""Gray code enumeration of configurations
+
+the i-th configuration of the walk has the code i ^ (i >> 1) (see
+`vmc.utils.bin` for codes), neighbouring configurations differ by a
+single spin, the one of the lowest set bit of i. Quantities of the
+walk (diagonal elements, magnetization, amplitudes with fast updates)
+can be updated from the flipped spin instead of being recomputed.
+"""
+
+import numpy as np
+from .batch import ConfigBatch
+from .iterall import IterateAll
+
+__all__ = [
+    'GrayCode',
+    'gray_code',
+    'gray_index',
+    'gray_sites',
+]
+
+
+def gray_code(index):
+    """codes of the index-th configurations of the walk"""
+    index = np.asarray(index, dtype=np.int64)
+    return index ^ (index >> 1)
+
+
+def gray_index(codes):
+    """positions of codes in the walk, the inverse of `gray_code`"""
+    index = np.array(codes, dtype=np.int64)
+    shift = 1
+    while shift < 64:
+        index ^= index >> shift
+        shift <<= 1
+    return index
+
+
+def _lowest_bit(index):
+    """position of the lowest set bit of positive integers"""
+    lowest = (index & -index).astype(np.float64)
+    return np.frexp(lowest)[1].astype(np.int64) - 1
+
+
+def gray_sites(start, stop):
+    """flipped sites of steps of the walk
+
+    Returns:
+        a numpy.int64 array, the i-th element is the site flipped from
+        the (start + i - 1)-th to the (start + i)-th configuration,
+        -1 for the first configuration of the walk
+    """
+    index = np.arange(start, stop, dtype=np.int64)
+    return np.where(index > 0, _lowest_bit(np.maximum(index, 1)), -1)
+
+
+class GrayCode(IterateAll):
+    """iterate all configurations in Gray code order
+
+    each step flips a single spin, the iteration yields pairs of a
+    configuration and the flipped site (-1 for the first one), the
+    configuration is updated in place, e.g.
+
+    for config, site in GrayCode(size=[2, 2]):
+        print(config, site)
+
+    with keyword chunk, pairs of blocks of configurations and their
+    flipped sites (see `gray_sites`) are iterated. start and stop are
+    positions in the walk. See `IterateAll` for other keywords.
+    """
+
+    def __init__(self, **kwargs):
+        super(GrayCode, self).__init__(**kwargs)
+        self.name = 'gray code'
+
+    def block(self, start, stop):
+        """configurations of the walk in [start, stop),
+        shape (stop - start, ) + size
+        """
+        codes = gray_code(np.arange(start, stop, dtype=np.int64))
+        return ConfigBatch.from_codes(codes, self.size).unpack(self.dtype)
+
+    def sites(self, data):
+        """the site flipped by the next step of configurations
+
+        Params:
+            data: a configuration or a `ConfigBatch`
+        """
+        if isinstance(data, ConfigBatch):
+            batch = data
+        else:
+            batch = ConfigBatch.pack(data, size=data.shape)
+        index = (gray_index(batch.index()) + 1) % (2 ** batch.n)
+        # the last configuration goes back to the first one
+        return np.where(index > 0, _lowest_bit(np.maximum(index, 1)),
+                        batch.n - 1)
+
+    def propose(self, data):
+        if isinstance(data, ConfigBatch):
+            return data.flip(self.sites(data))
+        cand = data.clone()
+        cand.view(-1)[int(self.sites(data)[0])] *= -1
+        return cand
+
+    def __next__(self):
+        start, stop = self.range()
+        if self.chunk is not None:
+            for each in range(start, stop, self.chunk):
+                end = min(each + self.chunk, stop)
+                yield self.block(each, end), gray_sites(each, end)
+            return
+        if start >= stop:
+            return
+        data = self.block(start, start + 1)[0].long().clone()
+        flat = data.view(-1)
+        yield data, -1
+        for site in gray_sites(start + 1, stop).tolist():
+            flat[site] *= -1
+            yield data, site
@@ -1,5 +1,9 @@
+import copy
 import torch
+import numpy as np
 from .base import GeneratorBase
+from .batch import ConfigBatch
+from vmc.utils.parallel import shards
 
 
 class IterateAll(GeneratorBase):
@@ -9,10 +13,29 @@ class IterateAll(GeneratorBase):
 
     for config in IterateAll(size=[2, 2]):
         print(config)
+
+    with keyword chunk, blocks of configurations of shape
+    (chunk, ) + size are iterated, they are unpacked from ranges of
+    basis indices at once, e.g.
+
+    for configs in IterateAll(size=[4, 4], chunk=2 ** 12):
+        amplitudes = model(configs)
+
+    Params:
+        size: size of a configuration
+        chunk: number of configurations of a block, default: iterate
+            one configuration at a time
+        start, stop: range of basis indices, default: all 2^N
+        dtype: torch dtype of blocks, default: torch.int64
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, chunk=None, start=0, stop=None, dtype=torch.int64,
+                 **kwargs):
         super(IterateAll, self).__init__('iterate all', **kwargs)
+        self.chunk = chunk
+        self.start = start
+        self.stop = stop
+        self.dtype = dtype
 
     def shift(self, data):
         """binary add one to configurations on {-1, 1}
@@ -27,14 +50,47 @@ class IterateAll(GeneratorBase):
         return data
 
     def propose(self, data):
+        if isinstance(data, ConfigBatch):
+            return data.shift()
         cand = data.clone()
         self.shift(cand)
         return cand
 
+    def range(self):
+        """(start, stop) of basis indices"""
+        numel = 2 ** int(np.prod(self.size))
+        stop = numel if self.stop is None else min(self.stop, numel)
+        return self.start, stop
+
+    def split(self, parts):
+        """generators of balanced contiguous sub-ranges, e.g. one for
+        each process (see `vmc.utils.Partition`)
+        """
+        start, stop = self.range()
+        ret = []
+        for first, last in shards(stop - start, parts):
+            each = copy.copy(self)
+            each.start, each.stop = start + first, start + last
+            ret.append(each)
+        return ret
+
+    def block(self, start, stop):
+        """configurations of basis indices in [start, stop),
+        shape (stop - start, ) + size
+        """
+        codes = np.arange(start, stop, dtype=np.int64)
+        return ConfigBatch.from_codes(codes, self.size).unpack(self.dtype)
+
     def __next__(self):
-        data = torch.zeros(
-            *self.size, out=torch.LongTensor()) - 1
+        start, stop = self.range()
+        if self.chunk is not None:
+            for each in range(start, stop, self.chunk):
+                yield self.block(each, min(each + self.chunk, stop))
+            return
+        if start >= stop:
+            return
+        data = self.block(start, start + 1)[0].long().clone()
         yield data
-        for i in range(2 ** data.numel() - 1):
+        for i in range(stop - start - 1):
             yield self.shift(data)
         return 1
@@ -1,4 +1,6 @@
+import numpy as np
 from .base import GeneratorBase
+from .batch import ConfigBatch
 from numpy.random import randint
 
 
@@ -9,6 +11,10 @@ class RandomSelect(GeneratorBase):
         super(RandomSelect, self).__init__('randselect', params=kwargs)
 
     def propose(self, data, nflips=1):
+        if isinstance(data, ConfigBatch):
+            # distinct sites of each configuration
+            order = np.argsort(np.random.rand(len(data), data.n), axis=1)
+            return data.flip(order[:, :nflips])
         cand = data.clone()
         if nflips == 1:
             ind = tuple(randint(0, each_size) for each_size in data.size())
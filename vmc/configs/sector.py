@@ -0,0 +1,98 @@
+import torch
+import numpy as np
+from .batch import ConfigBatch
+from .iterall import IterateAll
+from vmc.utils.bits import binomial, comb_rank, comb_unrank
+
+
+class SectorIterate(IterateAll):
+    """iterate configurations with a fixed number of up spins
+
+    configurations are ordered by `vmc.utils.comb_rank`, the order of
+    states of `vmc.ham.SzSector`, they are unranked directly, so only
+    the C(N, k) configurations of the sector are generated, e.g.
+
+    for configs in SectorIterate(size=[4, 4], sz=0, chunk=2 ** 12):
+        amplitudes = model(configs)
+
+    Params:
+        nup: number of up spins
+        sz: magnetization (n_up - n_down) / 2, instead of nup
+        start, stop: range of ranks, default: the whole sector
+
+    see `IterateAll` for other keywords.
+    """
+
+    def __init__(self, nup=None, sz=None, **kwargs):
+        super(SectorIterate, self).__init__(**kwargs)
+        self.name = 'sector iterate'
+        if (nup is None) == (sz is None):
+            raise TypeError("SectorIterate needs one of nup and sz")
+        self.nup = nup
+        self.sz = sz
+
+    def _sector(self):
+        """(number of spins, number of up spins)"""
+        if self.size is None:
+            raise ValueError('generator should be initialized with size')
+        n = int(np.prod(self.size))
+        nup = self.nup if self.sz is None else n / 2. + self.sz
+        if nup != int(nup) or not 0 <= nup <= n:
+            raise ValueError("invalid sector of %s up spins for %s sites"
+                             % (nup, n))
+        return n, int(nup)
+
+    def __len__(self):
+        n, nup = self._sector()
+        return int(binomial(n)[n, nup])
+
+    def range(self):
+        """(start, stop) of ranks"""
+        dim = len(self)
+        stop = dim if self.stop is None else min(self.stop, dim)
+        return self.start, stop
+
+    def codes(self, ranks):
+        """codes of configurations of ranks"""
+        n, nup = self._sector()
+        return comb_unrank(ranks, n, nup)
+
+    def block(self, start, stop):
+        """configurations of ranks in [start, stop),
+        shape (stop - start, ) + size
+        """
+        codes = self.codes(np.arange(start, stop, dtype=np.int64))
+        return ConfigBatch.from_codes(codes, self.size).unpack(self.dtype)
+
+    def random(self, count=1):
+        """uniformly random configurations of the sector, e.g. initial
+        states of `SpinConserve`
+
+        Returns:
+            a tensor of shape (count, ) + size
+        """
+        ranks = np.random.randint(0, len(self), count)
+        return ConfigBatch.from_codes(self.codes(ranks),
+                                      self.size).unpack(self.dtype)
+
+    def propose(self, data):
+        """the next configuration of the sector"""
+        n, nup = self._sector()
+        if isinstance(data, ConfigBatch):
+            ranks = (comb_rank(data.index(), n) + 1) % len(self)
+            return ConfigBatch.from_codes(self.codes(ranks), data.size)
+        batch = ConfigBatch.pack(data, size=data.shape)
+        rank = (comb_rank(batch.index(), n) + 1) % len(self)
+        cand = ConfigBatch.from_codes(self.codes(rank), data.shape)
+        return cand.unpack(data.dtype)[0]
+
+    def __next__(self):
+        start, stop = self.range()
+        chunk = self.chunk or 2 ** 10
+        for each in range(start, stop, chunk):
+            block = self.block(each, min(each + chunk, stop))
+            if self.chunk is not None:
+                yield block
+            else:
+                for config in block:
+                    yield config
@@ -1,23 +1,192 @@
+import random
+import numpy as np
 from .base import GeneratorBase
-from numpy.random import randint
+from .batch import ConfigBatch
 
 
 class SpinConserve(GeneratorBase):
-    """spin conserve methods"""
+    """spin conserve methods
 
-    def __init__(self, **kwargs):
+    a proposal exchanges a random up spin with a random down spin.
+    Sites of up and down spins of the last configuration are kept in
+    lists, so a proposal costs O(1) (O(degree) with bonds) instead of
+    searching for a spin to compensate a flip. The lists follow the
+    chain of proposals: the sampler tells whether a proposal is
+    accepted (see `GeneratorBase.accept`), without notification the
+    next configuration is matched by identity with the proposed one
+    and the previous one. Lists are rebuilt for other configurations,
+    configurations changed in place should be announced by `reset`.
+
+    Params:
+        lattice: exchange the ends of antiparallel bonds of the lattice
+            only, e.g. nearest neighbours, default: any pair of sites
+        nbr: class of the bonds, default: 1
+
+    with bonds, the number of antiparallel bonds changes from one
+    configuration to another, the ratio of backward and forward
+    proposal probabilities is kept in `factor` for the acceptance
+    (see `vmc.sampler.STMetropolis`).
+    """
+
+    def __init__(self, lattice=None, nbr=1, **kwargs):
         super(SpinConserve, self).__init__('spin conserve', params=kwargs)
+        self.lattice = lattice
+        self.nbr = nbr
+        self._config = None
+        self._pending = None
+        if lattice is not None:
+            self.bonds = lattice.bonds(nbr).tolist()
+            self.incident = [[] for _ in range(lattice.numel())]
+            for k, (i, j) in enumerate(self.bonds):
+                self.incident[i].append(k)
+                if j != i:
+                    self.incident[j].append(k)
 
     def propose(self, data, nflips=2):
-        cand = data.clone()
-        inds = [tuple(randint(0, each_size) for each_size in data.size())
-                for i in range(nflips)]
-        for ind in inds:
-            cand[ind] *= -1
-            for i in range(1000):
-                conserve_ind = tuple(randint(0, each_size)
-                                     for each_size in data.size())
-                if cand[conserve_ind] == cand[ind]:
-                    break
-            cand[conserve_ind] *= -1
+        """exchange nflips // 2 pairs of antiparallel spins
+
+        nflips counts flipped sites, the default proposes a single
+        exchange (it used to flip two sites and two compensating ones).
+        Configurations of a single direction (or without antiparallel
+        bonds) are proposed unchanged.
+        """
+        if isinstance(data, ConfigBatch):
+            return self._propose_packed(data, nflips)
+        if self.lattice is not None and nflips != 2:
+            raise ValueError("exchanges on bonds propose a single pair"
+                             " (nflips=2), not %s" % nflips)
+        self._sync(data)
+        before = len(self._anti) if self.lattice is not None else 0
+        swaps = []
+        for _ in range(nflips // 2):
+            pair = self._pair()
+            if pair is None:
+                break
+            self._swap(*pair)
+            swaps.append(pair)
+        if self.lattice is not None and swaps:
+            self.factor = before / len(self._anti)
+        else:
+            self.factor = 1.0
+
+        cand = data.contiguous().clone()
+        flat = cand.view(-1)
+        for i, j in swaps:
+            flat[i] *= -1
+            flat[j] *= -1
+        self._pending = (data, cand, swaps)
         return cand
+
+    def accept(self, accepted):
+        if self._pending is None:
+            return
+        data, cand, swaps = self._pending
+        self._pending = None
+        if accepted:
+            self._config = cand
+        else:
+            for i, j in reversed(swaps):
+                self._swap(j, i)
+            self._config = data
+
+    def reset(self):
+        self._config = None
+        self._pending = None
+
+    def _pair(self):
+        """(up site, down site) of a random exchange, or None"""
+        if self.lattice is None:
+            ups, downs = self._sites
+            if not ups or not downs:
+                return None
+            return random.choice(ups), random.choice(downs)
+        if not self._anti:
+            return None
+        i, j = self.bonds[random.choice(self._anti)]
+        return (i, j) if self._up[i] else (j, i)
+
+    def _sync(self, data):
+        """move the lists to data"""
+        if self._pending is not None:
+            self.accept(data is self._pending[1])
+        if self._config is not data:
+            self._build(data)
+            self._config = data
+
+    def _build(self, data):
+        spins = data.contiguous().view(-1).tolist()
+        self._up = [each > 0 for each in spins]
+        self._sites = ([], [])
+        self._pos = [0] * len(self._up)
+        for site, up in enumerate(self._up):
+            self._add(site, up)
+        if self.lattice is not None:
+            self._anti = []
+            self._apos = [-1] * len(self.bonds)
+            for k in range(len(self.bonds)):
+                self._update_bond(k)
+
+    def _add(self, site, up):
+        sites = self._sites[0 if up else 1]
+        self._pos[site] = len(sites)
+        sites.append(site)
+
+    def _remove(self, site, up):
+        sites = self._sites[0 if up else 1]
+        last = sites.pop()
+        if last != site:
+            sites[self._pos[site]] = last
+            self._pos[last] = self._pos[site]
+
+    def _update_bond(self, k):
+        i, j = self.bonds[k]
+        anti = self._up[i] != self._up[j]
+        if anti and self._apos[k] < 0:
+            self._apos[k] = len(self._anti)
+            self._anti.append(k)
+        elif not anti and self._apos[k] >= 0:
+            last = self._anti.pop()
+            if last != k:
+                self._anti[self._apos[k]] = last
+                self._apos[last] = self._apos[k]
+            self._apos[k] = -1
+
+    def _swap(self, i, j):
+        """flip the up spin on i and the down spin on j"""
+        self._remove(i, True)
+        self._remove(j, False)
+        self._up[i], self._up[j] = False, True
+        self._add(i, False)
+        self._add(j, True)
+        if self.lattice is not None:
+            for k in self.incident[i] + self.incident[j]:
+                self._update_bond(k)
+
+    def _propose_packed(self, data, nflips):
+        """exchange nflips // 2 random antiparallel pairs of each
+        configuration, vectorized over the batch, `factor` is an array
+        of factors of each configuration
+        """
+        factor = np.ones(len(data))
+        for _ in range(nflips // 2):
+            up = data.up()
+            if self.lattice is None:
+                keys = np.random.rand(*up.shape)
+                sites = np.stack([np.where(up, keys, -1).argmax(1),
+                                  np.where(up, -1, keys).argmax(1)], 1)
+                sites[~(up.any(1) & ~up.all(1))] = -1
+            else:
+                bonds = np.array(self.bonds, dtype=np.int64).reshape(-1, 2)
+                anti = up[:, bonds[:, 0]] != up[:, bonds[:, 1]]
+                keys = np.where(anti, np.random.rand(*anti.shape), -1)
+                sites = bonds[keys.argmax(1)] if len(bonds) else \
+                    np.zeros((len(data), 2), dtype=np.int64)
+                sites[~anti.any(1)] = -1
+                after = data.flip(sites).up()
+                count = np.sum(after[:, bonds[:, 0]] !=
+                               after[:, bonds[:, 1]], 1)
+                factor *= np.where(count > 0, anti.sum(1) /
+                                   np.maximum(count, 1), 1.0)
+            data = data.flip(sites)
+        self.factor = factor
+        return data
@@ -5,7 +5,7 @@ from tables import *
 import h5py
 import torch.utils.data as data
 
-from vmc.utils import bin
+from vmc.configs import ConfigBatch
 
 __all__ = [
     'STDS',
@@ -84,9 +84,8 @@ class STDS(data.Dataset):
 
     def check(self):
         p1 = self.state * self.state.conj()
-        p2 = np.zeros(*self.state.shape)
-        for each in self.train_data:
-            p2[bin(each)] += 1
+        p2 = np.bincount(ConfigBatch.pack(self.train_data).index(),
+                         minlength=len(self.state)).astype(np.float64)
         p2 /= np.linalg.norm(p2, ord=1)
         print('nornmalized frequency sum (should be 1): %s' % sum(p2))
         print('distance to exact (should be 0): %s' % np.linalg.norm(p2 - p1))
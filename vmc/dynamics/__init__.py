@@ -0,0 +1,9 @@
+"""Dynamics
+
+real time evolution of states, `expmv` computes the action of matrix
+exponentials and `AQC` evolves states along adiabatic schedules.
+"""
+
+from .expmv import *
+from .aqc import *
+from .gap import *
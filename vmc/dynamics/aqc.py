@@ -1,3 +1,164 @@
+"""adiabatic quantum computation
+
+the state is evolved under H(s) = (1 - s) H0 + s H1, s = schedule(t / T),
+each step applies exp(-i H(s) dt) with s at the midpoint of the step
+(exponential midpoint rule, second order in dt) by `expmv`, the
+hamiltonians are only applied to vectors, they are never formed as dense
+matrices.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator
+from vmc.utils import ed
+from .expmv import onenorm, expmv
+
+__all__ = [
+    'linear',
+    'AQC',
+]
+
+
+def linear(x):
+    """the linear schedule s = t / T"""
+    return x
+
+
 class AQC(object):
-    def __init__(self, *args, **kwargs):
+    """adiabatic evolution from H0 to H1
+
+    Params:
+        H0, H1: hamiltonians (see `vmc.ham`), sparse matrices
+            or LinearOperators of the same dimension
+        T: total time
+        steps: number of time steps
+        schedule: s as a function of t / T in [0, 1], default: linear
+        sector: a sector of the basis (see `vmc.ham.sector`), the
+            hamiltonians should conserve it
+        matrix_free: apply hamiltonians on the fly with
+            `as_linear_operator()` rather than assembling `mat()`,
+            keywords (chunk, workers) are passed to them
+        tol: relative tolerance of each step (see `expmv`)
+
+    Example:
+        aqc = AQC(TFI(mag=10.0, lattice=lattice), J1J2(lattice=lattice),
+                  T=100, steps=5000)
+        for t, s, state, values in aqc.evolve(checkpoints=50,
+                                              observables={'H1': aqc.H1}):
+            print(t, s, values['H1'])
+    """
+
+    def __init__(self, H0, H1, T, steps=1000, schedule=None, sector=None,
+                 matrix_free=False, tol=2 ** -53, **kwargs):
         super(AQC, self).__init__()
+        self.T = T
+        self.steps = steps
+        self.schedule = schedule or linear
+        self.sector = sector
+        self.matrix_free = matrix_free
+        self.kwargs = kwargs
+        self.tol = tol
+        # states are complex, real matrices would be cast on every product
+        self.H0, self.H1 = [h.astype(np.complex128) if sp.issparse(h) else h
+                            for h in map(self.operator, [H0, H1])]
+        if self.H0.shape != self.H1.shape:
+            raise ValueError("dimensions of H0 and H1 mismatch: %s, %s"
+                             % (self.H0.shape, self.H1.shape))
+        self.shape = self.H0.shape
+
+        # shifts and norms of the shifted hamiltonians, the norm of
+        # H(s) - mu(s) I is bounded by the weighted sum of them
+        self.mu, self.norms = [], []
+        for h in [self.H0, self.H1]:
+            mu = h.diagonal().mean() if hasattr(h, 'diagonal') else 0
+            if mu != 0:
+                h = h - mu * sp.identity(h.shape[0], format='csr')
+            self.mu.append(mu)
+            self.norms.append(onenorm(h))
+
+    def operator(self, op):
+        """a sparse matrix or LinearOperator of op"""
+        from vmc.ham import isham
+        if not isham(op):
+            return op
+        elif self.matrix_free:
+            return op.as_linear_operator(sector=self.sector, **self.kwargs)
+        return op.mat(sector=self.sector, **self.kwargs).tocsr()
+
+    @property
+    def dt(self):
+        return self.T / self.steps
+
+    def s(self, t):
+        return self.schedule(t / self.T)
+
+    def hamiltonian(self, s):
+        """H(s), a sparse matrix when both are sparse (one product per
+        application), a LinearOperator otherwise
+        """
+        H0, H1 = self.H0, self.H1
+        if sp.issparse(H0) and sp.issparse(H1):
+            return ((1 - s) * H0 + s * H1).tocsr()
+        dtype = np.result_type(H0.dtype, H1.dtype)
+        return LinearOperator(
+            self.shape, matvec=lambda x: (1 - s) * H0.dot(x) + s * H1.dot(x),
+            dtype=dtype)
+
+    def step(self, state, t, dt=None):
+        """evolve state from t to t + dt"""
+        dt = self.dt if dt is None else dt
+        s = self.s(t + dt / 2)
+        norm = abs(1 - s) * self.norms[0] + abs(s) * self.norms[1]
+        mu = (1 - s) * self.mu[0] + s * self.mu[1]
+        return expmv(self.hamiltonian(s), state, -1j * dt, tol=self.tol,
+                     norm=norm, mu=mu)
+
+    def initial_state(self):
+        """ground state of H0"""
+        _, state = ed(self.H0)
+        return state[:, 0]
+
+    def expectation(self, op, state):
+        if callable(op) and not hasattr(op, 'dot'):
+            return op(state)
+        return np.vdot(state, op.dot(state)).real
+
+    def evolve(self, state=None, checkpoints=1, observables=None):
+        """evolve the state and stream it at checkpoints
+
+        Params:
+            state: initial state, default: ground state of H0
+            checkpoints: number of evenly spaced checkpoints, or
+                a list of step indices (0 is the initial state)
+            observables: a dict of hermitian operators (hamiltonians,
+                sparse matrices, LinearOperators) or callables on the
+                state, evaluated at checkpoints
+
+        Yields:
+            (t, s, state, values) at checkpoints, values is a dict of
+            expectations of observables
+        """
+        if state is None:
+            state = self.initial_state()
+        state = np.asarray(state, dtype=np.complex128)
+        if np.isscalar(checkpoints):
+            checkpoints = np.linspace(0, self.steps, checkpoints + 1)[1:]
+        checkpoints = set(int(round(each)) for each in checkpoints)
+        observables = {name: self.operator(op)
+                       for name, op in (observables or {}).items()}
+
+        dt = self.dt
+        for k in range(self.steps + 1):
+            if k > 0:
+                state = self.step(state, (k - 1) * dt, dt)
+            if k in checkpoints:
+                t = k * dt
+                values = {name: self.expectation(op, state)
+                          for name, op in observables.items()}
+                yield t, self.s(t), state, values
+
+    def run(self, state=None):
+        """the final state"""
+        for _, _, state, _ in self.evolve(state, checkpoints=[self.steps]):
+            pass
+        return state
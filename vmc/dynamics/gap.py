@@ -0,0 +1,196 @@
+"""minimum gaps along interpolated hamiltonians
+
+the gap between the two lowest levels of H(s) = (1 - s) H0 + s H1 is
+scanned on a coarse grid, then only the brackets of local minima are
+refined, by parabolic steps through the three points of a bracket (the
+gap near an avoided crossing is smooth) or by bisection of its larger
+half. Lanczos of each point starts from the ground state of the nearest
+evaluated point.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from vmc.utils.sweep import aligned_data, lowest_eigen
+
+__all__ = [
+    'GapProfile',
+    'GapFinder',
+    'min_gap',
+]
+
+
+class GapProfile(object):
+    """evaluated points of a gap scan
+
+    Attributes:
+        s: evaluated points, ascending
+        energies: two lowest energies of each point, shape (P, 2)
+        gaps: energies[:, 1] - energies[:, 0]
+        minima: local minima, a list of (s, gap, s_error, gap_error)
+            sorted by gap, the first one is the minimum gap
+        evaluations: number of diagonalizations
+    """
+
+    def __init__(self, s, energies, minima, evaluations):
+        super(GapProfile, self).__init__()
+        self.s = s
+        self.energies = energies
+        self.gaps = energies[:, 1] - energies[:, 0]
+        self.minima = minima
+        self.evaluations = evaluations
+
+    def minimum(self):
+        """(s, gap, s_error, gap_error) of the minimum gap"""
+        return self.minima[0]
+
+
+def _parabola(x, y):
+    """vertex of the parabola through three points, or None"""
+    (x0, x1, x2), (y0, y1, y2) = x, y
+    denom = (x0 - x1) * (x0 - x2) * (x1 - x2)
+    a = (x2 * (y1 - y0) + x1 * (y0 - y2) + x0 * (y2 - y1)) / denom
+    if a <= 0:
+        return None
+    b = (x2 ** 2 * (y0 - y1) + x1 ** 2 * (y2 - y0) +
+         x0 ** 2 * (y1 - y2)) / denom
+    c = y0 - a * x0 ** 2 - b * x0
+    vertex = -b / (2 * a)
+    return vertex, c - b ** 2 / (4 * a)
+
+
+class GapFinder(object):
+    """adaptive search of the minimum gap of (1 - s) H0 + s H1
+
+    Params:
+        H0, H1: hamiltonians (see `vmc.ham`) or sparse matrices
+        sector: a sector of the basis (see `vmc.ham.sector`), the
+            hamiltonians should conserve it
+        tol: tolerance of Lanczos (see `eigsh`), 0 for machine precision
+        kwargs: keywords of `mat()` (chunk, workers)
+
+    Example:
+        profile = GapFinder(H0, H1).scan(points=11, xtol=1e-4)
+        s, gap, s_error, gap_error = profile.minimum()
+    """
+
+    def __init__(self, H0, H1, sector=None, tol=0, **kwargs):
+        super(GapFinder, self).__init__()
+        from vmc.ham import isham
+        H0, H1 = [h.mat(sector=sector, **kwargs).tocsr() if isham(h)
+                  else sp.csr_matrix(h) for h in [H0, H1]]
+        if H0.shape != H1.shape:
+            raise ValueError("dimensions of H0 and H1 mismatch: %s, %s"
+                             % (H0.shape, H1.shape))
+        self.shape = H0.shape
+        self.tol = tol
+        self.data, self.indices, self.indptr = aligned_data([H0, H1])
+        self.evaluations = 0
+
+    def matrix(self, s):
+        data = (1 - s) * self.data[0] + s * self.data[1]
+        return sp.csr_matrix((data, self.indices, self.indptr),
+                             shape=self.shape, copy=False)
+
+    def eigen(self, s, v0=None):
+        """two lowest energies and the ground state at s"""
+        self.evaluations += 1
+        energy, state = lowest_eigen(self.matrix(s), 2, v0=v0, tol=self.tol)
+        return energy, state[:, 0]
+
+    def scan(self, start=0.0, stop=1.0, points=11, xtol=1e-4, maxiter=100):
+        """scan the gap on [start, stop]
+
+        Params:
+            points: number of points of the initial uniform grid
+            xtol: brackets of minima are refined to this width
+            maxiter: maximum number of refinement rounds
+
+        Returns:
+            a `GapProfile`
+        """
+        if points < 3:
+            raise ValueError("at least 3 initial points, got %d" % points)
+        records, states = {}, {}
+        v0 = None
+        for s in np.linspace(start, stop, points):
+            records[s], v0 = self.eigen(s, v0)
+            states[s] = v0
+
+        for _ in range(maxiter):
+            s, gaps = self._profile(records)
+            candidates = []
+            for a, b, c in self._brackets(s, gaps):
+                if s[c] - s[a] > 2 * xtol:
+                    candidates.append(self._propose(s[[a, b, c]],
+                                                    gaps[[a, b, c]], xtol))
+            # states are only kept around brackets
+            keep = set(s[i] for bracket in self._brackets(s, gaps)
+                       for i in bracket)
+            for each in list(states):
+                if each not in keep:
+                    del states[each]
+            if not candidates:
+                break
+            for new in candidates:
+                if new in records:
+                    continue
+                nearest = min(states, key=lambda each: abs(each - new))
+                records[new], states[new] = self.eigen(new, states[nearest])
+
+        s, gaps = self._profile(records)
+        minima = []
+        for a, b, c in self._brackets(s, gaps):
+            s_error = max(s[c] - s[b], s[b] - s[a])
+            fit = _parabola(s[[a, b, c]], gaps[[a, b, c]]) \
+                if a != b != c else None
+            if fit is not None and s[a] <= fit[0] <= s[c]:
+                gap_error = abs(gaps[b] - fit[1])
+            else:
+                gap_error = max(gaps[a], gaps[c]) - gaps[b]
+            minima.append((s[b], gaps[b], s_error, gap_error))
+        minima.sort(key=lambda each: each[1])
+        energies = np.array([records[each] for each in s])
+        return GapProfile(s, energies, minima, self.evaluations)
+
+    @staticmethod
+    def _profile(records):
+        s = np.array(sorted(records))
+        gaps = np.array([records[each][1] - records[each][0] for each in s])
+        return s, gaps
+
+    @staticmethod
+    def _brackets(s, gaps):
+        """(left, minimum, right) indices around local minima"""
+        ret = []
+        last = len(s) - 1
+        for i in range(len(s)):
+            left, right = max(i - 1, 0), min(i + 1, last)
+            if gaps[i] <= gaps[left] and gaps[i] <= gaps[right] and \
+                    (gaps[i] < gaps[left] or gaps[i] < gaps[right] or
+                     left == i or right == i):
+                ret.append((left, i, right))
+        return ret
+
+    @staticmethod
+    def _propose(x, y, xtol):
+        """a new point in the bracket x[0] <= x[1] <= x[2]"""
+        left, right = x[1] - x[0], x[2] - x[1]
+        # parabolic steps, unless the bracket is lopsided
+        if 0 < left < 2 * right and 0 < right < 2 * left:
+            fit = _parabola(x, y)
+            if fit is not None and x[0] < fit[0] < x[2] and \
+                    min(abs(fit[0] - each) for each in x) > xtol / 2:
+                return fit[0]
+        if left > right:
+            return (x[0] + x[1]) / 2
+        return (x[1] + x[2]) / 2
+
+
+def min_gap(H0, H1, points=11, xtol=1e-4, sector=None, **kwargs):
+    """minimum gap of (1 - s) H0 + s H1, see `GapFinder`
+
+    Returns:
+        (s, gap, s_error, gap_error)
+    """
+    finder = GapFinder(H0, H1, sector=sector, **kwargs)
+    return finder.scan(points=points, xtol=xtol).minimum()
@@ -1,9 +1,8 @@
 """Hamiltonian
 
-this module provides quantum hamiltonians defined on lattices
-
-TODO:
-    * hamiltonian expr parser
+this module provides quantum hamiltonians defined on lattices,
+hamiltonians can be written as Pauli strings with `PauliSum`
+and composed with `+` and `*`.
 """
 
 from .base import HamiltonianBase
@@ -12,6 +11,7 @@ from .consts import ConstHamiltonian, SigmaX, SigmaY, SigmaZ
 from .local import one, two
 from .tfi import TFI
 from .heisenberg import J1J2, XXZ
+from .pauli import PauliSum
 
 
 __all__ = [
@@ -27,7 +27,8 @@ __all__ = [
     'two',
     'TFI',
     'J1J2',
-    'XXZ'
+    'XXZ',
+    'PauliSum'
 ]
 
 __traits__ = {
@@ -59,7 +60,9 @@ __traits__ = {
     'Local2SigmaZ': two.SigmaZ,
     'TFI': TFI,
     'J1J2': J1J2,
-    'XXZ': XXZ
+    'XXZ': XXZ,
+    'pauli': PauliSum,
+    'PauliSum': PauliSum
 }
 
 
@@ -1,8 +1,8 @@
-from vmc.configs import IterateAll
+import torch
+import numpy as np
 from vmc.lattice import Lattice, islattice, Chain
 import vmc.utils as utils
-from scipy.sparse.dok import _prod
-from scipy.sparse import lil_matrix
+from . import sparse
 
 
 class HamiltonianBase(object):
@@ -70,14 +70,318 @@ class HamiltonianBase(object):
         return the non-zero values in a hamiltonian H,
         with its related configurations
         """
-        RHS = config.clone()
-        if self.lattice.dim is not config.dim():
+        RHS = config.contiguous().clone()
+        flat = config.dim() == 1 and config.numel() == self.lattice.numel()
+        if self.lattice.dim is not config.dim() and not flat:
             raise ValueError('config size should meets hamiltonian')
         return self.nnz_iter(RHS)
 
     def nnz_iter(self, RHS):
         raise NotImplementedError
 
+    def nnz_batch(self, configs):
+        """batched non-zero values
+
+        return all the non-zero values of a batch of configurations
+        in one shot. This generic version wraps `nnz`, subclasses
+        should override it with a vectorized implementation.
+
+        Params:
+            configs: a tensor of configurations, shape (B, N) or (B, *size)
+
+        Returns:
+            RHS: connected configurations, shape (M, N)
+            vals: a DoubleTensor of matrix elements, shape (M, )
+            segment: a LongTensor of shape (M, ), the source row
+                of each connection in configs
+        """
+        configs = self._batch(configs)
+        RHS, vals, segment = [], [], []
+        for k in range(configs.size(0)):
+            config = configs[k].contiguous().view(*self.size)
+            for rhs, val in self.nnz(config):
+                RHS.append(rhs.contiguous().view(-1).clone())
+                vals.append(val.item() if torch.is_tensor(val) else val)
+                segment.append(k)
+        RHS = torch.stack(RHS)
+        vals = torch.from_numpy(np.array(vals))
+        segment = torch.LongTensor(segment)
+        return RHS, vals, segment
+
+    def nnz_bits(self, codes):
+        """non-zero values on integer coded configurations
+
+        configurations are coded as the integer `utils.bin` returns,
+        for lattices of up to 62 sites. This generic version decodes
+        codes and calls `nnz_batch`, subclasses may override it with
+        bit operations.
+
+        Params:
+            codes: a numpy.int64 array of codes, shape (B, )
+
+        Returns:
+            src: numpy array, index of source code of each connection
+            rhs: numpy.int64 array, codes of connected configurations
+            vals: numpy array, matrix elements
+
+        Raises:
+            ValueError: when the lattice has more than 62 sites
+        """
+        configs = utils.decode(codes, self.lattice.numel())
+        RHS, vals, segment = self.nnz_batch(torch.from_numpy(configs))
+        return segment.numpy(), utils.encode(RHS), vals.numpy()
+
+    def nnz_masks(self, codes):
+        """non-zero values as flip masks
+
+        Params:
+            codes: a numpy.int64 array of codes, shape (B, )
+
+        Returns:
+            src: numpy array, index of source code of each connection
+            masks: numpy.int64 array, sites flipped by each connection
+                as bits (rhs = codes[src] ^ masks)
+            vals: numpy array, matrix elements
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        src, rhs, vals = self.nnz_bits(codes)
+        return src, rhs ^ codes[src], vals
+
+    def nnz_flips(self, config):
+        """non-zero values as flip lists
+
+        connections are given by their flipped sites rather than
+        configurations, use `utils.apply_flips` to materialise them.
+        This generic version compares configurations of `nnz_batch`
+        with config, subclasses may override it with their bond tables
+        (see `_bond_flips`).
+
+        Params:
+            config: a configuration
+
+        Returns:
+            flips: a LongTensor of flattened sites, shape (M, K),
+                padded with -1
+            vals: a tensor of matrix elements, shape (M, )
+        """
+        RHS, vals, _ = self.nnz_batch(config.contiguous().view(1, -1))
+        return utils.flip_sites(config, RHS), vals
+
+    def diag_bits(self, codes):
+        """diagonal matrix elements on integer coded configurations
+
+        This generic version picks the diagonal out of `nnz_bits`,
+        subclasses may override it with bit operations.
+
+        Params:
+            codes: a numpy.int64 array of codes, shape (B, )
+
+        Returns:
+            a numpy array of diagonal elements, shape (B, )
+        """
+        codes = self._codes(codes)
+        src, rhs, vals = self.nnz_bits(codes)
+        diag = rhs == codes[src]
+        return sparse.segment_sum(src[diag], vals[diag], len(codes))
+
+    def diag_delta(self, codes, sites):
+        """changes of diagonal elements when single spins flip
+
+        This generic version evaluates `diag_bits` before and after
+        the flips, subclasses may override it with the O(degree)
+        terms around the flipped sites.
+
+        Params:
+            codes: a numpy.int64 array of codes, shape (B, )
+            sites: flipped sites, shape (B, )
+
+        Returns:
+            diag(codes ^ (1 << sites)) - diag(codes), shape (B, )
+        """
+        codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+        sites = np.asarray(sites, dtype=np.int64).reshape(-1)
+        return self.diag_bits(codes ^ (1 << sites)) - self.diag_bits(codes)
+
+    def diagonal(self, codes):
+        """diagonal matrix elements, looked up in the cached table
+        (see `cache_diagonal`) when there is one.
+        """
+        table = getattr(self, '_diagonal', None)
+        if table is None:
+            return self.diag_bits(codes)
+        return np.asarray(table[np.asarray(codes, dtype=np.int64)])
+
+    def cache_diagonal(self, chunk=2 ** 16, path=None):
+        """precompute the diagonal on the full basis
+
+        the table has 2^N elements indexed by the code of
+        configurations, `nnz`, `nnz_bits` and `mat` read the diagonal
+        from it afterwards. Call it again when parameters changed.
+
+        Params:
+            chunk: number of codes computed at once
+            path: a file to store the table in (numpy.memmap),
+                it is streamed to disk chunk by chunk, for
+                systems whose table does not fit in memory.
+
+        Returns:
+            the table, a numpy array (or numpy.memmap)
+        """
+        self._diagonal = None
+        self._diagonal = sparse.diagonal(self, chunk=chunk, path=path)
+        return self._diagonal
+
+    def clear_diagonal(self):
+        """drop the cached diagonal table"""
+        self._diagonal = None
+
+    def _cached_diagonal(self, config):
+        """cached diagonal element of a configuration, or None"""
+        table = getattr(self, '_diagonal', None)
+        if table is None:
+            return None
+        return table[utils.encode(config.view(1, -1))[0]].item()
+
+    def pauli(self):
+        """the hamiltonian as a `vmc.ham.PauliSum`
+
+        Raises:
+            NotImplementedError: when the hamiltonian has no
+            Pauli string form.
+        """
+        raise NotImplementedError
+
+    def _operand(self):
+        """the Pauli form as an operand of arithmetics, or None"""
+        try:
+            return self.pauli()
+        except NotImplementedError:
+            return None
+
+    def __add__(self, other):
+        pauli = self._operand()
+        return NotImplemented if pauli is None else pauli + other
+
+    def __radd__(self, other):
+        pauli = self._operand()
+        return NotImplemented if pauli is None else pauli.__radd__(other)
+
+    def __sub__(self, other):
+        pauli = self._operand()
+        return NotImplemented if pauli is None else pauli - other
+
+    def __rsub__(self, other):
+        pauli = self._operand()
+        return NotImplemented if pauli is None else pauli.__rsub__(other)
+
+    def __neg__(self):
+        pauli = self._operand()
+        if pauli is None:
+            raise TypeError("bad operand type for unary -: '%s'"
+                            % type(self).__name__)
+        return - pauli
+
+    def __mul__(self, other):
+        pauli = self._operand()
+        return NotImplemented if pauli is None else pauli * other
+
+    def __rmul__(self, other):
+        pauli = self._operand()
+        return NotImplemented if pauli is None else pauli.__rmul__(other)
+
+    def _batch(self, configs):
+        """flatten a batch of configurations to shape (B, N)"""
+        configs = configs.contiguous()
+        configs = configs.view(configs.size(0), -1)
+        if configs.size(1) != self.lattice.numel():
+            raise ValueError('config size should meets hamiltonian')
+        return configs
+
+    def _codes(self, codes):
+        """codes as a numpy.int64 array, the lattice should fit in
+        int64 codes (see `vmc.utils.bits`)
+        """
+        utils.check_bits(self.lattice.numel())
+        return np.asarray(codes, dtype=np.int64)
+
+    def _bond_bits(self, nbr):
+        """bond sites as numpy arrays, (first sites, second sites)"""
+        bonds = self.lattice.bonds(nbr)
+        return bonds[:, 0], bonds[:, 1]
+
+    def _bond_delta(self, codes, sites, nbr):
+        """changes of sum_(i, j) s_i s_j over bonds of class nbr when
+        single spins flip, only bonds of the flipped sites are visited
+        """
+        codes = np.asarray(codes, dtype=np.int64).reshape(-1, 1)
+        sites = np.asarray(sites, dtype=np.int64).reshape(-1)
+        # padded entries are the site itself, they count as parallel
+        table = self.lattice.neighbour_table(nbr)
+        pads = np.sum(table == self.lattice.sites().reshape(-1, 1), 1)
+        anti = ((codes >> sites.reshape(-1, 1)) ^ (codes >> table[sites])) & 1
+        parallel = table.shape[1] - 2 * np.sum(anti, 1) - pads[sites]
+        return -2 * parallel.astype(np.float64)
+
+    @staticmethod
+    def _antiparallel(codes, i, j):
+        """if spins on each bond (i, j) are anti-parallel, shape (B, n_bonds)
+        """
+        codes = codes.reshape(-1, 1)
+        return ((codes >> i) ^ (codes >> j)) & 1 == 1
+
+    def _bonds(self, nbr):
+        """flattened site indices of bonds, a LongTensor (n_bonds, 2)"""
+        return self.lattice.bond_index(nbr)
+
+    @staticmethod
+    def _flip_bonds(configs, bonds):
+        """flip both ends of each bond
+
+        Returns:
+            a tensor of shape (B, n_bonds, N), the configurations
+            with spins on bond k flipped are in [:, k]
+        """
+        B, N = configs.size()
+        nbonds = bonds.size(0)
+        RHS = configs.unsqueeze(1).repeat(1, nbonds, 1)
+        rows = torch.arange(nbonds).long()
+        RHS[:, rows, bonds[:, 0]] *= -1
+        RHS[:, rows, bonds[:, 1]] *= -1
+        return RHS
+
+    @staticmethod
+    def _bond_flips(bonds, vals, diag=None):
+        """flip lists of connections flipping bonds
+
+        Params:
+            bonds: a LongTensor of flattened sites, shape (n_bonds, K),
+                e.g. `_bonds` or single sites of shape (N, 1)
+            vals: matrix elements of flipping each bond, connections
+                of zeros are dropped
+            diag: the diagonal element, appended as a connection
+                without flips (optional)
+
+        Returns:
+            flips, vals, see `nnz_flips`
+        """
+        mask = vals != 0
+        flips, _ = bonds[mask].sort(1, descending=True)
+        vals = vals[mask]
+        if diag is not None:
+            pad = - torch.ones(1, bonds.size(1)).long()
+            flips = torch.cat([flips, pad])
+            vals = torch.cat([vals, torch.Tensor([diag]).type_as(vals)])
+        if len(mask) == 0 or not mask.any():
+            flips = flips[:, :0]
+        return flips, vals
+
+    @staticmethod
+    def _segment(mask):
+        """source rows of connections selected by mask (B, K)"""
+        B, K = mask.size()
+        rows = torch.arange(B).long().unsqueeze(1).expand(B, K)
+        return rows[mask]
+
     def __str__(self):
         ret = '%s:' % (self.name)
         ret += '\n size: %s' % self.size
@@ -85,22 +389,49 @@ class HamiltonianBase(object):
             ret += '\n %s: %s' % (param_key, param_val)
         return ret
 
-    def mat(self):
+    def mat(self, dtype=None, chunk=2 ** 16, sector=None, workers=None):
         """get the matrix form
 
+        the matrix is assembled from `nnz_bits` on chunks of
+        the basis, see `vmc.ham.sparse`.
+
+        Params:
+            dtype: data type of the matrix, by default it is
+                decided by matrix elements.
+            chunk: number of rows computed at once
+            sector: a sector of the basis (see `vmc.ham.sector`),
+                default: the full basis
+            workers: number of processes assembling chunks in
+                parallel, default: assemble in this process
+
         Returns:
-            hamiltonian matrix: a scipy.sparse.lil_matrix
+            hamiltonian matrix: a scipy.sparse.csr_matrix
 
         Raises:
             Warning: when number of elements in the hamiltonian
             is too large (> 25) a waring will raises.
         """
-        numel = 2 ** _prod(self.size)
-        if _prod(self.size) > 25:
+        if sector is None and self.lattice.numel() > 25:
             raise Warning('this hamiltonian could be too large')
-        data = lil_matrix((numel, numel),
-                          dtype='complex128')
-        for lhs in IterateAll(size=self.size):
-            for rhs, val in self.nnz(lhs):
-                data[utils.bin(lhs), utils.bin(rhs)] += val
-        return data
+        if workers is not None and workers > 1:
+            return sparse.assemble_parallel(self, chunk=chunk, dtype=dtype,
+                                            sector=sector, workers=workers)
+        return sparse.assemble(self, chunk=chunk, dtype=dtype, sector=sector)
+
+    def as_linear_operator(self, chunk=2 ** 16, workers=None, sector=None):
+        """get the matrix-free form
+
+        the hamiltonian is applied on the fly, chunks of rows
+        are computed on a thread pool, see `vmc.ham.sparse`.
+
+        Params:
+            chunk: number of rows computed at once
+            workers: number of threads, default: number of cpus
+            sector: a sector of the basis (see `vmc.ham.sector`),
+                default: the full basis
+
+        Returns:
+            a scipy.sparse.linalg.LinearOperator
+        """
+        return sparse.linear_operator(self, chunk=chunk, workers=workers,
+                                      sector=sector)
@@ -1,4 +1,7 @@
+import torch
+import numpy as np
 from .base import HamiltonianBase
+from .pauli import PauliSum
 
 
 class J1J2(HamiltonianBase):
@@ -9,28 +12,101 @@ class J1J2(HamiltonianBase):
         super(J1J2, self).__init__(name, **params)
         if 'J' not in self.params:
             self.params['J'] = (1, 0.5)
-        self.J = self.params['J']
+
+    @property
+    def J(self):
+        return self.params['J']
+
+    @J.setter
+    def J(self, value):
+        self.params['J'] = value
+        # the cached diagonal depends on J
+        self.clear_diagonal()
 
     def nnz_iter(self, RHS):
         # sigma_x, sigma_y
+        diag = self._cached_diagonal(RHS)
         sigmaz = 0.0
-        J = self.J
-        for i, j in self.lattice.grid(nbr=1):
-            sigmaz += J[0] * RHS[i] * RHS[j]
-            RHS[i] *= -1
-            RHS[j] *= -1
-            yield RHS, J[0] * (1 - RHS[i] * RHS[j])  # sigma y
-            RHS[i] *= -1
-            RHS[j] *= -1
-        # next nearest
-        for i, j in self.lattice.grid(nbr=2):
-            sigmaz += J[1] * RHS[i] * RHS[j]
-            RHS[i] *= -1
-            RHS[j] *= -1
-            yield RHS, J[1] * (1 - RHS[i] * RHS[j])
-            RHS[i] *= -1
-            RHS[j] *= -1
-        yield RHS, sigmaz
+        spins = RHS.view(-1)
+        # nearest, then next nearest
+        for nbr, J in [(1, self.J[0]), (2, self.J[1])]:
+            for i, j in self.lattice.bonds(nbr).tolist():
+                if diag is None:
+                    sigmaz += J * spins[i] * spins[j]
+                spins[i] *= -1
+                spins[j] *= -1
+                yield RHS, J * (1 - spins[i] * spins[j])  # sigma x, y
+                spins[i] *= -1
+                spins[j] *= -1
+        yield RHS, sigmaz if diag is None else diag
+
+    def nnz_batch(self, configs):
+        configs = self._batch(configs)
+        B, N = configs.size()
+        nearest, next_nearest = self._bonds(1), self._bonds(2)
+        bonds = torch.cat([nearest, next_nearest])
+        J = torch.cat([torch.zeros(len(nearest)).double() + self.J[0],
+                       torch.zeros(len(next_nearest)).double() + self.J[1]])
+
+        spins = configs.double()
+        zz = spins[:, bonds[:, 0]] * spins[:, bonds[:, 1]]
+        # exchange terms, then the diagonal
+        RHS = torch.cat([self._flip_bonds(configs, bonds),
+                         configs.unsqueeze(1)], 1)
+        vals = torch.cat([J * (1 - zz),
+                          torch.sum(J * zz, 1, keepdim=True)], 1)
+        mask = vals != 0
+        mask[:, -1] = 1
+        return RHS[mask], vals[mask], self._segment(mask)
+
+    def nnz_flips(self, config):
+        nearest, next_nearest = self._bonds(1), self._bonds(2)
+        bonds = torch.cat([nearest, next_nearest])
+        J = torch.cat([torch.zeros(len(nearest)).double() + self.J[0],
+                       torch.zeros(len(next_nearest)).double() + self.J[1]])
+
+        spins = config.contiguous().view(-1).double()
+        zz = spins[bonds[:, 0]] * spins[bonds[:, 1]]
+        diag = self._cached_diagonal(config)
+        if diag is None:
+            diag = float(torch.sum(J * zz))
+        return self._bond_flips(bonds, J * (1 - zz), diag)
+
+    def _bits(self):
+        """sites and couplings of nearest and next nearest bonds"""
+        i1, j1 = self._bond_bits(1)
+        i2, j2 = self._bond_bits(2)
+        i, j = np.concatenate([i1, i2]), np.concatenate([j1, j2])
+        J = np.concatenate([np.zeros(len(i1)) + self.J[0],
+                            np.zeros(len(i2)) + self.J[1]])
+        return i, j, J
+
+    def nnz_bits(self, codes):
+        codes = self._codes(codes)
+        i, j, J = self._bits()
+        anti = self._antiparallel(codes, i, j)
+        src, bond = np.nonzero(anti & (J != 0))
+        rhs = codes[src] ^ (np.left_shift(1, i) | np.left_shift(1, j))[bond]
+        return (np.concatenate([src, np.arange(len(codes))]),
+                np.concatenate([rhs, codes]),
+                np.concatenate([2 * J[bond], self.diagonal(codes)]))
+
+    def diag_bits(self, codes):
+        codes = self._codes(codes)
+        i, j, J = self._bits()
+        anti = self._antiparallel(codes, i, j)
+        return np.sum(J * (1 - 2 * anti), 1)
+
+    def diag_delta(self, codes, sites):
+        return self.J[0] * self._bond_delta(codes, sites, 1) + \
+            self.J[1] * self._bond_delta(codes, sites, 2)
+
+    def pauli(self):
+        terms = []
+        for nbr, J in [(1, self.J[0]), (2, self.J[1])]:
+            for bond in zip(*self._bond_bits(nbr)):
+                terms += [(J, op, bond) for op in ['XX', 'YY', 'ZZ']]
+        return PauliSum(terms, lattice=self.lattice, name=self.name)
 
 
 class XXZ(HamiltonianBase):
@@ -41,16 +117,82 @@ class XXZ(HamiltonianBase):
         super(XXZ, self).__init__(name=name, **params)
         if 'J' not in self.params:
             self.params['J'] = (1.0, 1.0)
-        self.J = self.params['J']
+
+    @property
+    def J(self):
+        return self.params['J']
+
+    @J.setter
+    def J(self, value):
+        self.params['J'] = value
+        # the cached diagonal depends on J
+        self.clear_diagonal()
 
     def nnz_iter(self, RHS):
+        diag = self._cached_diagonal(RHS)
         sigmaz = 0.0
         J = self.J
-        for j, k in self.lattice.grid(nbr=self.params['nbr']):
-            sigmaz += - J[1] * RHS[j] * RHS[k]
-            RHS[j] *= -1
-            RHS[k] *= -1
-            yield RHS, - J[0] * (1 - RHS[j] * RHS[k])
-            RHS[j] *= -1
-            RHS[k] *= -1
-        yield RHS, sigmaz
+        spins = RHS.view(-1)
+        for j, k in self.lattice.bonds(self.params['nbr']).tolist():
+            if diag is None:
+                sigmaz += - J[1] * spins[j] * spins[k]
+            spins[j] *= -1
+            spins[k] *= -1
+            yield RHS, - J[0] * (1 - spins[j] * spins[k])
+            spins[j] *= -1
+            spins[k] *= -1
+        yield RHS, sigmaz if diag is None else diag
+
+    def nnz_batch(self, configs):
+        configs = self._batch(configs)
+        bonds = self._bonds(self.params['nbr'])
+        J = self.J
+
+        spins = configs.double()
+        zz = spins[:, bonds[:, 0]] * spins[:, bonds[:, 1]]
+        RHS = torch.cat([self._flip_bonds(configs, bonds),
+                         configs.unsqueeze(1)], 1)
+        vals = torch.cat([- J[0] * (1 - zz),
+                          - J[1] * torch.sum(zz, 1, keepdim=True)], 1)
+        mask = vals != 0
+        mask[:, -1] = 1
+        return RHS[mask], vals[mask], self._segment(mask)
+
+    def nnz_flips(self, config):
+        bonds = self._bonds(self.params['nbr'])
+        spins = config.contiguous().view(-1).double()
+        zz = spins[bonds[:, 0]] * spins[bonds[:, 1]]
+        diag = self._cached_diagonal(config)
+        if diag is None:
+            diag = - self.J[1] * float(torch.sum(zz))
+        return self._bond_flips(bonds, - self.J[0] * (1 - zz), diag)
+
+    def nnz_bits(self, codes):
+        codes = self._codes(codes)
+        i, j = self._bond_bits(self.params['nbr'])
+        J = self.J
+
+        anti = self._antiparallel(codes, i, j)
+        src, bond = np.nonzero(anti)
+        rhs = codes[src] ^ (np.left_shift(1, i) | np.left_shift(1, j))[bond]
+        return (np.concatenate([src, np.arange(len(codes))]),
+                np.concatenate([rhs, codes]),
+                np.concatenate([np.zeros(len(src)) - 2 * J[0],
+                                self.diagonal(codes)]))
+
+    def diag_bits(self, codes):
+        codes = self._codes(codes)
+        anti = self._antiparallel(codes, *self._bond_bits(self.params['nbr']))
+        return - self.J[1] * np.sum(1 - 2 * anti, 1)
+
+    def diag_delta(self, codes, sites):
+        return - self.J[1] * self._bond_delta(codes, sites,
+                                              self.params['nbr'])
+
+    def pauli(self):
+        J = self.J
+        terms = []
+        for bond in zip(*self._bond_bits(self.params['nbr'])):
+            terms += [(- J[0], 'XX', bond), (- J[0], 'YY', bond),
+                      (- J[1], 'ZZ', bond)]
+        return PauliSum(terms, lattice=self.lattice, name=self.name)
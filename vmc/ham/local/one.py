@@ -2,7 +2,20 @@
 """
 
 
+import torch
 from vmc.ham.base import HamiltonianBase
+from vmc.ham.pauli import PauliSum
+
+
+def _pauli(h, op):
+    """sum of op on every site"""
+    terms = [(1.0, op, (k, )) for k in range(h.lattice.numel())]
+    return PauliSum(terms, lattice=h.lattice, name=h.name)
+
+
+def _sites(config):
+    """every site as a flip list, shape (N, 1)"""
+    return torch.arange(config.numel()).long().view(-1, 1)
 
 
 class SigmaX(HamiltonianBase):
@@ -13,11 +26,19 @@ class SigmaX(HamiltonianBase):
         super(SigmaX, self).__init__(name, **params)
 
     def nnz(self, config):
-        RHS = config.clone()
-        for i in self.lattice.grid(nn=0):
-            RHS[i] *= -1
+        RHS = config.contiguous().clone()
+        spins = RHS.view(-1)
+        for i in range(len(spins)):
+            spins[i] *= -1
             yield RHS, 1
-            RHS[i] *= -1
+            spins[i] *= -1
+
+    def nnz_flips(self, config):
+        sites = _sites(config)
+        return self._bond_flips(sites, torch.ones(len(sites)).double())
+
+    def pauli(self):
+        return _pauli(self, 'X')
 
 
 class SigmaY(HamiltonianBase):
@@ -28,11 +49,20 @@ class SigmaY(HamiltonianBase):
         super(SigmaY, self).__init__(name, **params)
 
     def nnz(self, config):
-        RHS = config.clone()
-        for i in self.lattice.grid(nn=0):
-            RHS[i] *= -1
-            yield RHS, -1.j * RHS[i]
-            RHS[i] *= -1
+        RHS = config.contiguous().clone()
+        spins = RHS.view(-1)
+        for i in range(len(spins)):
+            spins[i] *= -1
+            yield RHS, -1.j * spins[i]
+            spins[i] *= -1
+
+    def nnz_flips(self, config):
+        spins = config.contiguous().view(-1).double().numpy()
+        return self._bond_flips(_sites(config),
+                                torch.from_numpy(1.j * spins))
+
+    def pauli(self):
+        return _pauli(self, 'Y')
 
 
 class SigmaZ(HamiltonianBase):
@@ -43,8 +73,13 @@ class SigmaZ(HamiltonianBase):
         super(SigmaZ, self).__init__(name, **params)
 
     def nnz(self, config):
-        RHS = config.clone()
-        ret = 0.0
-        for i in self.lattice.grid(nn=0):
-            ret += RHS[i]
-        yield RHS, ret
+        RHS = config.contiguous().clone()
+        yield RHS, RHS.sum()
+
+    def nnz_flips(self, config):
+        empty = torch.zeros(0).double()
+        return self._bond_flips(_sites(config)[:0], empty,
+                                float(config.sum()))
+
+    def pauli(self):
+        return _pauli(self, 'Z')
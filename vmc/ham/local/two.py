@@ -1,7 +1,9 @@
 """2-local hamiltonians
 """
 
+import torch
 from vmc.ham.base import HamiltonianBase
+from vmc.ham.pauli import PauliSum
 
 
 class Local2(HamiltonianBase):
@@ -24,12 +26,25 @@ class Local2(HamiltonianBase):
         super(Local2, self).__init__(name, **params)
 
     def nnz(self, LHS, local, recover):
-        RHS = LHS.clone()
-        if self.dim is not LHS.dim():
+        RHS = LHS.contiguous().clone()
+        if self.lattice.dim is not LHS.dim():
             raise ValueError('config size should meets hamiltonian')
-        for i, j in self.lattice.grid(nbr=self.nbr):
-            yield local(RHS, i, j)
-            recover(RHS, i, j)
+        spins = RHS.view(-1)
+        for i, j in self.lattice.bonds(self.nbr).tolist():
+            _, val = local(spins, i, j)
+            yield RHS, val
+            recover(spins, i, j)
+
+    def _zz(self, config):
+        """s_i s_j on each bond"""
+        bonds = self._bonds(self.nbr)
+        spins = config.contiguous().view(-1).double()
+        return spins[bonds[:, 0]] * spins[bonds[:, 1]]
+
+    def _pauli(self, op):
+        return PauliSum([(1.0, op, bond)
+                         for bond in zip(*self._bond_bits(self.nbr))],
+                        lattice=self.lattice, name=self.name)
 
 
 class SigmaX(Local2):
@@ -51,6 +66,13 @@ class SigmaX(Local2):
 
         return Local2.nnz(self, LHS, local, recover)
 
+    def nnz_flips(self, config):
+        bonds = self._bonds(self.nbr)
+        return self._bond_flips(bonds, torch.ones(len(bonds)).double())
+
+    def pauli(self):
+        return self._pauli('XX')
+
 
 class SigmaY(Local2):
     """2-local sigma y hamiltonian"""
@@ -71,6 +93,12 @@ class SigmaY(Local2):
 
         return Local2.nnz(self, LHS, local, recover)
 
+    def nnz_flips(self, config):
+        return self._bond_flips(self._bonds(self.nbr), - self._zz(config))
+
+    def pauli(self):
+        return self._pauli('YY')
+
 
 class SigmaZ(Local2):
     """2-local sigma z hamiltonian"""
@@ -80,6 +108,15 @@ class SigmaZ(Local2):
         super(SigmaZ, self).__init__(name=name, **params)
 
     def nnz(self, config):
-        RHS = config.clone()
-        yield RHS, sum(RHS[i] * RHS[j]
-                       for i, j in self.lattice.grid(nbr=self.nbr))
+        RHS = config.contiguous().clone()
+        spins = RHS.view(-1)
+        yield RHS, sum(spins[i] * spins[j]
+                       for i, j in self.lattice.bonds(self.nbr).tolist())
+
+    def nnz_flips(self, config):
+        bonds = self._bonds(self.nbr)[:0]
+        return self._bond_flips(bonds, torch.zeros(0).double(),
+                                float(torch.sum(self._zz(config))))
+
+    def pauli(self):
+        return self._pauli('ZZ')
@@ -0,0 +1,451 @@
+"""Pauli sum hamiltonian
+
+a hamiltonian written as a sum of Pauli strings, e.g.
+
+    H = PauliSum('-Z0 Z1 - Z1 Z2 - 0.5 * X1', lattice=Chain(3))
+
+each term is compiled into bit masks on the words of bit packed
+configurations (see `vmc.configs.ConfigBatch`), so there is no limit on
+the number of sites. A term maps the configuration x to x ^ flip with
+the matrix element
+
+    <x|term|x ^ flip> = coeff * (-1) ** popcount(x & phase)
+
+where flip marks the sites with X or Y, phase the sites with Y or Z,
+the factors -1 (Z) and -i (Y) of the convention used by
+`vmc.ham.SigmaZ` and `vmc.ham.SigmaY` are absorbed in coeff. The
+integer code methods (`nnz_bits`, `diag_bits`, used by `mat`) take the
+first word as an int64 mask, for lattices of up to 62 sites.
+"""
+
+import re
+import numbers
+import torch
+import numpy as np
+from vmc.utils.bits import check_bits, popcount
+from vmc.configs.batch import ConfigBatch, nwords
+from .base import HamiltonianBase
+
+__all__ = ['PauliSum']
+
+# (flip, phase, coeff) of a single site operator
+_LOCAL = {
+    'I': (0, 0, 1),
+    'X': (1, 0, 1),
+    'Y': (1, 1, -1j),
+    'Z': (0, 1, -1),
+}
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<op>[IXYZ])\s*(?P<site>\d+|\(\s*\d+(?:\s*,\s*\d+)*\s*\)) |
+    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?j?) |
+    (?P<cnum>\([^()]*\)) |
+    (?P<sign>[+-]) |
+    (?P<times>\*)
+)''', re.VERBOSE)
+
+
+def _parity(masks):
+    """parity of the number of set bits of masks, words are on the
+    last axis
+    """
+    x = np.bitwise_xor.reduce(masks, axis=-1)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        x ^= x >> np.uint64(shift)
+    return (x & np.uint64(1)).astype(np.int64)
+
+
+def _product(lhs, rhs):
+    """product of two term tables, every term of lhs times every term of rhs
+    """
+    (f1, z1, c1), (f2, z2, c2) = lhs, rhs
+    width = f1.shape[1]
+    f1, z1, c1 = f1[:, None], z1[:, None], c1.reshape(-1, 1)
+    f2, z2, c2 = f2[None], z2[None], c2.reshape(1, -1)
+    sign = 1 - 2 * _parity(f1 & z2)
+    return ((f1 ^ f2).reshape(-1, width), (z1 ^ z2).reshape(-1, width),
+            (c1 * c2 * sign).ravel())
+
+
+def _isnumber(x):
+    return isinstance(x, numbers.Number) and not isinstance(x, bool)
+
+
+class PauliSum(HamiltonianBase):
+    """sum of Pauli strings
+
+    Params:
+        terms: a string expression like '-1.0 * Z0 Z1 + 0.5 X(0, 1)',
+            or a list of (coeff, ops, sites) like (0.5, 'XZ', (0, 3)),
+            sites are flattened indices or lattice coordinates.
+        lattice: the lattice (or shape) of the hamiltonian
+
+    Attributes:
+        flips, phases: numpy.uint64 arrays of shape (T, W), bit masks
+            of each term, in the words of `vmc.configs.ConfigBatch`
+        coeffs: numpy array, coefficient of each term
+    """
+
+    def __init__(self, terms=None, **params):
+        name = params.pop('name', 'pauli sum')
+        super(PauliSum, self).__init__(name, **params)
+        if self.lattice is None:
+            raise TypeError("missing shape of the hamiltonian")
+
+        if terms is None:
+            table = self._identity([])
+        elif isinstance(terms, str):
+            table = self._parse(terms)
+        else:
+            table = self._terms(terms)
+        self._compile(*table)
+
+    def _site(self, site):
+        if isinstance(site, tuple):
+            site = int(np.ravel_multi_index(site, self.lattice.shape))
+        if not 0 <= site < self.lattice.numel():
+            raise ValueError("site %s out of the lattice" % (site, ))
+        return site
+
+    def _identity(self, coeffs):
+        """a term table of identities"""
+        coeffs = np.asarray(coeffs, dtype=np.complex128)
+        masks = np.zeros((len(coeffs), nwords(self.lattice.numel())),
+                         dtype=np.uint64)
+        return masks, masks.copy(), coeffs
+
+    def _string(self, coeff, ops, sites):
+        """compile one Pauli string, factors are multiplied in order"""
+        table = self._identity([coeff])
+        for op, site in zip(ops, sites):
+            if op not in _LOCAL:
+                raise ValueError("unknown Pauli operator %s" % op)
+            site = self._site(site)
+            flip, phase, c = _LOCAL[op]
+            local = self._identity([c])
+            local[0][0, site // 64] = flip << (site % 64)
+            local[1][0, site // 64] = phase << (site % 64)
+            table = _product(table, local)
+        return table
+
+    def _terms(self, terms):
+        tables = []
+        for coeff, ops, sites in terms:
+            if len(ops) != len(sites):
+                raise ValueError("operators %s do not match sites %s"
+                                 % (ops, sites))
+            tables.append(self._string(coeff, ops, sites))
+        return self._concat(tables)
+
+    def _parse(self, expr):
+        """parse a string expression into a term table"""
+        terms = []
+        coeff, ops, sites = 1, '', []
+        empty, unary = True, True
+        pos = 0
+        expr = expr.strip()
+        while pos < len(expr):
+            match = _TOKEN.match(expr, pos)
+            if match is None:
+                raise ValueError("invalid expression at %d: %s"
+                                 % (pos, expr[pos:]))
+            pos = match.end()
+            if match.group('sign'):
+                if not unary:
+                    terms.append((coeff, ops, sites))
+                    coeff, ops, sites = 1, '', []
+                    empty = True
+                if match.group('sign') == '-':
+                    coeff = - coeff
+                unary = True
+            elif match.group('times'):
+                if empty:
+                    raise ValueError("invalid expression at %d: %s"
+                                     % (match.start(), expr))
+                unary = True
+            else:
+                if match.group('op'):
+                    site = match.group('site')
+                    if site.startswith('('):
+                        site = tuple(int(s) for s in site[1:-1].split(','))
+                    else:
+                        site = int(site)
+                    ops += match.group('op')
+                    sites.append(site)
+                elif match.group('num'):
+                    coeff *= complex(match.group('num'))
+                else:
+                    coeff *= complex(match.group('cnum').replace(' ', ''))
+                empty, unary = False, False
+        if unary and pos:
+            raise ValueError("incomplete expression: %s" % expr)
+        if not empty:
+            terms.append((coeff, ops, sites))
+        return self._terms(terms)
+
+    def _concat(self, tables):
+        if len(tables) == 0:
+            return self._identity([])
+        return [np.concatenate(each) for each in zip(*tables)]
+
+    def _compile(self, flips, phases, coeffs):
+        """merge duplicated terms, group terms by their flip masks"""
+        coeffs = np.asarray(coeffs, dtype=np.complex128).reshape(-1)
+        width = nwords(self.lattice.numel())
+        flips, phases = (np.asarray(each, dtype=np.uint64)
+                         .reshape(len(coeffs), width)
+                         for each in (flips, phases))
+        keys, inverse = np.unique(np.concatenate([flips, phases], 1),
+                                  axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        coeffs = np.bincount(inverse, coeffs.real, len(keys)) + \
+            1j * np.bincount(inverse, coeffs.imag, len(keys))
+        nonzero = coeffs != 0
+        self.flips = keys[nonzero, :width]
+        self.phases = keys[nonzero, width:]
+        if np.all(coeffs.imag == 0):
+            coeffs = coeffs.real
+        self.coeffs = coeffs[nonzero]
+        # terms are sorted by flips, each unique flip is a connection
+        self._conns, self._starts = np.unique(self.flips, axis=0,
+                                              return_index=True)
+        self._conns = self._conns.reshape(-1, width)
+        self._stops = np.append(self._starts[1:], len(self.coeffs))
+        self._lookup = {conn.tobytes(): k
+                        for k, conn in enumerate(self._conns)}
+        # -1 on the sites each connection flips
+        flipped = ConfigBatch(self._conns, int(self.lattice.numel())).up()
+        self._signs = 1 - 2 * flipped.astype(np.int8)
+        self._site_terms = None
+
+    def table(self):
+        """(flips, phases, coeffs) of the compiled terms"""
+        return self.flips, self.phases, self.coeffs
+
+    def groups(self):
+        """terms grouped by their flip masks, ascending
+
+        Returns:
+            a list of (flip, phases, coeffs), masks are int64 codes,
+            the first one is the diagonal (flip 0) when there is one
+
+        Raises:
+            ValueError: when the lattice has more than 62 sites
+        """
+        conns, phases = self._bits(self._conns), self._bits(self.phases)
+        return [(int(flip), phases[start:stop], self.coeffs[start:stop])
+                for flip, start, stop in zip(conns, self._starts,
+                                             self._stops)]
+
+    def _bits(self, masks):
+        """masks as int64 codes, see `vmc.utils.bits`"""
+        check_bits(self.lattice.numel())
+        return masks[:, 0].astype(np.int64)
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def __bool__(self):
+        # an empty sum is the zero operator, not a missing one
+        return True
+
+    def _new(self, table):
+        ret = PauliSum(lattice=self.lattice, name=self.name)
+        ret._compile(*table)
+        return ret
+
+    def _words(self, x):
+        """words of a configuration or a code"""
+        if torch.is_tensor(x) or isinstance(x, np.ndarray):
+            return ConfigBatch.pack(x.reshape(1, -1)).words[0]
+        return ConfigBatch.from_codes([x], int(self.lattice.numel())).words[0]
+
+    def __getitem__(self, key):
+        """matrix element H[x, y], x and y are configurations or codes"""
+        x, y = (self._words(each) for each in key)
+        k = self._lookup.get((x ^ y).tobytes())
+        if k is None:
+            return 0.0
+        terms = slice(self._starts[k], self._stops[k])
+        sign = 1 - 2 * _parity(x & self.phases[terms])
+        return np.sum(self.coeffs[terms] * sign).item()
+
+    def nnz_iter(self, RHS):
+        configs, vals, _ = self.nnz_batch(RHS.view(1, -1))
+        for config, val in zip(configs, vals):
+            RHS.copy_(config.view_as(RHS))
+            yield RHS, val.item()
+
+    def nnz_batch(self, configs):
+        configs = self._batch(configs)
+        words = ConfigBatch.pack(configs).words
+        offset = int(self._hasdiag())
+        src, conn, vals = self._connect(words)
+        signs = torch.from_numpy(self._signs[offset:][conn])
+        RHS = configs[torch.from_numpy(src)] * signs.type_as(configs)
+        if offset:
+            if getattr(self, '_diagonal', None) is None:
+                diag = self._diag(words)
+            else:
+                diag = self.diagonal(self._bits(words))
+            src = np.concatenate([src, np.arange(len(words))])
+            RHS = torch.cat([RHS, configs])
+            vals = np.concatenate([vals, diag])
+        return RHS, torch.from_numpy(vals), torch.from_numpy(src)
+
+    def _hasdiag(self):
+        return len(self._conns) > 0 and not self._conns[0].any()
+
+    def _sign(self, x, terms):
+        """(-1) ** popcount(x & phase) of terms, x are words of
+        configurations, shape (B, W), or int64 codes, shape (B, )
+        """
+        if x.ndim == 1:
+            phases = self._bits(self.phases[terms])
+            return 1 - 2 * (popcount(x.reshape(-1, 1) & phases) & 1)
+        return 1 - 2 * _parity(x[:, None] & self.phases[terms])
+
+    def _connect(self, x):
+        """off-diagonal connections of configurations
+
+        Params:
+            x: words or codes of configurations, see `_sign`
+
+        Returns:
+            src: index of the source of each connection
+            conn: index of each connection among off-diagonal ones
+            vals: matrix elements
+        """
+        offset = int(self._hasdiag())
+        if len(self._conns) == offset:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=self.coeffs.dtype)
+        # off-diagonal terms, grouped by connections
+        first = self._starts[offset]
+        sign = self._sign(x, slice(first, None))
+        vals = np.add.reduceat(sign * self.coeffs[first:],
+                               self._starts[offset:] - first, axis=1)
+        src, conn = np.nonzero(vals)
+        return src, conn, vals[src, conn]
+
+    def _diag(self, x):
+        """diagonal elements of configurations, see `_sign`"""
+        if not self._hasdiag():
+            return np.zeros(len(x), dtype=self.coeffs.dtype)
+        terms = slice(self._starts[0], self._stops[0])
+        return np.sum(self._sign(x, terms) * self.coeffs[terms], 1)
+
+    def nnz_bits(self, codes):
+        codes = self._codes(codes)
+        offset = int(self._hasdiag())
+        src, conn, vals = self._connect(codes)
+        rhs = codes[src] ^ self._bits(self._conns[offset:])[conn]
+        if offset:
+            src = np.concatenate([src, np.arange(len(codes))])
+            rhs = np.concatenate([rhs, codes])
+            vals = np.concatenate([vals, self.diagonal(codes)])
+        return src, rhs, vals
+
+    def diag_bits(self, codes):
+        codes = self._codes(codes)
+        return self._diag(codes)
+
+    def diag_delta(self, codes, sites):
+        codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+        sites = np.asarray(sites, dtype=np.int64).reshape(-1)
+        ret = np.zeros(len(codes), dtype=self.coeffs.dtype)
+        if not self._hasdiag():
+            return ret
+        if self._site_terms is None:
+            # diagonal terms acting on each site
+            phases = self._bits(self.phases[self._starts[0]:self._stops[0]])
+            self._site_terms = [np.nonzero((phases >> k) & 1)[0] +
+                                self._starts[0]
+                                for k in range(self.lattice.numel())]
+        for k in np.unique(sites):
+            rows = sites == k
+            terms = self._site_terms[k]
+            sign = 1 - 2 * (popcount(codes[rows].reshape(-1, 1) &
+                                     self._bits(self.phases[terms])) & 1)
+            ret[rows] = -2 * np.sum(sign * self.coeffs[terms], 1)
+        return ret
+
+    def pauli(self):
+        return self
+
+    def __add__(self, other):
+        if _isnumber(other):
+            other = self._new(self._identity([other]))
+        elif isinstance(other, HamiltonianBase):
+            other = other._operand()
+            if other is None:
+                return NotImplemented
+            if other.lattice.numel() != self.lattice.numel():
+                raise ValueError("hamiltonians on different lattices")
+        else:
+            return NotImplemented
+        return self._new(self._concat([self.table(), other.table()]))
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __neg__(self):
+        return self * -1
+
+    def __sub__(self, other):
+        return self + (- other)
+
+    def __rsub__(self, other):
+        return (- self) + other
+
+    def __mul__(self, other):
+        if _isnumber(other):
+            return self._new((self.flips, self.phases, self.coeffs * other))
+        elif isinstance(other, HamiltonianBase):
+            other = other._operand()
+            if other is None:
+                return NotImplemented
+            if other.lattice.numel() != self.lattice.numel():
+                raise ValueError("hamiltonians on different lattices")
+            return self._new(_product(self.table(), other.table()))
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if _isnumber(other):
+            return self * other
+        return NotImplemented
+
+    def expr(self):
+        """the string expression of the terms"""
+        ret = []
+        n = int(self.lattice.numel())
+        flips = ConfigBatch(self.flips, n).up()
+        phases = ConfigBatch(self.phases, n).up()
+        for flip, phase, coeff in zip(flips, phases, self.coeffs):
+            ops = []
+            coeff = complex(coeff)
+            for k in range(n):
+                op = (flip[k], phase[k])
+                if op == (1, 0):
+                    ops.append('X%d' % k)
+                elif op == (1, 1):
+                    ops.append('Y%d' % k)
+                    coeff /= -1j
+                elif op == (0, 1):
+                    ops.append('Z%d' % k)
+                    coeff /= -1
+            sign = ' + '
+            if coeff.imag == 0:
+                sign = ' - ' if coeff.real < 0 else sign
+                coeff = '%g' % abs(coeff.real)
+            else:
+                coeff = '(%g%+gj)' % (coeff.real + 0.0, coeff.imag)
+            ret.append(sign + ' '.join([coeff] + ops))
+        if len(ret) == 0:
+            return '0'
+        ret = ''.join(ret)
+        return ret[3:] if ret.startswith(' + ') else '-' + ret[3:]
+
+    def __str__(self):
+        ret = super(PauliSum, self).__str__()
+        return ret + '\n terms: %s' % self.expr()
@@ -0,0 +1,282 @@
+"""symmetry sectors
+
+A sector restricts the basis of a hamiltonian to a subspace spanned
+by integer coded configurations (see `utils.bin`), e.g. configurations
+with fixed magnetization. Sectors are accepted by `mat`,
+`as_linear_operator` and `utils.ground`.
+"""
+
+import numpy as np
+from itertools import product
+import vmc.utils as utils
+
+__all__ = [
+    'SectorBase',
+    'SzSector',
+    'MomentumSector',
+    'permute',
+]
+
+
+class SectorBase(object):
+    """sector base
+
+    Subclasses should implement:
+        `states(start, stop)`: codes of basis states in [start, stop)
+        `contains(codes)`: if codes are in the subspace
+        `find(codes)`: position of codes in this sector and their
+            amplitude on the basis state, (-1, 0) if the code is
+            projected out
+        `embed(state)`: state in the full basis
+
+    basis state `a` has a norm `norms(start, stop)` (ones by default),
+    and the matrix element between basis states is
+
+        H[a, b] = sum(val * amp(y) / norm(a) for y, val in nnz(a))
+
+    where b is found from y by `find`.
+    """
+
+    def __init__(self, name, n, dim):
+        super(SectorBase, self).__init__()
+        self.name = name
+        self.n = n
+        self.dim = dim
+
+    def __str__(self):
+        return '%s: %s sites (dim=%s)' % (self.name, self.n, self.dim)
+
+    def __len__(self):
+        return self.dim
+
+    def states(self, start=0, stop=None):
+        raise NotImplementedError
+
+    def contains(self, codes):
+        raise NotImplementedError
+
+    def find(self, codes):
+        raise NotImplementedError
+
+    def norms(self, start=0, stop=None):
+        stop = self.dim if stop is None else stop
+        return np.ones(stop - start)
+
+    def embed(self, state):
+        raise NotImplementedError
+
+    def connections(self, hamiltonian, start, stop):
+        """connections of basis states in [start, stop)
+
+        Raises:
+            ValueError: when the hamiltonian connects this sector
+                to other states.
+        """
+        src, rhs, vals = hamiltonian.nnz_bits(self.states(start, stop))
+        inside = self.contains(rhs)
+        if np.any(vals[~inside] != 0):
+            raise ValueError("%s does not conserve %s"
+                             % (hamiltonian.name, self.name))
+        col, amp = self.find(rhs[inside])
+        found = col >= 0
+        src = src[inside][found]
+        vals = vals[inside][found] * amp[found] / \
+            self.norms(start, stop)[src]
+        return src, col[found], vals
+
+
+class SzSector(SectorBase):
+    """fixed magnetization sector
+
+    configurations with total magnetization sz = (n_up - n_down) / 2,
+    basis states are ordered by `utils.comb_rank`.
+
+    Example:
+
+    >>> sector = SzSector(24, sz=0)
+    >>> len(sector)
+    2704156
+    """
+
+    def __init__(self, n, sz=0):
+        nup = n / 2. + sz
+        if nup != int(nup) or not 0 <= nup <= n:
+            raise ValueError("invalid magnetization %s for %s sites"
+                             % (sz, n))
+        self.sz = sz
+        self.nup = int(nup)
+        dim = int(utils.binomial(n)[n, self.nup])
+        super(SzSector, self).__init__('Sz=%s' % sz, n, dim)
+
+    def states(self, start=0, stop=None):
+        stop = self.dim if stop is None else stop
+        ranks = np.arange(start, stop, dtype=np.int64)
+        return utils.comb_unrank(ranks, self.n, self.nup)
+
+    def contains(self, codes):
+        return utils.popcount(codes) == self.nup
+
+    def find(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        index = np.where(self.contains(codes),
+                         utils.comb_rank(codes, self.n), -1)
+        return index, np.ones(codes.shape)
+
+    def embed(self, state):
+        ret = np.zeros(2 ** self.n, dtype=np.asarray(state).dtype)
+        ret[self.states()] = state
+        return ret
+
+
+def permute(codes, moves):
+    """permute sites of codes
+
+    Params:
+        codes: integer codes
+        moves: compiled permutation, a list of (mask, shift), bits in
+            mask are shifted by shift (see `MomentumSector`)
+    """
+    ret = np.zeros(np.shape(codes), dtype=np.int64)
+    for mask, shift in moves:
+        if shift >= 0:
+            ret |= (codes & mask) << shift
+        else:
+            ret |= (codes & mask) >> (- shift)
+    return ret
+
+
+class MomentumSector(SectorBase):
+    """momentum sector
+
+    symmetry adapted basis of the translation group of a periodic
+    lattice, optionally combined with reflection of the first axis.
+    A basis state is labelled by its representative a (the smallest
+    code in its orbit),
+
+        |a(k)> = 1 / sqrt(N_a) sum(chi(g) g|a> for g in group)
+
+    where chi(T^m) = exp(-2 pi i k.m / L) and chi(RT^m) = p chi(T^m) for
+    reflection parity p. Representatives and normalizations are
+    enumerated on construction.
+
+    Params:
+        lattice: a periodic lattice
+        k: int or tuple, momentum in unit of 2 pi / L
+        reflection: parity of reflection (1 or -1) or None
+        sz: restrict to the sector of fixed magnetization (optional)
+        chunk: number of states processed at once
+
+    Example:
+
+    >>> sector = MomentumSector(Chain(32, pbc=True), k=0, sz=0)
+    """
+
+    def __init__(self, lattice, k=0, reflection=None, sz=None,
+                 chunk=2 ** 16):
+        if not lattice.pbc:
+            raise ValueError('momentum sector needs periodic bound')
+        n = lattice.numel()
+        k = tuple(np.array(k).reshape(-1) % lattice.shape)
+        if len(k) != lattice.dim:
+            raise ValueError('momentum should have %s components'
+                             % lattice.dim)
+        self.k = k
+        self.reflection = reflection
+        self.sz = sz
+        self.chunk = chunk
+        self.subspace = None if sz is None else SzSector(n, sz)
+
+        perms, chars = [], []
+        for shift in product(*[range(L) for L in lattice.shape]):
+            perms.append(lattice.translation(shift))
+            chars.append(np.exp(-2.j * np.pi * sum(
+                ki * mi / float(L)
+                for ki, mi, L in zip(k, shift, lattice.shape))))
+        if reflection is not None:
+            if (2 * k[0]) % lattice.shape[0] != 0:
+                raise ValueError('reflection is not a symmetry of '
+                                 'momentum %s' % (k, ))
+            mirror = lattice.reflection()
+            perms += [mirror[perm] for perm in perms]
+            chars += [reflection * chi for chi in chars]
+        self.moves = [self.compile(perm) for perm in perms]
+        self.chars = np.array(chars)
+        if np.allclose(self.chars.imag, 0):
+            self.chars = self.chars.real
+
+        name = 'k=%s' % (k, )
+        if reflection is not None:
+            name += ' p=%s' % reflection
+        if sz is not None:
+            name += ' Sz=%s' % sz
+        super(MomentumSector, self).__init__(name, n, 0)
+        self.reps, self._norms = self.enumerate()
+        self.dim = len(self.reps)
+
+    @staticmethod
+    def compile(perm):
+        """compile a permutation to (mask, shift) moves"""
+        moves = {}
+        for i, j in enumerate(perm):
+            moves[j - i] = moves.get(j - i, 0) | (1 << i)
+        return [(mask, shift) for shift, mask in moves.items()]
+
+    def images(self, codes):
+        """images of codes under the group, shape (group size, B)"""
+        return np.stack([permute(codes, moves) for moves in self.moves])
+
+    def candidates(self, start, stop):
+        if self.subspace is None:
+            return np.arange(start, stop, dtype=np.int64)
+        return self.subspace.states(start, stop)
+
+    def enumerate(self):
+        """representatives and their norms sqrt(N_a)"""
+        total = 2 ** self.n if self.subspace is None else self.subspace.dim
+        order = len(self.moves)
+        reps, norms = [], []
+        for start in range(0, total, self.chunk):
+            codes = self.candidates(start, min(start + self.chunk, total))
+            images = self.images(codes)
+            first = np.min(images, 0) == codes
+            codes, images = codes[first], images[:, first]
+            stab = np.dot(self.chars, images == codes).real
+            keep = stab > 1e-8
+            reps.append(codes[keep])
+            norms.append(np.sqrt(order * stab[keep]))
+        return np.concatenate(reps), np.concatenate(norms)
+
+    def states(self, start=0, stop=None):
+        return self.reps[start:stop]
+
+    def norms(self, start=0, stop=None):
+        return self._norms[start:stop]
+
+    def contains(self, codes):
+        if self.subspace is None:
+            return np.ones(np.shape(codes), dtype=bool)
+        return self.subspace.contains(codes)
+
+    def find(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        images = self.images(codes)
+        g = np.argmin(images, 0)
+        rep = images[g, np.arange(len(codes))]
+        index = np.searchsorted(self.reps, rep)
+        index[index == self.dim] = 0
+        found = self.reps[index] == rep
+        amp = self.chars[g].conj() * self._norms[index] * found
+        return np.where(found, index, -1), amp
+
+    def embed(self, state):
+        state = np.asarray(state)
+        total = 2 ** self.n if self.subspace is None else self.subspace.dim
+        ret = np.zeros(2 ** self.n,
+                       dtype=np.result_type(state.dtype, self.chars.dtype))
+        for start in range(0, total, self.chunk):
+            codes = self.candidates(start, min(start + self.chunk, total))
+            index, amp = self.find(codes)
+            found = index >= 0
+            ret[codes[found]] = state[index[found]] * amp[found] \
+                / len(self.moves)
+        return ret
@@ -0,0 +1,310 @@
+"""sparse matrix construction
+
+Hamiltonians are assembled from their connections on integer coded
+configurations (see `HamiltonianBase.nnz_bits`). The basis is processed
+in chunks of consecutive rows, each chunk gives a block of rows. A
+sector (see `vmc.ham.sector`) restricts the basis to a subspace.
+"""
+
+import weakref
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+from vmc.utils.parallel import Partition
+
+__all__ = [
+    'dimension',
+    'connections',
+    'block',
+    'assemble',
+    'assemble_parallel',
+    'linear_operator',
+    'iter_diagonal',
+    'diagonal',
+]
+
+
+def dimension(hamiltonian, sector=None):
+    """dimension of the (restricted) basis"""
+    if sector is None:
+        return 2 ** hamiltonian.lattice.numel()
+    return sector.dim
+
+
+def connections(hamiltonian, start, stop, sector=None):
+    """connections of rows in [start, stop)
+
+    Returns:
+        src: row of each connection, counted from start
+        col: column of each connection
+        vals: matrix elements
+    """
+    if sector is None:
+        codes = np.arange(start, stop, dtype=np.int64)
+        return hamiltonian.nnz_bits(codes)
+    return sector.connections(hamiltonian, start, stop)
+
+
+def block(hamiltonian, start, stop, sector=None, dtype=None):
+    """rows in [start, stop) of the hamiltonian matrix
+
+    Params:
+        hamiltonian: a hamiltonian implements `nnz_bits`
+        start, stop: range of rows
+        sector: a sector of the basis (optional)
+        dtype: data type of the matrix (optional)
+
+    Returns:
+        a scipy.sparse.csr_matrix
+    """
+    src, col, vals = connections(hamiltonian, start, stop, sector)
+    shape = (stop - start, dimension(hamiltonian, sector))
+    ret = sp.csr_matrix((vals, (src, col)), shape=shape, dtype=dtype)
+    ret.eliminate_zeros()
+    return ret
+
+
+def assemble(hamiltonian, chunk=2 ** 16, dtype=None, sector=None):
+    """assemble the hamiltonian matrix
+
+    Params:
+        hamiltonian: a hamiltonian implements `nnz_bits`
+        chunk: number of rows computed at once
+        dtype: data type of the matrix, by default it is
+            decided by matrix elements.
+        sector: a sector of the basis, default: the full basis
+
+    Returns:
+        a scipy.sparse.csr_matrix
+    """
+    numel = dimension(hamiltonian, sector)
+    blocks = [block(hamiltonian, start, min(start + chunk, numel),
+                    sector=sector, dtype=dtype)
+              for start in range(0, numel, chunk)]
+    if not blocks:
+        return sp.csr_matrix((numel, numel), dtype=dtype)
+    return sp.vstack(blocks, format='csr')
+
+
+def assemble_parallel(hamiltonian, chunk=2 ** 16, dtype=None, sector=None,
+                      workers=None):
+    """assemble the hamiltonian matrix on a process pool
+
+    every chunk of rows is computed once by a forked worker (see
+    `vmc.utils.Partition`), which returns the non-zeros of each row
+    with its column indices and data, then the chunks are compacted
+    into the CSR arrays at once.
+
+    Params:
+        hamiltonian: a hamiltonian implements `nnz_bits`
+        chunk: number of rows computed at once
+        dtype: data type of the matrix, by default it is
+            decided by matrix elements.
+        sector: a sector of the basis, default: the full basis
+        workers: number of processes, default: number of cpus
+
+    Returns:
+        a scipy.sparse.csr_matrix
+    """
+    numel = dimension(hamiltonian, sector)
+    partition = Partition(hamiltonian.lattice.numel(), sector=sector,
+                          workers=workers, chunk=chunk)
+
+    def rows(start, stop):
+        ret = block(hamiltonian, start, stop, sector=sector, dtype=dtype)
+        return np.diff(ret.indptr), ret.indices, ret.data
+
+    blocks = partition.map_ranges(rows)
+    indptr = np.zeros(numel + 1, dtype=np.int64)
+    if blocks:
+        np.cumsum(np.concatenate([each[0] for each in blocks]),
+                  out=indptr[1:])
+    nnz = int(indptr[-1])
+    index_dtype = np.int32 if max(nnz, numel) < 2 ** 31 else np.int64
+    if dtype is None:
+        dtype = np.result_type(np.float64,
+                               *{each[2].dtype for each in blocks})
+    indices = np.concatenate([each[1] for each in blocks] or [[]]) \
+        .astype(index_dtype, copy=False)
+    data = np.concatenate([each[2] for each in blocks] or [[]]) \
+        .astype(dtype, copy=False)
+    return sp.csr_matrix((data, indices, indptr.astype(index_dtype)),
+                         shape=(numel, numel), copy=False)
+
+
+def segment_sum(src, weights, length):
+    """sum weights by their source index"""
+    if np.iscomplexobj(weights):
+        return np.bincount(src, weights.real, minlength=length) + \
+            1.j * np.bincount(src, weights.imag, minlength=length)
+    return np.bincount(src, weights, minlength=length)
+
+
+def _flip_terms(hamiltonian):
+    """off-diagonal terms of a hamiltonian by flip masks, or None when
+    it has no Pauli string form
+
+    Returns:
+        terms: a list of (flip, const, signed), the element of the code
+            c and c ^ flip is const + sum(coeff * (-1) ** parity(c &
+            phase) for coeff, sites of phase in signed)
+        dtype: data type of coefficients
+    """
+    try:
+        pauli = hamiltonian.pauli()
+    except NotImplementedError:
+        return None
+    terms = []
+    for flip, phases, coeffs in pauli.groups():
+        if flip == 0:
+            continue
+        signed = [(coeff, [k for k in range(hamiltonian.lattice.numel())
+                           if phase >> k & 1])
+                  for phase, coeff in zip(phases, coeffs) if phase]
+        terms.append((flip, np.sum(coeffs[phases == 0]), signed))
+    return terms, pauli.coeffs.dtype
+
+
+def _local_tables(terms, chunk):
+    """tables of rows in a chunk of 2^k rows aligned to its size
+
+    Returns:
+        bits: a list of numpy.int8 arrays, the k-th bit of each row
+        perms: row ^ low bits of each flip, by low bits
+    """
+    local = np.arange(chunk, dtype=np.intp)
+    bits = [((local >> k) & 1).astype(np.int8)
+            for k in range(chunk.bit_length() - 1)]
+    perms = {flip & (chunk - 1): None for flip, _, _ in terms}
+    for low in perms:
+        perms[low] = local ^ low
+    return bits, perms
+
+
+def _apply_terms(terms, diag, x, start, chunk, tables):
+    """rows in [start, start + chunk) of H x, from `_flip_terms`,
+    the diagonal of the full basis and `_local_tables`, start is a
+    multiple of chunk
+    """
+    bits, perms = tables
+    stop = start + chunk
+    y = diag[start:stop] * x[start:stop]
+    for flip, const, signed in terms:
+        vals = const
+        for coeff, sites in signed:
+            # parity of the sites, bits of high sites are shared
+            parity = sum((start >> site) & 1 for site in sites
+                         if site >= len(bits)) & 1
+            for site in sites:
+                if site < len(bits):
+                    parity = parity ^ bits[site]
+            vals = np.where(parity, vals - coeff, vals + coeff)
+        high, low = start ^ (flip & ~(chunk - 1)), flip & (chunk - 1)
+        gathered = x[high:high + chunk]
+        y += vals * (gathered[perms[low]] if low else gathered)
+    return y
+
+
+def linear_operator(hamiltonian, chunk=2 ** 16, workers=None, sector=None):
+    """matrix-free form of a hamiltonian
+
+    on the full basis, the diagonal is computed once (or read from
+    `cache_diagonal`) and off-diagonal terms are applied by their flip
+    masks (see `PauliSum`), rows c of H x gather x[c ^ flip]. In a
+    sector, or without a Pauli string form, the matrix-vector product
+    is computed on the fly from `nnz_bits`. Chunks of rows are
+    distributed on a thread pool, which is shut down with the operator.
+
+    Params:
+        hamiltonian: a hamiltonian implements `nnz_bits`
+        chunk: number of rows computed at once
+        workers: number of threads, default: number of cpus
+        sector: a sector of the basis, default: the full basis
+
+    Returns:
+        a scipy.sparse.linalg.LinearOperator
+    """
+    numel = dimension(hamiltonian, sector)
+    terms = _flip_terms(hamiltonian) if sector is None else None
+    if terms is None:
+        _, _, vals = connections(hamiltonian, 0, 1, sector)
+        dtype = np.result_type(vals.dtype, np.float64)
+    else:
+        terms, dtype = terms
+        diag = getattr(hamiltonian, '_diagonal', None)
+        if diag is None:
+            diag = diagonal(hamiltonian, chunk=chunk)
+        dtype = np.result_type(dtype, diag.dtype, np.float64)
+        # chunks of 2^k rows aligned to their size
+        chunk = 1 << (int(min(chunk, numel)).bit_length() - 1)
+        tables = _local_tables(terms, chunk)
+    ranges = [(start, min(start + chunk, numel))
+              for start in range(0, numel, chunk)]
+    workers = min(workers or cpu_count(), len(ranges))
+    pool = ThreadPoolExecutor(workers) if workers > 1 else None
+
+    def matvec(x):
+        x = np.asarray(x).ravel()
+        y = np.zeros(numel, dtype=np.result_type(dtype, x.dtype))
+
+        def kernel(rows):
+            start, stop = rows
+            if terms is not None:
+                y[start:stop] = _apply_terms(terms, diag, x, start, chunk,
+                                             tables)
+                return
+            src, col, vals = connections(hamiltonian, start, stop, sector)
+            y[start:stop] = segment_sum(src, vals * x[col], stop - start)
+
+        for _ in (map if pool is None else pool.map)(kernel, ranges):
+            pass
+        return y
+
+    ret = LinearOperator((numel, numel), matvec=matvec,
+                         rmatvec=matvec, dtype=dtype)
+    if pool is not None:
+        # no threads outlive the operator
+        weakref.finalize(ret, pool.shutdown)
+    return ret
+
+
+def iter_diagonal(hamiltonian, chunk=2 ** 16):
+    """stream the diagonal of the full basis
+
+    Yields:
+        (start, values), diagonal elements of codes
+        in [start, start + len(values))
+    """
+    numel = dimension(hamiltonian)
+    for start in range(0, numel, chunk):
+        codes = np.arange(start, min(start + chunk, numel), dtype=np.int64)
+        yield start, hamiltonian.diag_bits(codes)
+
+
+def diagonal(hamiltonian, chunk=2 ** 16, path=None):
+    """table of the diagonal on the full basis
+
+    Params:
+        hamiltonian: a hamiltonian implements `diag_bits`
+        chunk: number of codes computed at once
+        path: store the table in this file as numpy.memmap (optional)
+
+    Returns:
+        a numpy array, or numpy.memmap when path is given
+    """
+    numel = dimension(hamiltonian)
+    table = None
+    for start, values in iter_diagonal(hamiltonian, chunk):
+        if table is None:
+            dtype = np.result_type(values.dtype, np.float64)
+            if path is None:
+                table = np.empty(numel, dtype=dtype)
+            else:
+                table = np.memmap(path, dtype=dtype, mode='w+',
+                                  shape=(numel, ))
+        table[start:start + len(values)] = values
+    if path is not None:
+        table.flush()
+    return table
@@ -1,4 +1,7 @@
+import torch
+import numpy as np
 from .base import HamiltonianBase
+from .pauli import PauliSum
 
 
 class TFI(HamiltonianBase):
@@ -7,14 +10,80 @@ class TFI(HamiltonianBase):
     def __init__(self, mag=1, **params):
         name = 'TFI'
         super(TFI, self).__init__(name, **params)
-        self.mag = mag
+        self.params['mag'] = mag
+
+    @property
+    def mag(self):
+        return self.params['mag']
+
+    @mag.setter
+    def mag(self, value):
+        # the field is off-diagonal, a cached diagonal stays valid
+        self.params['mag'] = value
 
     def nnz_iter(self, RHS):
-        for i in self.lattice.grid(nbr=0):
-            RHS[i] *= -1
+        spins = RHS.view(-1)
+        for i in range(len(spins)):
+            spins[i] *= -1
             yield RHS, - self.mag
-            RHS[i] *= -1
-        sigmaz = 0.0
-        for i, j in self.lattice.grid(nbr=1):
-            sigmaz += RHS[i] * RHS[j]
-        yield RHS, - sigmaz
+            spins[i] *= -1
+        sigmaz = self._cached_diagonal(RHS)
+        if sigmaz is None:
+            bonds = self._bonds(1)
+            sigmaz = - torch.sum(spins[bonds[:, 0]] * spins[bonds[:, 1]])
+        yield RHS, sigmaz
+
+    def nnz_batch(self, configs):
+        configs = self._batch(configs)
+        B, N = configs.size()
+        # single flips, then the diagonal
+        RHS = configs.unsqueeze(1).repeat(1, N + 1, 1)
+        sites = torch.arange(N).long()
+        RHS[:, sites, sites] *= -1
+
+        bonds = self._bonds(1)
+        spins = configs.double()
+        sigmaz = torch.sum(spins[:, bonds[:, 0]] * spins[:, bonds[:, 1]], 1)
+        vals = torch.zeros(B, N + 1).double() - self.mag
+        vals[:, N] = - sigmaz
+
+        segment = torch.arange(B).long().unsqueeze(1).repeat(1, N + 1)
+        return RHS.view(-1, N), vals.view(-1), segment.view(-1)
+
+    def nnz_flips(self, config):
+        spins = config.contiguous().view(-1)
+        sigmaz = self._cached_diagonal(config)
+        if sigmaz is None:
+            bonds = self._bonds(1)
+            sigmaz = - torch.sum(spins[bonds[:, 0]] * spins[bonds[:, 1]])
+        sites = torch.arange(len(spins)).long().view(-1, 1)
+        vals = torch.zeros(len(spins)).double() - self.mag
+        return self._bond_flips(sites, vals, float(sigmaz))
+
+    def nnz_bits(self, codes):
+        codes = self._codes(codes)
+        B, N = len(codes), self.lattice.numel()
+        src = np.arange(B)
+        # single flips
+        flips = np.left_shift(1, np.arange(N, dtype=np.int64))
+        rhs = (codes.reshape(-1, 1) ^ flips).ravel()
+        vals = np.zeros(B * N) - self.mag
+        return (np.concatenate([np.repeat(src, N), src]),
+                np.concatenate([rhs, codes]),
+                np.concatenate([vals, self.diagonal(codes)]))
+
+    def diag_bits(self, codes):
+        codes = self._codes(codes)
+        anti = self._antiparallel(codes, *self._bond_bits(1))
+        sigmaz = anti.shape[1] - 2 * np.sum(anti, 1)
+        return - sigmaz.astype(np.float64)
+
+    def diag_delta(self, codes, sites):
+        return - self._bond_delta(codes, sites, 1)
+
+    def pauli(self):
+        i, j = self._bond_bits(1)
+        terms = [(-1.0, 'ZZ', bond) for bond in zip(i, j)]
+        terms += [(- self.mag, 'X', (k, ))
+                  for k in range(self.lattice.numel())]
+        return PauliSum(terms, lattice=self.lattice, name=self.name)
@@ -3,21 +3,28 @@
 This module provide definition of lattices.
 All the lattice is iteratable.
 
-TODO:
-    * support for arbitrary neighbors
+bonds of k-th neighbours are cached integer tables (`bonds(k)`),
+neighbour shells are ordered by distance (`shells`, `shell_table`).
+`GraphLattice` defines lattices by edge lists or unit cells.
 """
 
 from .base import LatticeBase
 from .chain import Chain
 from .square import Square
+from .graph import GraphLattice, Triangular, Honeycomb, Kagome
 
 __all__ = [
     'LatticeBase',
     'Lattice',
     'islattice',
+    'config_size',
     '__traits__',
     'Chain',
-    'Square'
+    'Square',
+    'GraphLattice',
+    'Triangular',
+    'Honeycomb',
+    'Kagome',
 ]
 
 __traits__ = {
@@ -27,6 +34,14 @@ __traits__ = {
     'Chain': Chain,
     'square': Square,
     'Square': Square,
+    'graph': GraphLattice,
+    'GraphLattice': GraphLattice,
+    'triangular': Triangular,
+    'Triangular': Triangular,
+    'honeycomb': Honeycomb,
+    'Honeycomb': Honeycomb,
+    'kagome': Kagome,
+    'Kagome': Kagome,
 }
 
 
@@ -34,6 +49,15 @@ def islattice(ins):
     return isinstance(ins, LatticeBase)
 
 
+def config_size(size):
+    """size of configurations, a lattice gives flat configurations
+    of shape (numel, ) (see `LatticeBase.flatten`)
+    """
+    if islattice(size):
+        return (size.numel(), )
+    return size
+
+
 def Lattice(x, **kwargs):
     if isinstance(x, str):
         return __traits__[x](**kwargs)
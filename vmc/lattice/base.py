@@ -1,3 +1,6 @@
+import torch
+import numpy as np
+import scipy.sparse as sp
 from collections import Iterable
 from scipy.sparse.dok import _prod
 
@@ -97,10 +100,251 @@ class LatticeBase(object):
         >>> 3 4
         >>> 4 0
         """
-        pass
+        def site(i):
+            if self.dim == 1:
+                return i
+            return tuple(int(x) for x in np.unravel_index(i, self.shape))
+
+        if not nbr:
+            for i in range(self.numel()):
+                yield site(i)
+        else:
+            for i, j in self.bonds(nbr).tolist():
+                yield site(i), site(j)
 
     def numel(self):
         return _prod(self.shape)
 
+    def _cached(self, key, build):
+        """a table computed once, read-only afterwards
+
+        numpy arrays and the arrays of scipy sparse matrices are
+        locked, tensors can not be locked and should not be written.
+        """
+        cache = self.__dict__.setdefault('_tables', {})
+        if key not in cache:
+            table = build()
+            if sp.issparse(table):
+                for each in (table.data, table.indices, table.indptr):
+                    each.flags.writeable = False
+            elif not torch.is_tensor(table):
+                table = np.ascontiguousarray(table)
+                table.flags.writeable = False
+            cache[key] = table
+        return cache[key]
+
+    def coordinates(self):
+        """coordinates of sites, flattened in row-major order
+
+        Returns:
+            a numpy.int64 array, shape (numel, dim)
+        """
+        return self._cached('coordinates', lambda: np.indices(
+            self.shape).reshape(self.dim, -1).T.astype(np.int64))
+
+    def sites(self):
+        """flat site ids, a numpy.int64 array"""
+        return self._cached('sites', lambda: np.arange(
+            self.numel(), dtype=np.int64))
+
+    def index(self, coords):
+        """flat site ids of coordinates (row-major, as configurations
+        are flattened)
+
+        Params:
+            coords: a tuple of coordinates, or an array of shape (M, dim)
+        """
+        if isinstance(coords, tuple):
+            return int(np.ravel_multi_index(coords, self.shape))
+        coords = np.asarray(coords).reshape(-1, self.dim)
+        return np.ravel_multi_index(coords.T, self.shape)
+
+    def flatten(self, configs):
+        """configurations of shape (B, ) + shape as (B, numel),
+        a single configuration as (numel, )
+        """
+        n = self.numel()
+        if configs.numel() == n:
+            return configs.contiguous().view(n)
+        return configs.contiguous().view(-1, n)
+
+    def unflatten(self, configs):
+        """flat configurations in the lattice shape, for display"""
+        shape = tuple(self.shape)
+        if configs.numel() == self.numel():
+            return configs.contiguous().view(shape)
+        return configs.contiguous().view((-1, ) + shape)
+
+    def bond_index(self, nbr=1):
+        """bonds as a cached LongTensor of shape (n_bonds, 2), the
+        gather (and scatter) indices of flat configurations
+        """
+        return self._cached(('bond index', nbr), lambda: torch.tensor(
+            self.bonds(nbr), dtype=torch.long))
+
+    def adjacency(self, nbr=1):
+        """adjacency of bonds of class nbr, a symmetric
+        scipy.sparse.csr_matrix counting bonds of each pair
+        """
+        def build():
+            n = self.numel()
+            bonds = self.bonds(nbr)
+            ones = np.ones(len(bonds), dtype=np.int64)
+            upper = sp.coo_matrix((ones, (bonds[:, 0], bonds[:, 1])),
+                                  shape=(n, n))
+            return (upper + upper.T).tocsr()
+        return self._cached(('adjacency', nbr), build)
+
+    def neighbours(self, site, nbr=1):
+        """sites bonded with site by class nbr"""
+        adj = self.adjacency(nbr)
+        return adj.indices[adj.indptr[site]:adj.indptr[site + 1]]
+
+    def neighbour_table(self, nbr=1):
+        """neighbours of every site by class nbr, a numpy.int64 array
+        of shape (numel, max degree), a neighbour appears once for each
+        bond, rows of smaller degree are padded with the site itself
+        """
+        def build():
+            n, adj = self.numel(), self.adjacency(nbr)
+            counts = adj.data.astype(np.int64)
+            rows = np.repeat(np.repeat(np.arange(n), np.diff(adj.indptr)),
+                             counts)
+            degree = np.bincount(rows, minlength=n)
+            table = np.repeat(self.sites().reshape(-1, 1),
+                              int(degree.max()) if n else 0, 1)
+            cols = np.arange(len(rows)) - np.repeat(
+                np.cumsum(degree) - degree, degree)
+            table[rows, cols] = np.repeat(adj.indices, counts)
+            return table
+        return self._cached(('neighbour table', nbr), build)
+
+    def _displacement_range(self):
+        """displacements of each axis, minimum images when periodic"""
+        if self.pbc:
+            return [range(-((n - 1) // 2), n // 2 + 1) for n in self.shape]
+        return [range(-(n - 1), n) for n in self.shape]
+
+    def _all_displacements(self):
+        """(displacements, distances) of the lattice"""
+        grids = np.meshgrid(*self._displacement_range(), indexing='ij')
+        disp = np.stack([each.ravel() for each in grids], 1)
+        dist = np.sqrt(np.sum(disp.astype(np.float64) ** 2, 1))
+        return disp, dist
+
+    def shells(self):
+        """distances of neighbour shells, ascending
+
+        shells()[k - 1] is the distance of k-th neighbours, with
+        minimum images on periodic lattices.
+        """
+        def build():
+            _, dist = self._all_displacements()
+            return np.unique(np.round(dist[dist > 0], 10))
+        return self._cached('shells', build)
+
+    def displacements(self, nbr):
+        """displacements d of nbr-th neighbours, bonds are (x, x + d)
+
+        one of d and -d is kept (the one with positive first
+        non-zero component).
+
+        Returns:
+            a numpy.int64 array, shape (n_displacements, dim)
+        """
+        shells = self.shells()
+        if nbr < 1 or nbr > len(shells):
+            return np.zeros((0, self.dim), dtype=np.int64)
+        disp, dist = self._all_displacements()
+        disp = disp[np.round(dist, 10) == shells[nbr - 1]]
+        nonzero = disp[np.arange(len(disp)), np.argmax(disp != 0, 1)]
+        return disp[nonzero > 0]
+
+    def bonds(self, nbr=1):
+        """bonds of nbr-th neighbours
+
+        bonds are (x, x + d) of all sites x and displacements d (see
+        `displacements`), pairs wrap around on periodic lattices and
+        are dropped at open boundaries. On periodic lattices shorter
+        than twice the displacement a pair is counted from both ends,
+        as `grid` does.
+
+        Returns:
+            flattened site indices, a read-only numpy.int64 array
+            of shape (n_bonds, 2), cached on the lattice
+        """
+        def build():
+            coords = self.coordinates()
+            shape = np.array(self.shape)
+            bonds = []
+            for d in self.displacements(nbr):
+                other = coords + d
+                if self.pbc:
+                    other %= shape
+                    keep = np.ones(len(coords), dtype=bool)
+                else:
+                    keep = np.all((other >= 0) & (other < shape), 1)
+                bonds.append(np.stack([
+                    np.ravel_multi_index(coords[keep].T, self.shape),
+                    np.ravel_multi_index(other[keep].T, self.shape)], 1))
+            if not bonds:
+                return np.zeros((0, 2), dtype=np.int64)
+            return np.concatenate(bonds).astype(np.int64)
+        return self._cached(('bonds', nbr), build)
+
+    def shell_table(self):
+        """shell of each pair of sites
+
+        Returns:
+            a numpy.int64 array of shape (numel, numel), entry (i, j)
+            is k when j is a k-th neighbour of i, 0 on the diagonal
+        """
+        def build():
+            coords = self.coordinates()
+            diff = np.abs(coords[:, None, :] - coords[None, :, :])
+            if self.pbc:
+                shape = np.array(self.shape)
+                diff = np.minimum(diff, shape - diff)
+            dist = np.round(np.sqrt(np.sum(diff.astype(np.float64) ** 2,
+                                           -1)), 10)
+            return np.searchsorted(self.shells(), dist) + (dist > 0)
+        return self._cached('shell table', build)
+
+    def translation(self, shift):
+        """site permutation of a translation
+
+        sites are flattened in row-major order (as `utils.bin` does)
+
+        Params:
+            shift: int or tuple, translation vector
+
+        Returns:
+            a numpy array perm, site i is moved to site perm[i]
+
+        Raises:
+            ValueError: when the lattice is not periodic
+        """
+        if not self.pbc:
+            raise ValueError('translation needs periodic bound')
+        coords = np.indices(self.shape).reshape(self.dim, -1)
+        shift = np.array(shift).reshape(-1, 1)
+        shape = np.array(self.shape).reshape(-1, 1)
+        return np.ravel_multi_index((coords + shift) % shape, self.shape)
+
+    def reflection(self, axis=0):
+        """site permutation of the reflection along axis
+
+        x -> -x with periodic bound, x -> L - 1 - x otherwise
+
+        Returns:
+            a numpy array perm, site i is moved to site perm[i]
+        """
+        coords = np.indices(self.shape).reshape(self.dim, -1)
+        if self.pbc:
+            coords[axis] = (- coords[axis]) % self.shape[axis]
+        else:
+            coords[axis] = self.shape[axis] - 1 - coords[axis]
+        return np.ravel_multi_index(coords, self.shape)
+
     def __len__(self):
         return self.numel()
@@ -1,3 +1,4 @@
+import numpy as np
 from .base import LatticeBase
 
 
@@ -17,3 +18,9 @@ class Chain(LatticeBase):
                 if not self.pbc and i + nbr is length:
                     break
                 yield i, (i + nbr) % length
+
+    def displacements(self, nbr):
+        # i -> i + nbr as grid, also when it wraps around short chains
+        if nbr < 1:
+            return np.zeros((0, 1), dtype=np.int64)
+        return np.array([[nbr]], dtype=np.int64)
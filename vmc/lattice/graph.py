@@ -0,0 +1,256 @@
+"""lattices defined by graphs
+
+a `GraphLattice` is built from edge lists, or from a unit cell (lattice
+vectors and basis sites) repeated on a grid of cells. Sites are numbered
+0 .. N - 1 (cell major, then basis), configurations are flat. Bonds of
+each class (nearest, next nearest, ...) are integer tables like those of
+`LatticeBase.bonds`, so every hamiltonian works on graph lattices.
+"""
+
+import numpy as np
+from itertools import product
+from scipy.sparse.csgraph import shortest_path
+from .base import LatticeBase
+
+__all__ = [
+    'GraphLattice',
+    'Triangular',
+    'Honeycomb',
+    'Kagome',
+]
+
+
+# names of bond classes
+_CLASSES = {'nn': 1, 'nnn': 2, 'nnnn': 3}
+
+
+def _bond_class(key):
+    if key in _CLASSES:
+        return _CLASSES[key]
+    elif isinstance(key, int) and key > 0:
+        return key
+    raise ValueError("bond class should be a positive int or one of %s"
+                     " not %s" % (sorted(_CLASSES), key))
+
+
+def _edges(pairs):
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return np.ascontiguousarray(pairs)
+
+
+class GraphLattice(LatticeBase):
+    """lattice of a graph
+
+    Params:
+        edges: a list of pairs (i, j) of nearest neighbours, or a dict
+            of bond classes (1, 2, ... or 'nn', 'nnn', ...) to lists of
+            pairs. Classes not given are the pairs at that graph
+            distance of nearest neighbours.
+        n: number of sites, default: the largest site in edges + 1
+        vectors: lattice vectors, shape (dim, dim), instead of edges
+        basis: positions of sites in the unit cell, default: origin
+        cells: number of cells along each lattice vector
+        pbc: periodic bound of the cells
+
+    with a unit cell, classes are shells of distance, bonds are
+    counted once for each periodic image within the neighbouring
+    cells.
+
+    Example:
+        ring = GraphLattice([(0, 1), (1, 2), (2, 3), (3, 0)])
+        lattice = GraphLattice(vectors=[[1, 0], [0.5, 0.75 ** 0.5]],
+                               cells=(3, 3), pbc=True)
+    """
+
+    def __init__(self, edges=None, n=None, vectors=None, basis=None,
+                 cells=None, name='Graph', **kwargs):
+        self.vectors = self.basis = self.cells = None
+        self.given = {}
+        if vectors is not None:
+            self.vectors = np.array(vectors, dtype=np.float64)
+            if self.vectors.ndim != 2 or \
+                    self.vectors.shape[0] != self.vectors.shape[1]:
+                raise ValueError("vectors should be of shape (dim, dim)")
+            if basis is None:
+                basis = np.zeros((1, len(self.vectors)))
+            self.basis = np.array(basis, dtype=np.float64).reshape(
+                -1, len(self.vectors))
+            if cells is None:
+                raise TypeError("missing number of cells")
+            self.cells = [int(each) for each in np.atleast_1d(cells)]
+            if len(self.cells) != len(self.vectors):
+                raise ValueError("cells should have %d components"
+                                 % len(self.vectors))
+            n = int(np.prod(self.cells)) * len(self.basis)
+        elif edges is not None:
+            if not isinstance(edges, dict):
+                edges = {1: edges}
+            self.given = {_bond_class(key): _edges(pairs)
+                          for key, pairs in edges.items()}
+            largest = max([len(pairs) and pairs.max() + 1
+                           for pairs in self.given.values()] + [0])
+            n = largest if n is None else n
+            if largest > n:
+                raise ValueError("site %d out of %d sites" % (largest - 1, n))
+        else:
+            raise TypeError("GraphLattice needs edges or a unit cell")
+        super(GraphLattice, self).__init__(name, shape=[n], **kwargs)
+
+    def positions(self):
+        """real space positions of sites, shape (numel, dim)
+
+        Raises:
+            ValueError: when the lattice has no unit cell
+        """
+        if self.vectors is None:
+            raise ValueError("graph lattices given by edges have"
+                             " no positions")
+
+        def build():
+            cells = np.array(list(product(*[range(L) for L in self.cells])))
+            origins = cells.dot(self.vectors)
+            return (origins[:, None, :] + self.basis[None]).reshape(
+                -1, len(self.vectors))
+        return self._cached('positions', build)
+
+    def coordinates(self):
+        """(cell indices, basis index) of sites, or site indices of
+        graphs given by edges
+        """
+        if self.vectors is None:
+            return self._cached('coordinates', lambda: np.arange(
+                self.numel(), dtype=np.int64).reshape(-1, 1))
+
+        def build():
+            cells = np.array(list(product(*[range(L) for L in self.cells])),
+                             dtype=np.int64)
+            nb = len(self.basis)
+            return np.concatenate([np.repeat(cells, nb, 0),
+                                   np.tile(np.arange(nb), len(cells))
+                                   .reshape(-1, 1)], 1)
+        return self._cached('coordinates', build)
+
+    def _images(self):
+        """(i, j, distance) of pairs i < j over periodic images"""
+        def build():
+            pos = self.positions()
+            offsets = [np.zeros(len(self.vectors))]
+            if self.pbc:
+                extent = np.array(self.cells)[:, None] * self.vectors
+                offsets = [np.dot(each, extent) for each in
+                           product(*[(-1, 0, 1)] * len(self.vectors))]
+            i, j = np.triu_indices(len(pos), 1)
+            rows = []
+            for offset in offsets:
+                dist = np.sqrt(np.sum((pos[j] + offset - pos[i]) ** 2, 1))
+                rows.append(np.stack([i, j, np.round(dist, 8)], 1))
+            return np.concatenate(rows)
+        return self._cached('images', build)
+
+    def _distances(self):
+        """graph distances of nearest neighbours"""
+        def build():
+            dist = shortest_path(self.adjacency(1), unweighted=True,
+                                 directed=False)
+            dist[np.isinf(dist)] = 0
+            return dist.astype(np.int64)
+        return self._cached('distances', build)
+
+    def shells(self):
+        """distances of bond classes, graph distances when the lattice
+        has no unit cell
+        """
+        if self.vectors is not None:
+            return self._cached('shells', lambda: np.unique(
+                self._images()[:, 2]))
+        given = max(self.given) if self.given else 0
+        return self._cached('shells', lambda: np.arange(
+            1, max(given, self._distances().max()) + 1, dtype=np.float64))
+
+    def displacements(self, nbr):
+        raise ValueError("graph lattices have no displacements,"
+                         " use bonds()")
+
+    def bonds(self, nbr=1):
+        """bonds of class nbr, a read-only numpy.int64 array of shape
+        (n_bonds, 2), cached on the lattice
+        """
+        nbr = _bond_class(nbr)
+
+        def build():
+            if nbr in self.given:
+                return self.given[nbr]
+            elif self.vectors is not None:
+                shells = self.shells()
+                if nbr > len(shells):
+                    return np.zeros((0, 2), dtype=np.int64)
+                images = self._images()
+                pairs = images[images[:, 2] == shells[nbr - 1], :2]
+                return pairs.astype(np.int64)
+            i, j = np.nonzero(np.triu(self._distances() == nbr, 1))
+            return np.stack([i, j], 1).astype(np.int64)
+        return self._cached(('bonds', nbr), build)
+
+    def shell_table(self):
+        def build():
+            n = self.numel()
+            table = np.zeros((n, n), dtype=np.int64)
+            for k in range(len(self.shells()), 0, -1):
+                i, j = self.bonds(k).T
+                table[i, j] = k
+                table[j, i] = k
+            return table
+        return self._cached('shell table', build)
+
+    def translation(self, shift):
+        raise ValueError('translations of graph lattices are not defined')
+
+    def reflection(self, axis=0):
+        raise ValueError('reflections of graph lattices are not defined')
+
+    def description(self):
+        """a serializable description (see `vmc.utils.files.signature`)"""
+        if self.vectors is not None:
+            return {'vectors': self.vectors.tolist(),
+                    'basis': self.basis.tolist(),
+                    'cells': self.cells}
+        return {'edges': {k: v.tolist() for k, v in self.given.items()}}
+
+
+def _cells(args, kwargs):
+    """number of cells from positional or shape keywords"""
+    if args:
+        return list(args)
+    for key in ['shape', 'size', 'length']:
+        if key in kwargs:
+            return list(np.atleast_1d(kwargs.pop(key)))
+    raise TypeError("Missing shape information")
+
+
+class Triangular(GraphLattice):
+    """triangular lattice"""
+
+    def __init__(self, *args, **kwargs):
+        super(Triangular, self).__init__(
+            vectors=[[1, 0], [0.5, np.sqrt(3) / 2]],
+            cells=_cells(args, kwargs), name='Triangular', **kwargs)
+
+
+class Honeycomb(GraphLattice):
+    """honeycomb lattice, two sites per cell"""
+
+    def __init__(self, *args, **kwargs):
+        super(Honeycomb, self).__init__(
+            vectors=[[np.sqrt(3), 0], [np.sqrt(3) / 2, 1.5]],
+            basis=[[0, 0], [0, 1]],
+            cells=_cells(args, kwargs), name='Honeycomb', **kwargs)
+
+
+class Kagome(GraphLattice):
+    """kagome lattice, three sites per cell"""
+
+    def __init__(self, *args, **kwargs):
+        super(Kagome, self).__init__(
+            vectors=[[2, 0], [1, np.sqrt(3)]],
+            basis=[[0, 0], [1, 0], [0.5, np.sqrt(3) / 2]],
+            cells=_cells(args, kwargs), name='Kagome', **kwargs)
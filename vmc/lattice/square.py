@@ -1,3 +1,4 @@
+import numpy as np
 from .base import LatticeBase
 
 
@@ -7,6 +8,18 @@ class Square(LatticeBase):
     def __init__(self, *args, **kwargs):
         super(Square, self).__init__('Square', *args, **kwargs)
 
+    # nearest and diagonal neighbours as grid yields them, both
+    # diagonals are kept on 2 x 2 periodic lattices
+    _displacements = {
+        1: [[1, 0], [0, 1]],
+        2: [[1, 1], [1, -1]],
+    }
+
+    def displacements(self, nbr):
+        if nbr in self._displacements:
+            return np.array(self._displacements[nbr], dtype=np.int64)
+        return super(Square, self).displacements(nbr)
+
     def grid(self, nbr=None):
         if nbr is None or nbr is 0:
             for i in range(self.shape[0]):
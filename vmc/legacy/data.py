@@ -1,7 +1,7 @@
 from random import choice
 
 from vmc.basis import *
-from vmc.utils import ground, bin
+from vmc.utils import ground, bin, default_cache, CACHE_ROOT
 from vmc.sampler import STMetropolis
 from vmc.ham import isham
 
@@ -96,7 +96,7 @@ class TOMO(data.Dataset):
                 ))
 
     def gen(self, ham, itr=1000, nbasis=1000, burn=500, thin=1):
-        _, state = ground(ham)
+        _, state = ground(ham, cache=default_cache(CACHE_ROOT, matrices=False))
         n = ham.lattice.numel()
 
         try:
@@ -221,7 +221,7 @@ class FixedTOMO(data.Dataset):
                 ))
 
     def gen(self, ham, itr=1000, nbasis=1000, burn=500, thin=1):
-        _, state = ground(ham)
+        _, state = ground(ham, cache=default_cache(CACHE_ROOT, matrices=False))
         n = ham.lattice.numel()
 
         try:
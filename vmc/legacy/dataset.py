@@ -6,7 +6,7 @@ import torch.utils.data as data
 import errno
 import os
 
-from vmc.utils import ground, bin
+from vmc.utils import ground, bin, default_cache, CACHE_ROOT
 from vmc.sampler import PseudoRandom, STMetropolis
 from vmc.basis import MBOp, sigmax, sigmay, sigmaz
 
@@ -68,7 +68,8 @@ class DataBase(data.Dataset):
             elif h is not None:
                 print('find hamiltonian, start calculating ground state')
                 self.n = h.lattice.numel()
-                _, self.state = ground(h)
+                _, self.state = ground(
+                    h, cache=default_cache(CACHE_ROOT, matrices=False))
                 self.size = h.size
             else:
                 raise ValueError("need a state, keyword"
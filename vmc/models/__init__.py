@@ -1,6 +1,8 @@
 from .gan import GAN, WGAN
+from .rbm import RBM
 
 __all__ = [
     'GAN',
     'WGAN',
+    'RBM',
 ]
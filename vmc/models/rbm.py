@@ -0,0 +1,144 @@
+import torch
+import torch.nn as nn
+
+__all__ = ['RBM']
+
+
+def _logcosh(theta):
+    """log(2 cosh(theta)), stable for large |theta|"""
+    theta = torch.abs(theta)
+    return theta + torch.log1p(torch.exp(-2 * theta))
+
+
+class RBM(nn.Module):
+    """restricted Boltzmann machine ansatz
+
+        psi(s) = exp(a . s) prod_j 2 cosh(theta_j), theta = W s + b
+
+    the model implements the fast update protocol used by
+    `utils.eloc` and `STMetropolis`:
+
+        log_psi(x): log amplitude of x
+        log_psi_ratio(x, flips): log(psi(x') / psi(x)), x' is x with
+            sites in flips (flattened indices) flipped
+        update(x, flips): move the cached state to x'
+
+    theta of the last configuration is kept as a lookup table, a ratio
+    of k flips costs O(k * hidden) instead of a full forward pass. The
+    table is rebuilt when parameters or the configuration changed.
+
+    Params:
+        n: number of spins
+        hidden: number of hidden units, default: n
+        scale: standard deviation of initial parameters
+    """
+
+    def __init__(self, n, hidden=None, scale=0.01):
+        super(RBM, self).__init__()
+        self.n = n
+        self.hidden = hidden or n
+        self.a = nn.Parameter(torch.randn(n).double() * scale)
+        self.b = nn.Parameter(torch.randn(self.hidden).double() * scale)
+        self.W = nn.Parameter(
+            torch.randn(self.hidden, n).double() * scale)
+        self._x = None
+        self._theta = None
+        self._version = None
+
+    def _spins(self, x):
+        return x.contiguous().view(-1, self.n).double()
+
+    def log_psi(self, x):
+        s = self._spins(x)
+        theta = s.mm(self.W.t()) + self.b
+        ret = s.mv(self.a) + torch.sum(_logcosh(theta), 1)
+        return ret[0] if x.numel() == self.n else ret
+
+    def log_psi_walk(self, x, sites):
+        """log amplitudes along a walk of single flips
+
+        theta of every step is the cumulative sum of the changes of
+        the flips, so the walk costs a single batched pass.
+
+        Params:
+            x: the first configuration
+            sites: a LongTensor of flipped sites of each step, shape
+                (L, )
+
+        Returns:
+            a tensor of shape (L + 1, ), log amplitudes of x and of
+            the configurations after each step
+        """
+        sites = torch.as_tensor(sites, dtype=torch.long).view(-1)
+        s = self._spins(x).view(-1).detach()
+        flips = torch.zeros(len(sites), self.n, dtype=s.dtype)
+        flips[torch.arange(len(sites)), sites] = 1
+        # spins of the flipped sites before each step
+        parity = torch.cumsum(flips, 0) - flips
+        before = s[sites] * (1 - 2 * torch.fmod(parity, 2).gather(
+            1, sites.view(-1, 1)).view(-1))
+        W, a = self.W.detach(), self.a.detach()
+        theta = torch.cat([
+            (W.mv(s) + self.b.detach()).view(1, -1),
+            -2 * before.view(-1, 1) * W.t()[sites]]).cumsum(0)
+        linear = torch.cat([a.dot(s).view(1),
+                            -2 * before * a[sites]]).cumsum(0)
+        return linear + torch.sum(_logcosh(theta), 1)
+
+    def forward(self, x):
+        return torch.exp(self.log_psi(x))
+
+    def _params_version(self):
+        return tuple((p.data_ptr(), p._version) for p in self.parameters())
+
+    def _table(self, s):
+        """theta of configuration s, from the cache when it is valid"""
+        version = self._params_version()
+        if self._x is None or version != self._version or \
+                not torch.equal(self._x, s):
+            self._x = s.clone()
+            self._theta = self.W.detach().mv(s) + self.b.detach()
+            self._version = version
+        return self._theta
+
+    def _delta(self, s, flips):
+        """changes of a . s and theta of each set of flips"""
+        valid = flips >= 0
+        index = flips.clamp(min=0)
+        sf = s[index] * valid.double()
+        W = self.W.detach().t()[index]
+        dtheta = -2 * torch.sum(sf.unsqueeze(-1) * W, 1)
+        dlinear = -2 * torch.sum(self.a.detach()[index] * sf, 1)
+        return dlinear, dtheta
+
+    def log_psi_ratio(self, x, flips):
+        """log amplitude ratios of flipped configurations
+
+        Params:
+            x: a configuration
+            flips: a LongTensor of sites, shape (k, ), or (M, k) for
+                M configurations, padded with -1
+
+        Returns:
+            a scalar tensor, or a tensor of shape (M, )
+        """
+        flips = torch.as_tensor(flips, dtype=torch.long)
+        single = flips.dim() == 1
+        s = self._spins(x).view(-1)
+        theta = self._table(s)
+        dlinear, dtheta = self._delta(s, flips.view(1, -1) if single
+                                      else flips)
+        ret = dlinear + torch.sum(_logcosh(theta + dtheta) -
+                                  _logcosh(theta), 1)
+        return ret[0] if single else ret
+
+    def update(self, x, flips):
+        """update the lookup table after x moved to x with flips"""
+        flips = torch.as_tensor(flips, dtype=torch.long).view(1, -1)
+        s = self._spins(x).view(-1)
+        theta = self._table(s)
+        _, dtheta = self._delta(s, flips)
+        index = flips[flips >= 0]
+        self._x = s.clone()
+        self._x[index] *= -1
+        self._theta = theta + dtheta[0]
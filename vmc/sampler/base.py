@@ -1,15 +1,23 @@
 from tqdm import trange
-from vmc.configs import Generator
+from vmc.configs import Generator, ConfigBatch
 from vmc.collector import Collector
+from vmc.lattice import config_size
 from multiprocessing import current_process
 
 
 class SamplerBase(object):
-    """sampler base"""
+    """sampler base
+
+    Params:
+        size: size of configurations, or a lattice for flat
+            configurations of its sites (see `LatticeBase.flatten`)
+        packed: collect samples as `ConfigBatch` of one configuration
+            (bit packed, hashable) instead of tensors
+    """
 
     def __init__(self, proposal, size,
                  generator='randselect', collector='std',
-                 bar=True, id=None):
+                 bar=True, id=None, packed=False):
         super(SamplerBase, self).__init__()
         if id is not None:
             self.id = id
@@ -21,7 +29,8 @@ class SamplerBase(object):
                 self.id = 0
 
         self.proposal = proposal
-        self.size = size
+        self.size = config_size(size)
+        self.packed = packed
         self.generator = Generator(generator)
         self.collector = Collector(collector)
         self.state = dict(itr=0, collect=False, bar=bar)
@@ -34,6 +43,12 @@ class SamplerBase(object):
     def step(self):
         raise NotImplementedError
 
+    def pack(self, sample):
+        """sample in the collected format"""
+        if self.packed:
+            return ConfigBatch.pack(sample, size=self.size)
+        return sample
+
     def preprocess(self, kwargs):
         pass
 
@@ -1,6 +1,8 @@
 import torch
+import numpy as np
 
 from .base import SamplerBase
+from vmc.configs import ConfigBatch
 from numpy.random import rand
 from vmc.utils import shift
 
@@ -10,15 +12,18 @@ class PseudoRandom(SamplerBase):
 
     def __init__(self, p_vec, size,
                  generator='randselect',
-                 collector='std'):
+                 collector='std', packed=False):
         l1 = sum(p_vec)
         p_vec = [each / l1 for each in p_vec]
         self.stride = [sum(p_vec[0:k]) for k in range(len(p_vec))]
         super(PseudoRandom, self).__init__(
-            p_vec, size, generator, collector)
+            p_vec, size, generator, collector, packed=packed)
 
     def step(self):
         dice = rand()
+        if self.packed:
+            code = np.searchsorted(self.stride[1:], dice, side='right')
+            return ConfigBatch.from_codes([code], self.size)
         sample = torch.zeros(*self.size) - 1
         for i, each in enumerate(self.stride[1:]):
             if dice < each:
@@ -5,36 +5,84 @@ from sys import float_info
 from tqdm import trange
 
 import torch
-from vmc.utils import shift
+import numpy as np
+from math import exp, log
+from vmc.configs import ConfigBatch
+from vmc.utils import shift, flip_sites
 
 
 class STMetropolis(SamplerBase):
-    """single thread metropolis"""
+    """single thread metropolis
+
+    with an ansatz of the fast update protocol (see `vmc.models.RBM`),
+    the chain is kept in the log domain, state['logprob'] is
+    log|psi|^2 of the last configuration. The collected accept weight
+    is still the probability, it is inf when it overflows.
+    """
 
     def preload(self):
         self.state['last'] = randspin(self.size)
-        self.state['prob'] = self.proposal(self.state['last'])
+        # ansatz with fast updates, see `vmc.models.RBM`
+        self.fast = hasattr(self.proposal, 'log_psi_ratio')
+        if self.fast:
+            self.state['logprob'] = \
+                2 * float(self.proposal.log_psi(self.state['last']))
+        else:
+            self.state['prob'] = self.proposal(self.state['last'])
         # TODO: check proposal output shape
 
+    def _fast_step(self, cand):
+        last = self.state['last']
+        flips = flip_sites(last, cand.unsqueeze(0))[0]
+        ratio = 2 * float(self.proposal.log_psi_ratio(last, flips))
+        accept = ratio + log(self.generator.factor)
+        accepted = accept >= 0 or rand() < exp(accept)
+        if accepted:
+            self.proposal.update(last, flips)
+            self.state['last'] = cand
+            self.state['logprob'] += ratio
+        self.generator.accept(accepted)
+
+    @staticmethod
+    def _prob(logprob):
+        if logprob < log(float_info.max):
+            return exp(logprob)
+        return float('inf')
+
     def step(self, collect=True):
         if self.inverse is not None and rand() < self.inverse:
-            self.state['last'] *= -1
+            # a new tensor, the last one may have been collected
+            self.state['last'] = - self.state['last']
+            self.generator.reset()
+            if self.fast:
+                self.state['logprob'] = \
+                    2 * float(self.proposal.log_psi(self.state['last']))
+            else:
+                self.state['prob'] = self.proposal(self.state['last'])
 
         cand = self.generator.propose(self.state['last'])
-        prob = self.proposal(cand)
-
-        if self.state['prob'] > 1000 * float_info.min:
-            accept = min(1.0, prob / self.state['last'])
+        if self.fast:
+            self._fast_step(cand)
         else:
-            accept = 1.0
+            prob = self.proposal(cand)
 
-        if rand() < accept:
-            self.state['last'] = cand
-            self.state['prob'] = prob
+            if self.state['prob'] > 1000 * float_info.min:
+                accept = min(1.0, prob / self.state['prob'] *
+                             self.generator.factor)
+            else:
+                accept = 1.0
 
-        if self.state['itr'] % self.state['thin'] == 0:
+            accepted = rand() < accept
+            if accepted:
+                self.state['last'] = cand
+                self.state['prob'] = prob
+            self.generator.accept(accepted)
+
+        if collect and self.state['itr'] % self.state['thin'] == 0:
+            weight = self.state['prob'] if not self.fast else \
+                self._prob(self.state['logprob'])
             self.collector.collect_sample(
-                self.state['last'], self.state['prob'])
+                self.pack(self.state['last']), weight)
 
     def preprocess(self, kwargs):
         if 'burn' in kwargs:
@@ -63,6 +111,11 @@ class STDirect(SamplerBase):
 
     def step(self):
         dice = rand()
+        if self.packed:
+            code = np.searchsorted(self.stride[1:], dice, side='right')
+            self.collector.collect_sample(
+                ConfigBatch.from_codes([code], self.size))
+            return
         sample = torch.zeros(*self.size) - 1
         for each in self.stride[1:]:
             if dice < each:
@@ -5,4 +5,10 @@ This module provides some useful utilities
 
 from .consts import *
 from .decorators import *
+from .bits import *
+from .cache import *
+from .files import *
 from .core import *
+from .exact import *
+from .sweep import *
+from .parallel import *
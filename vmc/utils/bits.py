@@ -0,0 +1,174 @@
+"""bit operations on integer coded configurations
+
+A configuration of N spins on {-1, 1} is coded by an integer whose
+k-th bit is 1 when the k-th (flattened) spin is up, which is the same
+convention as `bin`. Codes are stored as numpy.int64, so up to 62 spins
+(`MAX_BITS`) can be coded, functions raise ValueError for more spins (see
+`vmc.configs.ConfigBatch` for larger configurations).
+"""
+
+import numpy as np
+import torch
+
+__all__ = [
+    'MAX_BITS',
+    'check_bits',
+    'encode',
+    'decode',
+    'popcount',
+    'binomial',
+    'comb_rank',
+    'comb_unrank',
+    'mask_sites',
+]
+
+# number of spins int64 codes can hold
+MAX_BITS = 62
+
+
+def check_bits(n):
+    """raise ValueError when n spins can not be coded"""
+    if n > MAX_BITS:
+        raise ValueError("%d spins can not be coded in int64, at most %d"
+                         % (n, MAX_BITS))
+
+
+def encode(configs):
+    """encode a batch of configurations
+
+    Params:
+        configs: a tensor or numpy.ndarray on {-1, 1}, shape (B, N)
+            or (B, *size)
+
+    Returns:
+        a numpy.int64 array of codes, shape (B, )
+
+    Raises:
+        ValueError: when N > MAX_BITS
+    """
+    if torch.is_tensor(configs):
+        configs = configs.cpu().numpy()
+    configs = np.asarray(configs)
+    configs = configs.reshape(configs.shape[0], -1)
+    check_bits(configs.shape[1])
+    weights = np.left_shift(1, np.arange(configs.shape[1], dtype=np.int64))
+    return (configs > 0).astype(np.int64).dot(weights)
+
+
+def decode(codes, n):
+    """decode codes to configurations
+
+    Params:
+        codes: integer codes, shape (B, )
+        n: number of spins
+
+    Returns:
+        a numpy.int64 array on {-1, 1}, shape (B, n)
+
+    Raises:
+        ValueError: when n > MAX_BITS
+    """
+    check_bits(n)
+    codes = np.asarray(codes, dtype=np.int64).reshape(-1, 1)
+    sites = np.arange(n, dtype=np.int64)
+    return 2 * ((codes >> sites) & 1) - 1
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(codes):
+        """number of up spins (set bits) of each code"""
+        return np.bitwise_count(np.asarray(codes, dtype=np.int64)) \
+            .astype(np.int64)
+else:
+    def popcount(codes):
+        """number of up spins (set bits) of each code"""
+        x = np.asarray(codes, dtype=np.int64).astype(np.uint64)
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + \
+            ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+        x = (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+        return x.astype(np.int64)
+
+
+def binomial(n):
+    """table of binomial coefficients C(p, j) for 0 <= p, j <= n
+
+    Returns:
+        a numpy.int64 array, shape (n + 1, n + 1)
+    """
+    table = np.zeros((n + 1, n + 1), dtype=np.int64)
+    table[:, 0] = 1
+    for p in range(1, n + 1):
+        table[p, 1:] = table[p - 1, 1:] + table[p - 1, :-1]
+    return table
+
+
+def comb_rank(codes, n):
+    """rank of codes among codes with the same number of up spins
+
+    codes with k up spins are ranked in ascending order, the rank of
+    a code with up spins on p_1 < p_2 < ... < p_k is
+    C(p_1, 1) + C(p_2, 2) + ... + C(p_k, k)
+
+    Params:
+        codes: integer codes
+        n: number of spins
+
+    Returns:
+        a numpy.int64 array of ranks
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    table = binomial(n)
+    rank = np.zeros(codes.shape, dtype=np.int64)
+    count = np.zeros(codes.shape, dtype=np.int64)
+    for p in range(n):
+        up = (codes >> p) & 1
+        count += up
+        rank += up * table[p, count]
+    return rank
+
+
+def comb_unrank(ranks, n, k):
+    """codes of given ranks among codes with k up spins
+
+    this is the inverse of `comb_rank`
+
+    Params:
+        ranks: integer ranks, 0 <= rank < C(n, k)
+        n: number of spins
+        k: number of up spins
+
+    Returns:
+        a numpy.int64 array of codes
+    """
+    rank = np.array(ranks, dtype=np.int64)
+    table = binomial(n)
+    codes = np.zeros(rank.shape, dtype=np.int64)
+    left = np.zeros(rank.shape, dtype=np.int64) + k
+    for p in range(n - 1, -1, -1):
+        comb = table[p, left]
+        up = (left > 0) & (comb <= rank)
+        codes |= up.astype(np.int64) << p
+        rank -= np.where(up, comb, 0)
+        left -= up
+    return codes
+
+
+def mask_sites(masks, n):
+    """flipped sites of flip masks
+
+    Params:
+        masks: integer flip masks, shape (M, ), bit k is set if
+            site k is flipped
+        n: number of spins
+
+    Returns:
+        a numpy.int64 array of sites, shape (M, K), K is the
+        largest number of flips, padded with -1
+    """
+    masks = np.asarray(masks, dtype=np.int64).reshape(-1, 1)
+    flipped = (masks >> np.arange(n, dtype=np.int64)) & 1 == 1
+    width = int(flipped.sum(1).max()) if len(masks) else 0
+    sites = np.where(flipped, np.arange(n, dtype=np.int64), -1)
+    return -np.sort(-sites, axis=1)[:, :width]
@@ -0,0 +1,165 @@
+"""caches for monte carlo
+
+Metropolis chains revisit the same configurations, `ElocCache` keeps
+their connections and local energies, keyed by the packed words of
+configurations (see `vmc.configs.ConfigBatch`).
+"""
+
+import torch
+from collections import OrderedDict
+from torch.autograd import Variable
+from vmc.configs import ConfigBatch
+from .core import apply_flips
+
+__all__ = [
+    'LRUCache',
+    'ElocCache',
+]
+
+
+class LRUCache(object):
+    """bounded cache with least recently used eviction
+
+    Params:
+        maxsize: maximum number of entries, None for unbounded
+    """
+
+    def __init__(self, maxsize=2 ** 16):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if self.maxsize is not None and len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class ElocCache(object):
+    """cache of connections and local energies
+
+    connections of a configuration are kept as long as it stays in
+    the cache, local energies are tagged with the version of
+    parameters they are computed with, and are recomputed after
+    the parameters changed. The version is read from in-place
+    counters of the parameters (bumped by optimizers), call
+    `invalidate` after modifying parameters through `.data`.
+    Ansatz implementing `log_psi_ratio` are evaluated by fast
+    updates (see `eloc`).
+
+    Params:
+        hamiltonian: a hamiltonian
+        ansatz: the wave function, a callable on configurations
+        params: parameters of ansatz, default: ansatz.parameters()
+        maxsize: maximum number of cached configurations
+
+    Example:
+        cache = ElocCache(hamiltonian, model, maxsize=4096)
+        energy = sum(cache.eloc(config) for config in collector)
+        print(cache.stats())
+    """
+
+    def __init__(self, hamiltonian, ansatz, params=None, maxsize=2 ** 16):
+        super(ElocCache, self).__init__()
+        self.hamiltonian = hamiltonian
+        self.ansatz = ansatz
+        if params is None and hasattr(ansatz, 'parameters'):
+            params = ansatz.parameters()
+        self.params = list(params) if params is not None else []
+        self.nnz_cache = LRUCache(maxsize)
+        self.eloc_cache = LRUCache(maxsize)
+        self._epoch = 0
+
+    @staticmethod
+    def key(config):
+        """hashable key of a configuration, its code up to 64 spins"""
+        return ConfigBatch.pack(config.contiguous().view(-1)).keys()[0]
+
+    def version(self):
+        """version of current parameters"""
+        return (self._epoch, ) + tuple((p.data_ptr(), p._version)
+                                       for p in self.params)
+
+    def invalidate(self):
+        """mark all cached local energies as outdated"""
+        self._epoch += 1
+
+    def connections(self, config):
+        """non-zero values of the hamiltonian
+
+        Returns:
+            flips: flipped sites of each connection, see `nnz_flips`
+            vals: matrix elements, shape (M, )
+        """
+        key = self.key(config)
+        ret = self.nnz_cache.get(key)
+        if ret is None:
+            ret = self.hamiltonian.nnz_flips(config)
+            self.nnz_cache.put(key, ret)
+        return ret
+
+    def eloc(self, config):
+        """local energy of config with current parameters"""
+        key = self.key(config)
+        version = self.version()
+        entry = self.eloc_cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        elif entry is not None:
+            # outdated, count as a miss
+            self.eloc_cache.hits -= 1
+            self.eloc_cache.misses += 1
+
+        flips, vals = self.connections(config)
+        if hasattr(self.ansatz, 'log_psi_ratio'):
+            ret = torch.sum(vals * torch.exp(
+                self.ansatz.log_psi_ratio(config, flips)))
+        else:
+            RHS = apply_flips(config, flips)
+            ret = sum(val * self.ansatz(Variable(rhs.view_as(config)))
+                      for rhs, val in zip(RHS, vals))
+            ret = ret / self.ansatz(Variable(config))
+        if torch.is_tensor(ret):
+            ret = ret.detach()
+        self.eloc_cache.put(key, (version, ret))
+        return ret
+
+    __call__ = eloc
+
+    def clear(self):
+        self.nnz_cache.clear()
+        self.eloc_cache.clear()
+
+    def stats(self):
+        """hit counters, a dict of (hits, misses, hit rate)"""
+        return {
+            name: (cache.hits, cache.misses, cache.hit_rate())
+            for name, cache in [('connections', self.nnz_cache),
+                                ('eloc', self.eloc_cache)]
+        }
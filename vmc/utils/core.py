@@ -1,15 +1,15 @@
 import torch
 
 import scipy.sparse as sp
-from scipy.sparse.dok import _prod
-from scipy.sparse.linalg import eigsh
+from scipy.sparse.linalg import eigsh, LinearOperator
 import numpy as np
 
 from .consts import iden
 from .decorators import parse_multimatrix
+from .files import signature, default_cache
 
 from torch.autograd import Variable
-from vmc.configs import IterateAll
+from vmc.configs import IterateAll, ConfigBatch
 
 from collections import Iterable
 
@@ -22,8 +22,9 @@ __all__ = [
     'kronsum',
     'hash_grid',
     'nlocal',
+    'flip_sites',
+    'apply_flips',
     'eloc',
-    'exact_energy',
     'norm',
     'normalize',
     'ground',
@@ -31,12 +32,22 @@ __all__ = [
 
 
 def bin(x):
-    flatten_x = x.view(x.numel())
-    # print(storage)
-    ret = 0
-    for i, each in enumerate(flatten_x):
-        ret += (each + 1) / 2 * 2**i
-    return int(ret)
+    """basis index of a configuration on {-1, 1}, bit k is set when the
+    k-th (flattened) spin is up
+
+    Params:
+        x: a configuration (tensor or numpy.ndarray), or a `ConfigBatch`
+
+    Returns:
+        an int, or a numpy.int64 array of indices of a `ConfigBatch`
+        of more than one configuration
+    """
+    if isinstance(x, ConfigBatch):
+        index = x.index()
+        return int(index[0]) if len(x) == 1 else index
+    if torch.is_tensor(x):
+        x = x.detach().cpu().numpy()
+    return int(ConfigBatch.pack(np.asarray(x).reshape(1, -1)).index()[0])
 
 
 def shift(tensor):
@@ -70,9 +81,16 @@ def randspin(size, states=2):
 def ed(mat, k=1):
     """
     Exact diagnolization
+
+    small matrices and linear operators (dimension <= 1024, or
+    at most k) are diagonalized by dense solver, others by
+    Lanczos (eigsh)
     """
-    if _prod(mat.shape) > 20:
-        if isinstance(mat, sp.spmatrix):
+    n = mat.shape[0]
+    if n <= 2 ** 10 or k >= n:
+        if isinstance(mat, LinearOperator):
+            mat = mat.matmat(np.eye(n, dtype=mat.dtype))
+        elif isinstance(mat, sp.spmatrix):
             mat = mat.toarray()
         return np.linalg.eigh(mat)
     else:
@@ -110,13 +128,19 @@ def kronsum(gen):
 
 
 def hash_grid(index, size):
+    """flat site id of a grid index, in row-major order as configurations
+    are flattened (see `LatticeBase.index`)
+    """
     if isinstance(index, int) and isinstance(size, int):
         return index
-    elif isinstance(index, tuple) and isinstance(size, tuple):
-        strides = [1]
-        for i in size[0: -1]:
-            strides.append(i)
-        return sum(inds * j for inds, j in zip(index, strides))
+    elif isinstance(index, tuple) and isinstance(size, (tuple, list)):
+        if len(index) != len(size):
+            raise ValueError('index %s does not match size %s'
+                             % (index, size))
+        ret = 0
+        for i, n in zip(index, size):
+            ret = ret * n + i
+        return ret
     else:
         raise TypeError('index and size should be tuple')
 
@@ -149,18 +173,61 @@ def nlocal(op, lattice, nbr):
     return h
 
 
+def flip_sites(x, configs):
+    """sites where configurations differ from x
+
+    Params:
+        x: a configuration
+        configs: configurations, shape (M, N) or (M, *size)
+
+    Returns:
+        a LongTensor of flattened sites, shape (M, K),
+        padded with -1
+    """
+    configs = configs.contiguous().view(configs.size(0), -1)
+    diff = configs != x.contiguous().view(1, -1).type_as(configs)
+    width = int(diff.sum(1).max()) if len(diff) else 0
+    sites = torch.arange(configs.size(1)).long().expand_as(diff)
+    sites = torch.where(diff, sites, -torch.ones_like(sites))
+    sites, _ = sites.sort(1, descending=True)
+    return sites[:, :width]
+
+
+def apply_flips(x, flips):
+    """configurations of x with flips, inverse of `flip_sites`
+
+    Params:
+        x: a configuration
+        flips: a LongTensor of flattened sites, shape (M, K),
+            padded with -1
+
+    Returns:
+        configurations, shape (M, N)
+    """
+    flips = torch.as_tensor(flips, dtype=torch.long)
+    configs = x.contiguous().view(1, -1).repeat(flips.size(0), 1)
+    valid = flips >= 0
+    rows = torch.arange(flips.size(0)).long().unsqueeze(1).expand_as(flips)
+    configs[rows[valid], flips[valid]] *= -1
+    return configs
+
+
 def eloc(x, ansatz, hamiltonian):
+    """local energy of configuration x
+
+    when the ansatz implements `log_psi_ratio` (see `vmc.models.RBM`)
+    amplitude ratios are computed by fast updates on the flips of
+    connected configurations (see `nnz_flips`).
+    """
+    if hasattr(ansatz, 'log_psi_ratio'):
+        flips, vals = hamiltonian.nnz_flips(x)
+        ratio = torch.exp(ansatz.log_psi_ratio(x, flips))
+        return torch.sum(vals * ratio)
     ret = sum(val * ansatz(Variable(config))
               for config, val in hamiltonian.nnz(x))
     return ret / ansatz(Variable(x))
 
 
-def exact_energy(ansatz, hamiltonian):
-    energy = sum(torch.abs(ansatz(Variable(config))) ** 2 * eloc(config)
-                 for config in IterateAll(size=hamiltonian.size))
-    return energy
-
-
 def norm(state):
     from math import sqrt
 
@@ -188,13 +255,74 @@ def normalize(state):
                         "got %s" % type(state))
 
 
-def ground(hamiltonian):
+def _sector(hamiltonian, sz=None, momentum=None, reflection=None):
+    """the sector of given quantum numbers, or None"""
+    from vmc.ham.sector import SzSector, MomentumSector
+
+    if momentum is not None:
+        return MomentumSector(hamiltonian.lattice, momentum,
+                              reflection=reflection, sz=sz)
+    elif sz is not None:
+        return SzSector(hamiltonian.lattice.numel(), sz)
+    return None
+
+
+def ground(hamiltonian, method='sparse', sz=None, momentum=None,
+           reflection=None, embed=False, cache=None, **kwargs):
     """gets hamiltonian's ground state
+
+    Params:
+        hamiltonian: a hamiltonian, or its matrix
+        method: 'sparse' diagonalizes the matrix from `mat()`,
+            'matrix_free' applies the hamiltonian on the fly with
+            `as_linear_operator()`, keywords (chunk, workers) are
+            passed to them.
+        sz: diagonalize in the sector of fixed magnetization sz
+            (optional), the hamiltonian should conserve it.
+        momentum: diagonalize in the block of given momentum
+            (optional), the lattice should be periodic.
+        reflection: reflection parity (1 or -1) of the momentum
+            block (optional)
+        embed: return the ground state in the full basis
+            rather than in the sector.
+        cache: a `DiskCache` keeping matrices (unless its matrices
+            is False) and ground states across runs, default: the
+            cache configured by environment (see `vmc.utils.files`),
+            False to disable it.
     """
     from vmc.ham import isham
-    if isham(hamiltonian):
-        h = hamiltonian.mat()
 
-    energy, state = ed(h)
-    return energy[0], state[:, 0]
+    sector = _sector(hamiltonian, sz, momentum, reflection)
+    if cache is None:
+        cache = default_cache()
+    if not isham(hamiltonian) or cache is False:
+        cache = None
+
+    key, found = None, None
+    if cache is not None:
+        key = signature(hamiltonian, sector, kind='ground')
+        found = cache.eigen(key)
+
+    if found is not None:
+        energy, state = found
+    else:
+        if not isham(hamiltonian):
+            h = hamiltonian
+        elif method == 'sparse' and cache is not None and cache.matrices:
+            h = cache.matrix(hamiltonian, sector=sector, **kwargs)
+        elif method == 'sparse':
+            h = hamiltonian.mat(sector=sector, **kwargs)
+        elif method == 'matrix_free':
+            h = hamiltonian.as_linear_operator(sector=sector, **kwargs)
+        else:
+            raise ValueError("method should be 'sparse' or 'matrix_free'"
+                             " not %s" % method)
+        energy, state = ed(h)
+        energy, state = energy[0], state[:, 0]
+        if cache is not None:
+            cache.store_eigen(key, energy, state)
+
+    if sector is not None and embed:
+        state = sector.embed(state)
+    return energy.item() if isinstance(energy, np.ndarray) else energy, state
 
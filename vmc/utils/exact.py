@@ -0,0 +1,144 @@
+"""exact energies of ansatz over the full basis
+
+the ansatz is evaluated on all 2^N configurations in chunks (batched
+forward passes), the energy is psi^dagger H psi / psi^dagger psi with
+the sparse (or matrix-free) hamiltonian, its gradient is obtained by a
+single backward pass. `gray_walk` enumerates the basis in Gray code
+order, where diagonal elements, magnetizations and amplitudes are
+updated from the single flipped spin of each step.
+"""
+
+import torch
+import numpy as np
+from vmc.configs import IterateAll, gray_code, gray_sites
+from .bits import decode, popcount
+
+__all__ = [
+    'ExactEnergy',
+    'exact_energy',
+    'gray_walk',
+]
+
+
+class ExactEnergy(object):
+    """exact energy of ansatz for a hamiltonian
+
+    the matrix (or operator) is built once and reused for
+    every evaluation, e.g. across steps of exact training.
+
+    Params:
+        hamiltonian: a hamiltonian
+        method: 'sparse' applies the matrix from `mat()`, 'matrix_free'
+            the operator from `as_linear_operator()`, keywords (chunk,
+            workers) are passed to them
+        chunk: number of configurations of a forward pass
+        dtype: dtype of configurations, default: torch default dtype
+
+    Example:
+        energy = ExactEnergy(hamiltonian)
+        for epoch in range(100):
+            optimizer.zero_grad()
+            loss = energy(model)
+            loss.backward()
+            optimizer.step()
+    """
+
+    def __init__(self, hamiltonian, method='sparse', chunk=2 ** 14,
+                 dtype=None, **kwargs):
+        super(ExactEnergy, self).__init__()
+        self.size = tuple(hamiltonian.lattice.size())
+        self.n = hamiltonian.lattice.numel()
+        self.chunk = chunk
+        self.dtype = dtype or torch.get_default_dtype()
+        if method == 'sparse':
+            self.operator = hamiltonian.mat(**kwargs).tocsr()
+        elif method == 'matrix_free':
+            self.operator = hamiltonian.as_linear_operator(**kwargs)
+        else:
+            raise ValueError("method should be 'sparse' or 'matrix_free'"
+                             " not %s" % method)
+
+    def amplitudes(self, ansatz):
+        """amplitudes of the full basis (ordered by codes), shape (2^N, )
+
+        ansatz should take a batch of configurations of
+        shape (B, ) + size, and return B amplitudes.
+        """
+        gen = IterateAll(size=self.size, chunk=self.chunk, dtype=self.dtype)
+        return torch.cat([ansatz(configs).contiguous().view(-1)
+                          for configs in gen])
+
+    def __call__(self, ansatz):
+        """energy of ansatz, a scalar tensor
+
+        the gradient of the returned tensor is the gradient of the
+        energy, it is computed from a surrogate
+        (2 Re<psi|H psi> - E <psi|psi>) / <psi|psi>, where H psi, E and
+        <psi|psi> are constants, which equals E.
+        """
+        psi = self.amplitudes(ansatz)
+        state = psi.detach().cpu().numpy()
+        hpsi = self.operator.dot(state)
+        norm = float(np.vdot(state, state).real)
+        energy = float(np.vdot(state, hpsi).real) / norm
+        hpsi = torch.from_numpy(np.asarray(hpsi)).to(psi.device)
+        if psi.is_complex():
+            overlap = torch.sum(psi.conj() * hpsi.to(psi.dtype)).real
+            weight = torch.sum(psi.abs() ** 2)
+        else:
+            overlap = torch.sum(psi * hpsi.real.to(psi.dtype))
+            weight = torch.sum(psi ** 2)
+        return (2 * overlap - energy * weight) / norm
+
+
+def exact_energy(ansatz, hamiltonian, **kwargs):
+    """exact energy of ansatz for a hamiltonian, see `ExactEnergy`"""
+    return ExactEnergy(hamiltonian, **kwargs)(ansatz)
+
+
+def gray_walk(hamiltonian, ansatz=None, chunk=2 ** 14, start=0, stop=None):
+    """walk the basis in Gray code order (see `vmc.configs.GrayCode`)
+
+    diagonal elements and magnetizations of a block are accumulated
+    from `diag_delta` of the flipped spins, log amplitudes from
+    `log_psi_walk` of the ansatz (see `vmc.models.RBM`), or a batched
+    `log_psi` of the block. Each block starts from values computed from
+    scratch, so errors do not build up along the walk. A step costs
+    O(degree) of the flipped site for diagonal elements of lattice
+    hamiltonians (see `LatticeBase.neighbour_table`).
+
+    Params:
+        hamiltonian: a hamiltonian
+        ansatz: a model with `log_psi_walk` or a batched `log_psi`,
+            optional
+        chunk: number of configurations of a block
+        start, stop: positions in the walk, default: all 2^N
+
+    Yields:
+        (codes, sites, diagonal, magnetization, log_psi) of each
+        block, sites are the flipped sites of each step (see
+        `vmc.configs.gray_sites`), log_psi is None without ansatz
+    """
+    n = hamiltonian.lattice.numel()
+    stop = 2 ** n if stop is None else min(stop, 2 ** n)
+    for first in range(start, stop, chunk):
+        last = min(first + chunk, stop)
+        codes = gray_code(np.arange(first, last, dtype=np.int64))
+        sites = gray_sites(first, last)
+        up = (codes[:-1] >> sites[1:]) & 1
+        diagonal = np.cumsum(np.concatenate([
+            hamiltonian.diag_bits(codes[:1]),
+            hamiltonian.diag_delta(codes[:-1], sites[1:])]))
+        magnetization = np.cumsum(np.concatenate([
+            [2 * popcount(codes[:1])[0] - n], 2 - 4 * up]))
+        log_psi = None
+        if ansatz is not None and hasattr(ansatz, 'log_psi_walk'):
+            x = torch.from_numpy(decode(codes[:1], n)[0]).to(
+                torch.get_default_dtype())
+            log_psi = ansatz.log_psi_walk(x, torch.from_numpy(sites[1:]))
+        elif ansatz is not None:
+            log_psi = ansatz.log_psi(torch.from_numpy(
+                decode(codes, n)).to(torch.get_default_dtype()))
+        if log_psi is not None:
+            log_psi = log_psi.detach().cpu().numpy().reshape(-1)
+        yield codes, sites, diagonal, magnetization, log_psi
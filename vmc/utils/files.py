@@ -0,0 +1,259 @@
+"""on-disk cache of hamiltonian matrices and eigenpairs
+
+entries are addressed by a stable hash of the hamiltonian (class, name,
+params and lattice) and the sector, each entry is a directory of `.npy`
+files which are loaded with memory mapping. Old entries are evicted,
+least recently used first, when the cache exceeds its size budget.
+
+the default cache used by `ground` is configured by the environment
+variables VMC_CACHE (the root directory) and VMC_CACHE_BUDGET (in bytes).
+Jobs that should share ground states by default (e.g. data generators)
+ask for a cache at `CACHE_ROOT` when VMC_CACHE is not set, which is kept
+under `CACHE_BUDGET` bytes unless VMC_CACHE_BUDGET says otherwise.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+
+__all__ = [
+    'CACHE_ROOT',
+    'CACHE_BUDGET',
+    'signature',
+    'DiskCache',
+    'default_cache',
+]
+
+# default root of caches of jobs
+CACHE_ROOT = os.path.join('~', '.cache', 'vmc')
+
+# default size budget of caches at a fallback root, in bytes
+CACHE_BUDGET = 2 ** 30
+
+
+def _canonical(obj):
+    """json serializable form of parameters"""
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in sorted(obj.items())}
+    elif isinstance(obj, (list, tuple)):
+        return [_canonical(each) for each in obj]
+    elif isinstance(obj, np.ndarray):
+        return _canonical(obj.tolist())
+    elif isinstance(obj, np.generic):
+        return _canonical(obj.item())
+    elif isinstance(obj, complex):
+        return [obj.real, obj.imag]
+    elif obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    return repr(obj)
+
+
+def _sector(sector):
+    """numeric fields of a sector, independent of numpy reprs"""
+    if sector is None:
+        return None
+    desc = {name: getattr(sector, name)
+            for name in ['n', 'dim', 'k', 'reflection', 'sz', 'nup']
+            if hasattr(sector, name)}
+    desc['type'] = type(sector).__name__
+    return _canonical(desc)
+
+
+def signature(hamiltonian, sector=None, **extra):
+    """stable hash of a hamiltonian (and a sector)
+
+    Params:
+        hamiltonian: a hamiltonian
+        sector: a sector of the basis (optional)
+        extra: other keywords identifying the entry
+
+    Returns:
+        a hex string
+    """
+    lattice = hamiltonian.lattice
+    desc = {
+        'class': type(hamiltonian).__name__,
+        'hamiltonian': hamiltonian.name,
+        'params': _canonical(hamiltonian.params),
+        'lattice': [lattice.name, list(lattice.shape), lattice.pbc],
+        'sector': _sector(sector),
+        'extra': _canonical(extra),
+    }
+    if hasattr(lattice, 'description'):
+        desc['graph'] = _canonical(lattice.description())
+    if hasattr(hamiltonian, 'table'):
+        desc['terms'] = _canonical(hamiltonian.table())
+    text = json.dumps(desc, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class DiskCache(object):
+    """content addressed cache of matrices and eigenpairs
+
+    Params:
+        root: directory of the cache
+        budget: maximum size in bytes, None for unbounded
+        matrices: keep hamiltonian matrices of `ground` as well,
+            False to keep eigenpairs only
+
+    Example:
+        cache = DiskCache('~/.cache/vmc', budget=2 ** 34)
+        matrix = cache.matrix(h)
+        energy, state = utils.ground(h, cache=cache)
+    """
+
+    def __init__(self, root, budget=None, matrices=True):
+        super(DiskCache, self).__init__()
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.budget = budget
+        self.matrices = matrices
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.isdir(self.path(key))
+
+    def load(self, key, names=()):
+        """arrays of an entry (memory mapped), a dict or None
+
+        Params:
+            key: key of the entry
+            names: names of arrays the entry should have, an entry
+                missing one of them (or unreadable) is incomplete, it
+                is removed and taken as a miss
+        """
+        path = self.path(key)
+        try:
+            files = os.listdir(path)
+        except (IOError, OSError):
+            # missing, or evicted by another process
+            return None
+        try:
+            ret = {name[:-4]: np.load(os.path.join(path, name),
+                                      mmap_mode='r')
+                   for name in files if name.endswith('.npy')}
+            os.utime(path)
+        except (IOError, OSError, ValueError):
+            ret = None
+        if ret is None or any(name not in ret for name in names):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return ret
+
+    def store(self, key, **arrays):
+        """store arrays as an entry, written aside then renamed in place
+        """
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, name + '.npy'),
+                        np.asarray(array))
+            os.replace(tmp, self.path(key))
+        except OSError:
+            # stored by another process meanwhile, or failed to write
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """(last used time, size, key) of entries"""
+        ret = []
+        for key in os.listdir(self.root):
+            path = self.path(key)
+            if key.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, name))
+                           for name in os.listdir(path))
+                ret.append((os.path.getmtime(path), size, key))
+            except OSError:
+                continue
+        return ret
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, budget=None):
+        """remove least recently used entries until size fits budget"""
+        budget = self.budget if budget is None else budget
+        if budget is None:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= budget:
+                break
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        self.evict(budget=0)
+
+    def matrix(self, hamiltonian, sector=None, **kwargs):
+        """hamiltonian matrix, assembled by `mat()` on a miss
+
+        Params:
+            hamiltonian: a hamiltonian
+            sector: a sector of the basis (optional)
+            kwargs: keywords of `mat()` (dtype, chunk, workers)
+
+        Returns:
+            a scipy.sparse.csr_matrix on memory mapped arrays
+        """
+        from vmc.ham.sparse import block
+
+        dtype = kwargs.get('dtype')
+        if dtype is None:
+            # the data type mat() decides, from the first row
+            dtype = block(hamiltonian, 0, 1, sector=sector).dtype
+        key = signature(hamiltonian, sector, kind='matrix',
+                        dtype=np.dtype(dtype).str)
+        entry = self.load(key, ('data', 'indices', 'indptr', 'shape'))
+        if entry is None:
+            mat = hamiltonian.mat(sector=sector, **kwargs).tocsr()
+            self.store(key, data=mat.data, indices=mat.indices,
+                       indptr=mat.indptr, shape=np.array(mat.shape))
+            entry = self.load(key, ('data', 'indices', 'indptr',
+                                    'shape'))
+            if entry is None:
+                return mat
+        return sp.csr_matrix((entry['data'], entry['indices'],
+                              entry['indptr']),
+                             shape=tuple(entry['shape']), copy=False)
+
+    def eigen(self, key):
+        """cached (energy, state) of the key, or None, the state is
+        copied in memory
+        """
+        entry = self.load(key, ('energy', 'state'))
+        if entry is None:
+            return None
+        return entry['energy'].item(), np.array(entry['state'])
+
+    def store_eigen(self, key, energy, state):
+        self.store(key, energy=energy, state=state)
+
+
+def default_cache(root=None, matrices=True):
+    """the cache configured by environment variables, or None
+
+    Params:
+        root: root directory used when VMC_CACHE is not set,
+            e.g. `CACHE_ROOT`, default: no cache, the cache at this
+            root is kept under `CACHE_BUDGET` by default
+        matrices: keep hamiltonian matrices, see `DiskCache`
+    """
+    budget = os.environ.get('VMC_CACHE_BUDGET')
+    budget = int(budget) if budget else None
+    if os.environ.get('VMC_CACHE'):
+        root = os.environ['VMC_CACHE']
+    elif budget is None:
+        budget = CACHE_BUDGET
+    if not root:
+        return None
+    return DiskCache(root, budget=budget, matrices=matrices)
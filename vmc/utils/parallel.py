@@ -0,0 +1,197 @@
+"""partitioned enumeration of the basis
+
+the basis [0, 2^N) (or the basis of a sector, see `vmc.ham.sector`) is
+split into balanced contiguous shards, each shard is enumerated in
+chunks of codes by a forked worker, and the results of all chunks are
+reduced, e.g. summed or histogrammed.
+
+Example:
+    partition = Partition(20, sector=SzSector(20, 0))
+    norm = partition.sum(lambda codes: np.abs(psi(codes)) ** 2)
+"""
+
+import multiprocessing
+import numpy as np
+from multiprocessing import cpu_count
+from .bits import decode
+
+__all__ = [
+    'Partition',
+    'shards',
+    'fork_map',
+    'parallel_sum',
+    'parallel_histogram',
+]
+
+
+def shards(total, parts):
+    """balanced ranges (start, stop) covering [0, total), the lengths
+    of any two ranges differ by at most one
+    """
+    parts = max(min(parts, total), 1)
+    bounds = [total * k // parts for k in range(parts + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class Partition(object):
+    """shards of the basis
+
+    Params:
+        n: number of spins
+        sector: a sector of the basis (`states(start, stop)` and
+            `len`), default: the full basis
+        workers: number of processes, default: number of cpus
+        chunk: number of codes passed to functions at once
+
+    functions of `map`, `sum` and `histogram` take a numpy.int64 array
+    of codes (see `vmc.utils.bin`), they are inherited by forked
+    workers (see `fork_map`), so closures and lambdas can be used.
+    Without fork (e.g. on Windows) shards are enumerated in this
+    process.
+    """
+
+    def __init__(self, n, sector=None, workers=None, chunk=2 ** 16):
+        super(Partition, self).__init__()
+        self.n = n
+        self.sector = sector
+        self.dim = 2 ** n if sector is None else len(sector)
+        self.workers = workers or cpu_count()
+        self.chunk = chunk
+
+    def __len__(self):
+        return self.dim
+
+    def shards(self, parts=None):
+        """balanced ranges of positions, one for each worker by default"""
+        return shards(self.dim, parts or self.workers)
+
+    def codes(self, start, stop):
+        """codes of positions in [start, stop)"""
+        if self.sector is None:
+            return np.arange(start, stop, dtype=np.int64)
+        return self.sector.states(start, stop)
+
+    def configs(self, start, stop):
+        """configurations of positions in [start, stop), shape (B, N)"""
+        return decode(self.codes(start, stop), self.n)
+
+    def chunks(self, start, stop):
+        """codes of a range, in chunks"""
+        for begin in range(start, stop, self.chunk):
+            yield self.codes(begin, min(begin + self.chunk, stop))
+
+    def map(self, func, reduce=None):
+        """apply func on every chunk
+
+        Params:
+            func: a function of codes
+            reduce: a binary function merging results of chunks,
+                each shard reduces its chunks in order, then the
+                results of shards are reduced in order
+
+        Returns:
+            the reduced result, or a list of results of chunks in
+            order when reduce is None
+        """
+        return self.map_ranges(
+            lambda start, stop: func(self.codes(start, stop)), reduce)
+
+    def map_ranges(self, func, reduce=None):
+        """apply func on the range (start, stop) of positions of every
+        chunk, e.g. to write rows of shared arrays, see `map`
+        """
+        def shard(rows):
+            results = [func(begin, min(begin + self.chunk, rows[1]))
+                       for begin in range(rows[0], rows[1], self.chunk)]
+            if reduce is None:
+                return results
+            return _reduce(reduce, results) if results else _EMPTY
+
+        results = fork_map(shard, self.shards(), self.workers)
+        if reduce is None:
+            return [each for result in results for each in result]
+        return _reduce(reduce, [each for each in results
+                                if each is not _EMPTY])
+
+    def sum(self, func):
+        """sum of func over the basis, func returns numbers or arrays
+        of a fixed shape, summed over the chunk or not
+        """
+        return self.map(lambda codes: np.sum(func(codes), 0),
+                        reduce=np.add)
+
+    def histogram(self, func, length, weights=None):
+        """histogram of func over the basis
+
+        Params:
+            func: a function of codes returning integer bins in
+                [0, length)
+            length: number of bins
+            weights: a function of codes returning weights of
+                each code, default: ones
+
+        Returns:
+            a numpy array of shape (length, )
+        """
+        def count(codes):
+            w = None if weights is None else weights(codes)
+            return np.bincount(func(codes), w, minlength=length)
+        return self.map(count, reduce=np.add)
+
+
+# an empty shard
+_EMPTY = object()
+
+# the function of forked workers
+_shared = {}
+
+
+def _reduce(reduce, results):
+    ret = results[0]
+    for each in results[1:]:
+        ret = reduce(ret, each)
+    return ret
+
+
+def _call(item):
+    return _shared['func'](item)
+
+
+def fork_map(func, items, processes=None):
+    """[func(item) for item in items] on a pool of forked processes
+
+    func is inherited by the workers rather than pickled, so closures
+    and lambdas can be used, results are pickled back in order. With a
+    single item, or without fork (e.g. on Windows), items are mapped in
+    this process.
+
+    Params:
+        func: a function of an item
+        items: a list of picklable items
+        processes: number of processes, default: number of cpus
+    """
+    items = list(items)
+    if len(items) <= 1 or \
+            'fork' not in multiprocessing.get_all_start_methods():
+        return [func(each) for each in items]
+    _shared['func'] = func
+    try:
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(min(processes or cpu_count(), len(items))) as pool:
+            return pool.map(_call, items)
+    finally:
+        _shared.clear()
+
+
+def parallel_sum(func, n, sector=None, workers=None, chunk=2 ** 16):
+    """sum of func(codes) over the basis, see `Partition.sum`"""
+    return Partition(n, sector, workers, chunk).sum(func)
+
+
+def parallel_histogram(func, length, n, weights=None, sector=None,
+                       workers=None, chunk=2 ** 16):
+    """histogram of func(codes) over the basis, see
+    `Partition.histogram`
+    """
+    return Partition(n, sector, workers, chunk).histogram(
+        func, length, weights=weights)
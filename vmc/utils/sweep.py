@@ -0,0 +1,169 @@
+"""parameter sweeps of ground states
+
+hamiltonians are linear in their couplings, e.g. TFI(mag=h) is
+-ZZ - h X, the matrix of each coupling (term) is assembled once on a
+common sparsity pattern, the matrix of a parameter point is a linear
+combination of their data. Lanczos of each point starts from the ground
+state of the previous point.
+"""
+
+import copy
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import eigsh
+from .core import _sector
+from .parallel import fork_map, shards
+
+__all__ = [
+    'Sweep',
+    'sweep',
+    'aligned_data',
+    'lowest_eigen',
+]
+
+
+def aligned_data(terms):
+    """data of matrices on the union of their sparsity patterns
+
+    Returns:
+        (data, indices, indptr), data has a row of each matrix
+    """
+    n = terms[0].shape[0]
+    pattern = sum(abs(each) for each in terms).tocsr()
+    pattern.sort_indices()
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(pattern.indptr))
+    index = rows * n + pattern.indices
+    dtype = np.result_type(*[each.dtype for each in terms])
+    data = np.zeros((len(terms), pattern.nnz), dtype=dtype)
+    for k, each in enumerate(terms):
+        each = each.tocoo()
+        pos = np.searchsorted(index, each.row.astype(np.int64) * n + each.col)
+        np.add.at(data[k], pos, each.data)
+    return data, pattern.indices, pattern.indptr
+
+
+def lowest_eigen(matrix, k, v0=None, tol=0):
+    """lowest k eigenpairs, ascending"""
+    if matrix.shape[0] <= 2 ** 10:
+        energy, state = np.linalg.eigh(matrix.toarray())
+        return energy[:k], state[:, :k]
+    energy, state = eigsh(matrix, k, which='SA', v0=v0, tol=tol)
+    order = np.argsort(energy)
+    return energy[order], state[:, order]
+
+
+class Sweep(object):
+    """ground states along a parameter of a hamiltonian
+
+    the hamiltonian should depend linearly on the parameter, the
+    parameter can be a number (e.g. 'mag' of TFI) or a tuple of
+    numbers (e.g. 'J' of J1J2).
+
+    Params:
+        hamiltonian: a hamiltonian, it is not modified
+        param: name of the parameter
+        sz, momentum, reflection: quantum numbers of the sector
+            (optional), see `ground`
+        kwargs: keywords of `mat()` (chunk, workers)
+
+    Example:
+        sweep = Sweep(J1J2(J=(1, 0), lattice=lattice), 'J', sz=0)
+        energies, gaps, states = sweep.run([(1, j2) for j2 in grid])
+    """
+
+    def __init__(self, hamiltonian, param, sz=None, momentum=None,
+                 reflection=None, **kwargs):
+        super(Sweep, self).__init__()
+        self.param = param
+        self.sector = _sector(hamiltonian, sz, momentum, reflection)
+        value = np.atleast_1d(hamiltonian.params[param])
+
+        h = copy.copy(hamiltonian)
+        h.params = dict(hamiltonian.params)
+        h.clear_diagonal()
+
+        def assemble(value):
+            h.params[param] = value if len(value) > 1 else value[0]
+            return h.mat(sector=self.sector, **kwargs).tocsr()
+
+        # constant part, then a term of each component
+        basis = np.eye(len(value), dtype=value.dtype)
+        const = assemble(0 * value)
+        terms = [const] + [assemble(each) - const for each in basis]
+        self.size = len(value)
+        self.data, self.indices, self.indptr = aligned_data(terms)
+        self.shape = const.shape
+
+    def coefficients(self, value):
+        value = np.atleast_1d(value)
+        if len(value) != self.size:
+            raise ValueError("%s should have %d components, not %d"
+                             % (self.param, self.size, len(value)))
+        return np.concatenate([[1], value])
+
+    def matrix(self, value):
+        """the hamiltonian matrix at a parameter value"""
+        data = self.coefficients(value).dot(self.data)
+        return sp.csr_matrix((data, self.indices, self.indptr),
+                             shape=self.shape, copy=False)
+
+    def _run(self, values, k=2, states=True, tol=0, v0=None):
+        """lists of energies and ground states (if states) of values"""
+        energies, ret = [], []
+        for value in values:
+            energy, state = lowest_eigen(self.matrix(value), k, v0=v0, tol=tol)
+            v0 = state[:, 0]
+            energies.append(energy)
+            if states:
+                ret.append(v0)
+        return energies, ret
+
+    def run(self, values, k=2, states=True, segments=1, tol=0):
+        """ground states of parameter values
+
+        Params:
+            values: a sequence of parameter values, neighbours
+                should be close to benefit from warm starts
+            k: number of lowest eigenvalues of each point
+            states: keep ground states
+            segments: split values into contiguous segments, each
+                is swept by a forked process. First points of segments
+                are swept in this process beforehand, each segment
+                starts from the ground state of its first point.
+            tol: tolerance of Lanczos (see `eigsh`), 0 for
+                machine precision
+
+        Returns:
+            energies: shape (P, k)
+            gaps: energies[:, 1] - energies[:, 0], None if k is 1
+            states: ground states (in the sector), shape (P, dim),
+                None if states is False
+        """
+        values = list(values)
+        ranges = shards(len(values), segments)
+        if len(ranges) > 1:
+            first, seeds = self._run([values[start] for start, _ in ranges],
+                                     k, True, tol)
+            results = fork_map(
+                lambda i: self._run(values[ranges[i][0] + 1:ranges[i][1]],
+                                    k, states, tol, v0=seeds[i]),
+                range(len(ranges)))
+            energies, ret = [], []
+            for i, (each, each_states) in enumerate(results):
+                energies += [first[i]] + each
+                if states:
+                    ret += [seeds[i]] + each_states
+        else:
+            energies, ret = self._run(values, k, states, tol)
+
+        energies = np.array(energies)
+        ret = np.array(ret) if states else None
+        gaps = energies[:, 1] - energies[:, 0] if k > 1 else None
+        return energies, gaps, ret
+
+
+def sweep(hamiltonian, param, values, k=2, states=True, segments=1,
+          **kwargs):
+    """ground states along a parameter, see `Sweep`"""
+    return Sweep(hamiltonian, param, **kwargs).run(
+        values, k=k, states=states, segments=segments)